@@ -1,28 +1,95 @@
 import concurrent.futures as cf
+import functools
 import logging
 
 from grpclib.reflection.service import ServerReflection
 from grpclib.server import Server
 from grpclib.utils import graceful_exit
+from redis.asyncio import Redis
 
+from core import metrics, tracing
 from core.config import settings
 from db.connections import RedisConnector
+from pathfinder import stats
 from server.handlers import Pathfinder
-from state.state import get_state
+from services import dispatch, field_registry
+from services.executor import ShardedExecutor
+from state.cache import CachedState
+from state.state import State, get_state
 
 
-async def start_pathfinder():
+def export_cache_info(state: State):
     """
-    Start the server and listen for incoming requests. Search algorithm is run inside separate process pool.
+    Add the statistics of the caches to `core.metrics`.
+
+    The distance caches of the pool workers are summed with the one of the server process, the
+    workers report theirs with every search, see `pathfinder.stats.cache_info`.
+
+    Parameters:
+        state (State): The state of the server, its cache is exported if it has one.
     """
-    with cf.ProcessPoolExecutor(max_workers=settings.pool_size) as executor:
-        async with RedisConnector() as connection:
-            state = get_state(connection)
-            services = ServerReflection.extend([Pathfinder(executor, state)])
-            server = Server(services)
+    metrics.CacheGauge(
+        'pathfinder_distance_cache',
+        'Heuristic distance caches of the server process and the pool workers, see pathfinder.a_star.',
+        functools.partial(stats.cache_info, 'distance'),
+    )
+    if isinstance(state, CachedState):
+        metrics.CacheGauge(
+            'pathfinder_state_cache',
+            'Decoded robot states cached in memory, see state.cache.',
+            state.cache_info,
+        )
+
+
+async def serve(connection: Redis, port: int | None = None):
+    """
+    Serve the requests, keeping the state in the given Redis, until the process is stopped.
+    Search algorithm is run inside separate process pool, sharded by field if `settings.sharded_pool` is set.
+    The metrics of `core.metrics` are served at `settings.metrics_port` of `settings.host`.
+
+    Parameters:
+        connection (Redis): The Redis connection.
+        port (int | None): The port to listen on. Defaults to `settings.port`.
+    """
+    port = settings.port if port is None else port
+    if settings.shared_fields:
+        # the workers must not unlink the shared fields when they exit
+        field_registry.share_resource_tracker()
+    executor: cf.Executor
+    if settings.sharded_pool:
+        executor = ShardedExecutor(settings.pool_size)
+    else:
+        executor = cf.ProcessPoolExecutor(max_workers=settings.pool_size)
+    with executor:
+        if settings.calibrate_dispatch:
+            await dispatch.calibrate(executor)
+        state = get_state(connection)
+        export_cache_info(state)
+        services = ServerReflection.extend([Pathfinder(executor, state)])
+        server = Server(services)
+        metrics_server = None
+        if settings.metrics_port:
+            metrics_server = await metrics.start_server(
+                settings.metrics_port, settings.host
+            )
+        try:
             with graceful_exit([server]):
-                await server.start(port=settings.port)
+                await server.start(port=port)
                 logging.debug(
-                    f"Server started. Listening on host {settings.host} and port {settings.port}"
+                    f"Server started. Listening on host {settings.host} and port {port}"
                 )
                 await server.wait_closed()
+        finally:
+            if metrics_server is not None:
+                metrics_server.close()
+            # the searches of the THREAD placement run alongside the executor
+            dispatch.policy.shutdown()
+            tracing.flush()
+
+
+async def start_pathfinder():
+    """
+    Start the server and listen for incoming requests.
+    """
+    async with RedisConnector() as connection:
+        await serve(connection)
@@ -0,0 +1,141 @@
+"""
+Run the pathfinding benchmarks.
+
+    python -m benchmarks --output results.json
+    python -m benchmarks --full --algos astar[manhattan] jps[manhattan] --compare results.json
+"""
+
+import argparse
+import itertools
+import sys
+
+import orjson as json
+
+from benchmarks.generators import Kind
+from benchmarks.suite import (
+    FULL_SIZES,
+    SIZES,
+    TARGETS,
+    Case,
+    Component,
+    Result,
+    compare,
+    default_algos,
+    metadata,
+    run_case,
+    run_components,
+)
+from core.enums import AlgoValues
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='benchmarks', description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', help='sides of the mazes')
+    parser.add_argument(
+        '--full', action='store_true', help=f'use the sizes {FULL_SIZES}'
+    )
+    parser.add_argument('--targets', type=int, nargs='+', default=list(TARGETS))
+    parser.add_argument(
+        '--kinds', nargs='+', default=[kind.value for kind in Kind], choices=list(Kind)
+    )
+    parser.add_argument(
+        '--algos',
+        nargs='+',
+        default=default_algos(),
+        help='algorithm settings, or "all" for every mode of every algorithm',
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument(
+        '--budget',
+        type=float,
+        default=10.0,
+        help='seconds a search may take to be repeated and traced',
+    )
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of a previous run')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=1.2,
+        help='ratio of minimum times considered a regression',
+    )
+    args = parser.parse_args(argv)
+    if args.sizes is None:
+        args.sizes = list(FULL_SIZES if args.full else SIZES)
+    if args.algos == ['all']:
+        args.algos = [value.value for value in AlgoValues]
+    return args
+
+
+def run_cases(args: argparse.Namespace) -> list[Result]:
+    results = []
+    for kind, size, targets, algo in itertools.product(
+        args.kinds, args.sizes, args.targets, args.algos
+    ):
+        case = Case(kind=kind, size=size, targets=targets, algo=algo, seed=args.seed)
+        try:
+            result = run_case(case, args.repeat, args.budget)
+        except ValueError as e:
+            # e.g. a small maze has fewer free cells than targets
+            print(
+                f'{kind:9} {size:5} {targets:3} {algo:22} skipped: {e}', file=sys.stderr
+            )
+            continue
+        results.append(result)
+        memory = (
+            '-' if result.peak_memory is None else f'{result.peak_memory / 2**20:.1f}MB'
+        )
+        print(
+            f'{kind:9} {size:5} {targets:3} {algo:22} '
+            f'{result.time_min * 1e3:10.3f}ms min {result.expanded:9} expanded '
+            f'{memory:>9} prepare {result.prepare_time * 1e3:.1f}ms',
+            file=sys.stderr,
+        )
+    return results
+
+
+def run_all_components(args: argparse.Namespace) -> list[Component]:
+    components = [
+        component
+        for size in args.sizes
+        for component in run_components(size, args.seed, args.repeat)
+    ]
+    for component in components:
+        print(
+            f'{component.name:16} {component.size:5} '
+            f'{component.time_min * 1e3:10.3f}ms min',
+            file=sys.stderr,
+        )
+    return components
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    baseline = None
+    if args.compare:
+        # read before the output may overwrite it
+        with open(args.compare, 'rb') as file:
+            baseline = json.loads(file.read())
+
+    results = run_cases(args)
+    components = run_all_components(args)
+    report = {
+        'meta': metadata(args.seed),
+        'results': [result.model_dump() for result in results],
+        'components': [component.model_dump() for component in components],
+    }
+    if args.output:
+        with open(args.output, 'wb') as output:
+            output.write(json.dumps(report, option=json.OPT_INDENT_2))
+
+    if baseline is not None:
+        regressions = compare(baseline, report, args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
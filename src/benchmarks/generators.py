@@ -0,0 +1,123 @@
+import enum
+import typing as t
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+class Kind(str, enum.Enum):
+    """
+    The kinds of generated mazes.
+
+    Attributes:
+        OPEN: No obstacles at all.
+        RANDOM: Obstacles scattered independently with the given density.
+        CORRIDORS: A perfect maze of one cell wide corridors with a single path between two cells.
+        ROOMS: Square rooms separated by walls, with one door in every wall between two rooms.
+    """
+
+    OPEN = 'open'
+    RANDOM = 'random'
+    CORRIDORS = 'corridors'
+    ROOMS = 'rooms'
+
+
+def open_maze(n: int, m: int, rng: np.random.Generator) -> NDArray:
+    return np.zeros((n, m), dtype=np.uint8)
+
+
+def random_maze(
+    n: int, m: int, rng: np.random.Generator, density: float = 0.25
+) -> NDArray:
+    return (rng.random((n, m)) < density).view(np.uint8)
+
+
+def corridors_maze(n: int, m: int, rng: np.random.Generator) -> NDArray:
+    # binary tree maze: the cells at even coordinates are rooms, every room opens the wall to
+    # its upper or to its left neighbor at random, the first row and column are open corridors
+    maze = np.ones((n, m), dtype=np.uint8)
+    maze[::2, ::2] = 0
+    rows, columns = np.meshgrid(np.arange(0, n, 2), np.arange(0, m, 2), indexing='ij')
+    up = rng.random(rows.shape) < 0.5
+    up = (up | (columns == 0)) & (rows > 0)
+    left = ~up & (columns > 0)
+    maze[rows[up] - 1, columns[up]] = 0
+    maze[rows[left], columns[left] - 1] = 0
+    return maze
+
+
+def _doors(
+    rng: np.random.Generator, walls: int, length: int, room_size: int
+) -> NDArray:
+    # one door in every wall segment between two rooms, off the crossings of the walls
+    segments = np.arange(0, length, room_size)
+    high = np.maximum(np.minimum(room_size, length - segments), 2)
+    offsets = rng.integers(1, high, (walls, segments.size))
+    return np.minimum(segments + offsets, length - 1)
+
+
+def rooms_maze(
+    n: int, m: int, rng: np.random.Generator, room_size: int = 16
+) -> NDArray:
+    maze = np.zeros((n, m), dtype=np.uint8)
+    rows = np.arange(room_size, n, room_size)
+    columns = np.arange(room_size, m, room_size)
+    maze[rows, :] = 1
+    maze[:, columns] = 1
+
+    doors = _doors(rng, rows.size, m, room_size)
+    maze[np.repeat(rows, doors.shape[1]), doors.ravel()] = 0
+    doors = _doors(rng, columns.size, n, room_size)
+    maze[doors.ravel(), np.repeat(columns, doors.shape[1])] = 0
+    return maze
+
+
+GENERATORS: dict[Kind, t.Callable[..., NDArray]] = {
+    Kind.OPEN: open_maze,
+    Kind.RANDOM: random_maze,
+    Kind.CORRIDORS: corridors_maze,
+    Kind.ROOMS: rooms_maze,
+}
+
+
+def generate(kind: str, n: int, m: int, seed: int, **options) -> NDArray:
+    """
+    Generate a maze, the same one for the same arguments.
+
+    Args:
+        kind (str): The kind of the maze, see `Kind`.
+        n (int): The number of rows.
+        m (int): The number of columns.
+        seed (int): The seed of the random generator.
+        **options: The options of the kind, e.g. `density` of RANDOM or `room_size` of ROOMS.
+
+    Returns:
+        numpy.NDArray: The maze as a uint8 array, 1 for obstacles.
+    """
+    return GENERATORS[Kind(kind)](n, m, np.random.default_rng(seed), **options)
+
+
+def pick_points(
+    maze: NDArray, count: int, seed: int
+) -> tuple[tuple[int, int], list[tuple[int, int]]]:
+    """
+    Pick the start and the targets among the free cells of the maze, the same ones for the same seed.
+
+    Args:
+        maze (numpy.NDArray): The maze.
+        count (int): The number of targets.
+        seed (int): The seed of the random generator.
+
+    Returns:
+        tuple[tuple[int, int], list[tuple[int, int]]]: The start and the targets, all different.
+
+    Raises:
+        ValueError: If the maze has not enough free cells.
+    """
+    free = np.flatnonzero(np.asarray(maze).ravel() != 1)
+    if free.size < count + 1:
+        raise ValueError(f'{free.size} free cells are not enough for {count} targets')
+    # sampling indices instead of permuting the free cells keeps it cheap on huge mazes
+    picked = np.random.default_rng(seed).choice(free.size, count + 1, replace=False)
+    points = [divmod(int(cell), maze.shape[1]) for cell in free[picked]]
+    return points[0], points[1:]
@@ -0,0 +1,395 @@
+"""
+Drive a Pathfinder server with many concurrent robots.
+
+Every robot sets its field and then follows the server's moves over one Moving stream, reporting
+its remaining targets like the robot of SPECIFICATION.md, until it gets FINISH. By default a
+local server is started in a subprocess with an in-memory fakeredis.
+
+    python -m benchmarks.load --robots 100 --size 200 --targets 5
+    python -m benchmarks.load --address 127.0.0.1:50051 --robots 500 --output load.json
+    python -m benchmarks.load --serve --port 50052 --redis-url redis://localhost:6379
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import socket
+import sys
+import time
+import typing as t
+
+import numpy as np
+import orjson as json
+from grpclib.client import Channel
+from numpy.typing import NDArray
+from pydantic import BaseModel
+
+from benchmarks.generators import Kind, generate, pick_points
+from core.enums import Direction, GridValues
+from server.lib.pathfinder_grpc import PathFinderStub
+from server.lib.pathfinder_pb2 import Field, MoveRequest, Point
+
+MOVES = {
+    Direction.RIGHT: (0, 1),
+    Direction.DOWN: (1, 0),
+    Direction.LEFT: (0, -1),
+    Direction.UP: (-1, 0),
+}
+
+
+class Robot(BaseModel):
+    robot_id: str
+    field: int
+    start: tuple[int, int]
+    targets: list[tuple[int, int]]
+
+
+class Outcome(BaseModel):
+    steps: int = 0
+    # Motion.ERROR responses
+    errors: int = 0
+    finished: bool = False
+    # the exception which broke the robot's calls, if any
+    failure: str | None = None
+
+
+class LoadReport(BaseModel):
+    robots: int
+    steps: int
+    errors: int
+    # robots which got FINISH
+    finished: int
+    # robots whose calls raised
+    failures: int
+    duration: float
+    throughput: float
+    error_rate: float
+    # milliseconds
+    step_p50: float
+    step_p99: float
+    step_max: float
+    set_field_p50: float
+    set_field_p99: float
+
+
+def plan_robots(
+    mazes: list[NDArray], robots: int, targets: int, seed: int
+) -> list[Robot]:
+    """
+    Spread the robots over the fields and pick their starts and targets, the same for the same seed.
+
+    Args:
+        mazes (list[numpy.NDArray]): The fields.
+        robots (int): The number of robots.
+        targets (int): The number of targets of every robot.
+        seed (int): The seed of the run.
+
+    Returns:
+        list[Robot]: The robots.
+    """
+    fleet = []
+    for index in range(robots):
+        field = index % len(mazes)
+        start, goals = pick_points(mazes[field], targets, seed + index)
+        fleet.append(
+            Robot(robot_id=f'load-{index}', field=field, start=start, targets=goals)
+        )
+    return fleet
+
+
+def to_grid(maze: NDArray) -> str:
+    """
+    Get the grid of the maze as sent in `Field.grid`.
+    """
+    return (maze + ord(GridValues.FREE)).tobytes().decode()
+
+
+async def drive(
+    stub: PathFinderStub,
+    robot: Robot,
+    grid: str,
+    size: int,
+    max_steps: int,
+    step_latencies: list[float],
+    set_field_latencies: list[float],
+) -> Outcome:
+    """
+    Set the field of the robot and follow the server's moves until FINISH.
+
+    The robot stops on ERROR as well: its position is unknown to the server's plan from then on.
+
+    Args:
+        stub (PathFinderStub): The client of the server.
+        robot (Robot): The robot.
+        grid (str): The grid of the robot's field.
+        size (int): The side of the field.
+        max_steps (int): The number of moves after which the robot gives up.
+        step_latencies (list[float]): The seconds every move took, appended to.
+        set_field_latencies (list[float]): The seconds SetField took, appended to.
+
+    Returns:
+        Outcome: The outcome of the robot.
+    """
+    outcome = Outcome()
+    position = robot.start
+    remaining = list(robot.targets)
+    try:
+        began = time.perf_counter()
+        await stub.SetField(
+            Field(
+                N=size,
+                M=size,
+                grid=grid,
+                source=Point(i=position[0], j=position[1]),
+                robot_id=robot.robot_id,
+            )
+        )
+        set_field_latencies.append(time.perf_counter() - began)
+
+        async with stub.Moving.open() as stream:
+            while outcome.steps < max_steps:
+                request = MoveRequest(
+                    robot_id=robot.robot_id,
+                    targets=[Point(i=i, j=j) for i, j in remaining],
+                )
+                began = time.perf_counter()
+                await stream.send_message(request)
+                response = await stream.recv_message()
+                step_latencies.append(time.perf_counter() - began)
+                outcome.steps += 1
+
+                direction = response.direction if response else Direction.ERROR
+                if direction == Direction.FINISH:
+                    outcome.finished = True
+                    break
+                if direction not in MOVES:
+                    outcome.errors += 1
+                    break
+                i, j = MOVES[Direction(direction)]
+                position = position[0] + i, position[1] + j
+                if position in remaining:
+                    remaining.remove(position)
+            await stream.end()
+    except Exception as e:
+        outcome.failure = repr(e)
+    return outcome
+
+
+def percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q)) * 1e3 if values else 0.0
+
+
+async def run_load(
+    host: str,
+    port: int,
+    robots: int = 10,
+    size: int = 50,
+    kind: str = Kind.ROOMS,
+    targets: int = 5,
+    fields: int = 1,
+    seed: int = 0,
+    max_steps: int | None = None,
+) -> LoadReport:
+    """
+    Drive the server at the address with concurrent robots.
+
+    Args:
+        host (str): The host of the server.
+        port (int): The port of the server.
+        robots (int, optional): The number of concurrent robots. Defaults to 10.
+        size (int, optional): The side of the fields. Defaults to 50.
+        kind (str, optional): The kind of the fields. Defaults to rooms, which has no unreachable cells.
+        targets (int, optional): The number of targets of every robot. Defaults to 5.
+        fields (int, optional): The number of fields the robots are spread over. Defaults to 1.
+        seed (int, optional): The seed of the fields and the targets. Defaults to 0.
+        max_steps (int, optional): The moves after which a robot gives up. Defaults to 4 * size * targets.
+
+    Returns:
+        LoadReport: The latencies, the throughput and the errors.
+    """
+    mazes = [generate(kind, size, size, seed + index) for index in range(fields)]
+    grids = [to_grid(maze) for maze in mazes]
+    fleet = plan_robots(mazes, robots, targets, seed)
+    max_steps = max_steps or 4 * size * targets
+    step_latencies: list[float] = []
+    set_field_latencies: list[float] = []
+
+    channel = Channel(host, port)
+    try:
+        stub = PathFinderStub(channel)
+        began = time.perf_counter()
+        outcomes = await asyncio.gather(
+            *(
+                drive(
+                    stub,
+                    robot,
+                    grids[robot.field],
+                    size,
+                    max_steps,
+                    step_latencies,
+                    set_field_latencies,
+                )
+                for robot in fleet
+            )
+        )
+        duration = time.perf_counter() - began
+    finally:
+        channel.close()
+
+    steps = sum(outcome.steps for outcome in outcomes)
+    errors = sum(outcome.errors for outcome in outcomes)
+    return LoadReport(
+        robots=robots,
+        steps=steps,
+        errors=errors,
+        finished=sum(outcome.finished for outcome in outcomes),
+        failures=sum(outcome.failure is not None for outcome in outcomes),
+        duration=duration,
+        throughput=steps / duration if duration else 0.0,
+        error_rate=errors / steps if steps else 0.0,
+        step_p50=percentile(step_latencies, 50),
+        step_p99=percentile(step_latencies, 99),
+        step_max=percentile(step_latencies, 100),
+        set_field_p50=percentile(set_field_latencies, 50),
+        set_field_p99=percentile(set_field_latencies, 99),
+    )
+
+
+async def serve(port: int, redis_url: str | None = None):
+    """
+    Run the server with the state in fakeredis, or in the Redis at the URL.
+
+    Args:
+        port (int): The port to listen on.
+        redis_url (str, optional): The URL of a Redis server. Defaults to an in-memory fakeredis.
+    """
+    from redis.asyncio import Redis
+
+    from app import serve as serve_app
+
+    if redis_url is None:
+        # a development dependency, needed only for the stand-in
+        from fakeredis.aioredis import FakeRedis
+
+        connection: Redis = FakeRedis()
+    else:
+        connection = Redis.from_url(redis_url)
+    # closed on exit, like the connection of `db.connections.RedisConnector`
+    async with connection:
+        await serve_app(connection, port)
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+@contextlib.asynccontextmanager
+async def local_server(
+    redis_url: str | None = None, timeout: float = 30
+) -> t.AsyncIterator[int]:
+    """
+    Start a server in a subprocess, so it doesn't share the event loop and the GIL with the robots.
+
+    Args:
+        redis_url (str, optional): The URL of a Redis server. Defaults to an in-memory fakeredis.
+        timeout (float, optional): The seconds to wait for the server to listen. Defaults to 30.
+
+    Yields:
+        int: The port of the server.
+    """
+    port = free_port()
+    command = [sys.executable, '-m', 'benchmarks.load', '--serve', '--port', str(port)]
+    if redis_url:
+        command += ['--redis-url', redis_url]
+    # the server imports the modules from the same source tree as this one
+    source = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    path = os.pathsep.join(filter(None, [source, os.environ.get('PYTHONPATH')]))
+    process = await asyncio.create_subprocess_exec(
+        *command, env={**os.environ, 'PYTHONPATH': path}
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                _, writer = await asyncio.open_connection('127.0.0.1', port)
+            except OSError:
+                if process.returncode is not None or time.monotonic() > deadline:
+                    raise RuntimeError('The local server has not started')
+                await asyncio.sleep(0.1)
+                continue
+            writer.close()
+            break
+        yield port
+    finally:
+        if process.returncode is None:
+            process.terminate()
+            await process.wait()
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='benchmarks.load', description=__doc__)
+    parser.add_argument('--robots', type=int, default=10)
+    parser.add_argument('--size', type=int, default=50)
+    parser.add_argument('--kind', default=Kind.ROOMS.value, choices=list(Kind))
+    parser.add_argument('--targets', type=int, default=5)
+    parser.add_argument('--fields', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-steps', type=int)
+    parser.add_argument(
+        '--address',
+        help='host:port of a running server, a local one is started if not set',
+    )
+    parser.add_argument(
+        '--redis-url',
+        help='Redis of the local server, an in-memory fakeredis if not set',
+    )
+    parser.add_argument('--output', help='write the report as JSON to this file')
+    parser.add_argument(
+        '--serve', action='store_true', help='only run the local server'
+    )
+    parser.add_argument('--port', type=int, default=50051)
+    return parser.parse_args(argv)
+
+
+async def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    if args.serve:
+        await serve(args.port, args.redis_url)
+        return 0
+
+    options = dict(
+        robots=args.robots,
+        size=args.size,
+        kind=args.kind,
+        targets=args.targets,
+        fields=args.fields,
+        seed=args.seed,
+        max_steps=args.max_steps,
+    )
+    if args.address:
+        host, port = args.address.rsplit(':', 1)
+        report = await run_load(host, int(port), **options)
+    else:
+        async with local_server(args.redis_url) as port:
+            report = await run_load('127.0.0.1', port, **options)
+
+    print(
+        f'{report.robots} robots, {report.steps} steps in {report.duration:.2f}s: '
+        f'{report.throughput:.0f} steps/s, step p50 {report.step_p50:.2f}ms '
+        f'p99 {report.step_p99:.2f}ms max {report.step_max:.2f}ms, '
+        f'SetField p50 {report.set_field_p50:.2f}ms p99 {report.set_field_p99:.2f}ms, '
+        f'{report.finished} finished, error rate {report.error_rate:.2%}, '
+        f'{report.failures} failed',
+        file=sys.stderr,
+    )
+    if args.output:
+        with open(args.output, 'wb') as output:
+            output.write(json.dumps(report.model_dump(), option=json.OPT_INDENT_2))
+    return 1 if report.failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
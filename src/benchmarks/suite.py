@@ -0,0 +1,284 @@
+import asyncio
+import datetime
+import platform
+import statistics
+import time
+import tracemalloc
+import typing as t
+
+import numpy as np
+from pydantic import BaseModel
+
+from benchmarks.generators import generate, pick_points
+from core.enums import AlgoValues, GridValues
+from models import Entry
+from pathfinder import stats
+from pathfinder.a_star import distance_cache_clear
+from pathfinder.bfs import distance_field_cache_clear
+from pathfinder.finder import plan_route, prepare_field
+from pathfinder.managers import Algorithm
+from services.field_state import build_maze
+from state import codec
+from state.state import RedisStorage, State
+
+SIZES = (10, 100, 1000)
+FULL_SIZES = (10, 100, 1000, 2000, 4000)
+TARGETS = (1, 10, 100)
+# slowdowns below this many seconds are within the noise of the machine
+NOISE = 5e-4
+
+
+class Case(BaseModel):
+    kind: str
+    size: int
+    targets: int
+    algo: str
+    seed: int
+
+
+class Result(Case):
+    # whether a path was found, HPA* returns only its first segment
+    found: bool
+    path_length: int | None
+    expanded: int
+    # seconds
+    prepare_time: float
+    time_min: float
+    time_median: float
+    repeat: int
+    # bytes allocated at the peak of one search, None if the budget was exceeded
+    peak_memory: int | None
+
+
+class Component(BaseModel):
+    name: str
+    size: int
+    time_min: float
+    time_median: float
+    repeat: int
+
+
+def default_algos() -> list[str]:
+    """
+    Get the first mode of every algorithm registered in `pathfinder.managers`.
+
+    Returns:
+        list[str]: The algorithm settings, e.g. 'astar[manhattan]'.
+    """
+    return [
+        next(value.value for value in AlgoValues if value.startswith(f'{algo.value}['))
+        for algo in Algorithm
+    ]
+
+
+def clear_caches():
+    """
+    Drop the per-process caches of the algorithms, so every run searches from scratch.
+    """
+    distance_cache_clear()
+    distance_field_cache_clear()
+
+
+def run_case(case: Case, repeat: int = 3, budget: float = 10.0) -> Result:
+    """
+    Measure the search of the case.
+
+    The search is timed `repeat` times, then run once more under tracemalloc for the peak memory:
+    tracing slows the search down, so it is not timed. If a run takes longer than the budget the
+    case isn't repeated and its memory isn't measured.
+
+    Args:
+        case (Case): The maze, the number of targets and the algorithm.
+        repeat (int, optional): The number of timed runs. Defaults to 3.
+        budget (float, optional): The seconds a run may take to be repeated. Defaults to 10.
+
+    Returns:
+        Result: The measurements.
+    """
+    maze = generate(case.kind, case.size, case.size, case.seed)
+    start, goals = pick_points(maze, case.targets, case.seed)
+
+    clear_caches()
+    began = time.perf_counter()
+    prepared = prepare_field(maze, case.algo)
+    prepare_time = time.perf_counter() - began
+
+    times: list[float] = []
+    path = None
+    expanded = 0
+    while len(times) < repeat:
+        clear_caches()
+        stats.take()
+        began = time.perf_counter()
+        path = plan_route(maze, start, goals, case.algo, prepared)
+        times.append(time.perf_counter() - began)
+        expanded = stats.take().expanded
+        if times[-1] > budget:
+            break
+
+    peak_memory = None
+    if times[-1] <= budget:
+        clear_caches()
+        tracemalloc.start()
+        try:
+            plan_route(maze, start, goals, case.algo, prepared)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return Result(
+        **case.model_dump(),
+        found=path is not None,
+        path_length=None if path is None else len(path),
+        expanded=expanded,
+        prepare_time=prepare_time,
+        time_min=min(times),
+        time_median=statistics.median(times),
+        repeat=len(times),
+        peak_memory=peak_memory,
+    )
+
+
+def _time(func: t.Callable[[], t.Any], repeat: int) -> list[float]:
+    times = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - began)
+    return times
+
+
+def _state_round_trip(
+    entry: Entry, loop: asyncio.AbstractEventLoop
+) -> dict[str, t.Callable[[], t.Any]]:
+    """
+    Prepare the steps of the `State` round trip of the entry against an in-memory fakeredis.
+
+    Args:
+        entry (Entry): The robot state.
+        loop (asyncio.AbstractEventLoop): The event loop the steps run in.
+
+    Returns:
+        dict[str, Callable[[], Any]]: The steps by name: saving the whole state, reading it and saving a move.
+    """
+    # a development dependency, it keeps the network out of the measurements
+    from fakeredis import FakeServer
+    from fakeredis.aioredis import FakeRedis
+
+    state = State(RedisStorage(FakeRedis(server=FakeServer())))
+    key = 'benchmark'
+    loop.run_until_complete(state.set_state(entry, key))
+    return {
+        'set_state': lambda: loop.run_until_complete(state.set_state(entry, key)),
+        'get_state': lambda: loop.run_until_complete(state.get_state(key)),
+        'set_progress': lambda: loop.run_until_complete(state.set_progress(entry, key)),
+    }
+
+
+def run_components(size: int, seed: int, repeat: int = 3) -> list[Component]:
+    """
+    Measure the steps of a request around the search: parsing the grid, the state encoding and
+    the `State` round trip, see `_state_round_trip`.
+
+    Args:
+        size (int): The side of the maze.
+        seed (int): The seed of the maze.
+        repeat (int, optional): The number of timed runs. Defaults to 3.
+
+    Returns:
+        list[Component]: The measurements of every step.
+    """
+    maze = generate('random', size, size, seed)
+    grid = (maze + ord(GridValues.FREE)).tobytes().decode()
+    start, goals = pick_points(maze, 1, seed)
+    entry = Entry(
+        maze=maze, current=start, action_count=0, action_count_log=[], plan=goals
+    )
+    field, progress = codec.encode_field(entry), codec.encode_progress(entry)
+
+    loop = asyncio.new_event_loop()
+    try:
+        steps: dict[str, t.Callable[[], t.Any]] = {
+            'build_maze': lambda: build_maze(size, size, grid),
+            'encode_field': lambda: codec.encode_field(entry),
+            'encode_progress': lambda: codec.encode_progress(entry),
+            'decode_entry': lambda: codec.decode_entry(field, progress),
+            **_state_round_trip(entry, loop),
+        }
+        components = []
+        for name, step in steps.items():
+            times = _time(step, repeat)
+            components.append(
+                Component(
+                    name=name,
+                    size=size,
+                    time_min=min(times),
+                    time_median=statistics.median(times),
+                    repeat=repeat,
+                )
+            )
+    finally:
+        loop.close()
+    return components
+
+
+def metadata(seed: int) -> dict[str, t.Any]:
+    """
+    Describe the environment of the run, to tell apart the results which aren't comparable.
+
+    Args:
+        seed (int): The seed of the run.
+
+    Returns:
+        dict[str, Any]: The time, the seed and the versions of Python and NumPy.
+    """
+    return {
+        'when': datetime.datetime.now().isoformat(timespec='seconds'),
+        'seed': seed,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+    }
+
+
+def compare(
+    baseline: dict[str, t.Any], current: dict[str, t.Any], threshold: float = 1.2
+) -> list[str]:
+    """
+    Find the regressions of the current run against the baseline run.
+
+    Args:
+        baseline (dict[str, Any]): The output of a previous run.
+        current (dict[str, Any]): The output of this run.
+        threshold (float, optional): The ratio of minimum times considered a regression. Defaults to 1.2.
+            The slowdowns shorter than NOISE are ignored. The minimum is compared rather than the
+            median as it is the least affected by the other load of the machine.
+
+    Returns:
+        list[str]: A description of every regression, empty if there are none.
+    """
+
+    def key(item: dict[str, t.Any]) -> tuple:
+        if 'name' in item:
+            return item['name'], item['size']
+        return item['kind'], item['size'], item['targets'], item['algo'], item['seed']
+
+    regressions = []
+    for section in ('results', 'components'):
+        before = {key(item): item for item in baseline.get(section, [])}
+        for item in current.get(section, []):
+            old = before.get(key(item))
+            if old is None:
+                continue
+            ratio = item['time_min'] / max(old['time_min'], 1e-9)
+            slower = item['time_min'] - old['time_min']
+            if ratio > threshold and slower > NOISE:
+                regressions.append(
+                    f'{key(item)}: {old["time_min"] * 1e3:.3f}ms -> '
+                    f'{item["time_min"] * 1e3:.3f}ms ({ratio:.2f}x)'
+                )
+            if 'expanded' in item and item['expanded'] > old['expanded']:
+                regressions.append(
+                    f'{key(item)}: expanded {old["expanded"]} -> {item["expanded"]}'
+                )
+    return regressions
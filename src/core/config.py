@@ -11,17 +11,69 @@ class Settings(BaseSettings):
     project_name: str = 'ARS Pathfinder'
     host: str = '127.0.0.1'
     port: int = 50051
+    # Port of the Prometheus metrics page (/metrics), 0 to not serve it
+    metrics_port: int = 8000
+    # Fraction of the requests traced (see core.tracing), the calls with the
+    # `x-pathfinder-trace: 1` metadata are traced whatever the fraction
+    trace_sample_rate: float = 0.0
+    # Traces kept in memory, served at /traces of the metrics port
+    trace_buffer_size: int = 256
+    # File the traces are appended to as JSON lines, none if empty
+    trace_file: str = ''
+    # Fraction of the searches run under cProfile, the report is added to the trace
+    profile_sample_rate: float = 0.0
 
     # Redis
     redis_host: str = 'localhost'
     redis_port: int = 6379
     cache_ttl: int = 60
     redis_server_state_key: str = 'server_state'
+    # Path of the Redis unix socket, used instead of the host and the port if set
+    redis_unix_socket: str = ''
+    # Connections to Redis, the requests wait up to the timeout (seconds) for a free one
+    redis_max_connections: int = 256
+    redis_pool_timeout: float = 5
+    redis_socket_keepalive: bool = True
+    # Seconds a connection may idle before it is checked on the next use, 0 to never check
+    redis_health_check_interval: int = 30
+    # Send the commands issued concurrently by many requests in one pipeline
+    redis_batch_commands: bool = True
+    # Attempts to apply a move when the robot state is changed concurrently
+    state_update_attempts: int = 3
+    # Robot states cached in process memory, 0 to read every state from Redis
+    state_cache_size: int = 1024
+    # Moves of a Moving stream kept in memory before the robot state is saved
+    stream_persist_interval: int = 16
     state_storage: str = enums.StateStorage.REDIS
 
     # Shortest path algorithm setting
     algo: str = enums.AlgoValues.ASTAR_MANHATTAN
     pool_size: int = 1
+    # Route the searches on a field to the same worker of the pool to keep its caches warm
+    sharded_pool: bool = True
+    # Searches up to this estimated cost run inline, up to the next one in a thread,
+    # larger ones in the process pool (see services.dispatch.estimate_cost)
+    inline_search_max_cost: int = 2500
+    thread_search_max_cost: int = 40000
+    # Derive the thresholds from the pool round trip measured at startup
+    calibrate_dispatch: bool = True
+    # Bounded per-worker cache of heuristic distances
+    distance_cache_size: int = 2**16
+    # Modes worth caching: manhattan is cheaper to compute than to look up
+    distance_cache_modes: list[str] = ['euclidean', 'diagonal']
+    # Number of multi-source BFS distance fields kept per worker
+    distance_field_cache_size: int = 8
+    # Pass the fields to the process pool in shared memory instead of pickling them per move
+    shared_fields: bool = True
+    # Fields kept in shared memory by the server process
+    field_registry_size: int = 64
+    # Fields decoded from shared memory kept per worker
+    worker_field_cache_size: int = 8
+    # Fields whose connected components are kept by the server process to drop the unreachable
+    # targets without a search, 0 to leave them to the search
+    component_cache_size: int = 64
+    # Side of the HPA* clusters in cells
+    hpa_cluster_size: int = 32
 
     # Корень проекта
     base_dir: str = os.path.dirname(os.path.dirname(__file__))
@@ -33,6 +85,8 @@ class Settings(BaseSettings):
 
     @property
     def redis_url(self):
+        if self.redis_unix_socket:
+            return f"unix://{self.redis_unix_socket}"
         return f"redis://{self.redis_host}:{self.redis_port}"
 
 
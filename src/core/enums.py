@@ -9,6 +9,16 @@ class AlgoValues(str, enum.Enum):
     ASTAR_MANHATTAN = "astar[manhattan]"
     ASTAR_EUCLIDEAN = "astar[euclidean]"
     ASTAR_DIAGONAL = "astar[diagonal]"
+    FLAT_ASTAR_MANHATTAN = "flat_astar[manhattan]"
+    FLAT_ASTAR_EUCLIDEAN = "flat_astar[euclidean]"
+    FLAT_ASTAR_DIAGONAL = "flat_astar[diagonal]"
+    BFS_MULTISOURCE = "bfs[multisource]"
+    JPS_MANHATTAN = "jps[manhattan]"
+    JPS_EUCLIDEAN = "jps[euclidean]"
+    JPS_DIAGONAL = "jps[diagonal]"
+    HPA_MANHATTAN = "hpa[manhattan]"
+    HPA_EUCLIDEAN = "hpa[euclidean]"
+    HPA_DIAGONAL = "hpa[diagonal]"
 
 
 class Direction(int, enum.Enum):
@@ -0,0 +1,260 @@
+import asyncio
+import bisect
+import contextlib
+import logging
+import math
+import time
+import typing as t
+
+# seconds, from a Redis round trip on localhost to a search on a huge field
+TIME_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+COUNT_BUCKETS = tuple(10**power for power in range(8))
+
+
+class Histogram:
+    """
+    Distribution of observed values, rendered in the Prometheus text format.
+
+    Like the histograms of prometheus_client: every observation is counted in the first bucket
+    whose upper bound is not less than the value, the buckets are rendered cumulative together
+    with the sum and the count of the observations. The values are kept per set of label values.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = TIME_BUCKETS,
+    ):
+        """
+        Parameters:
+            name (str): The metric name.
+            documentation (str): The help text.
+            labelnames (tuple[str, ...]): The names of the labels every observation has.
+            buckets (tuple[float, ...]): The upper bounds of the buckets, ascending, without +Inf.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # per label values: the counts of every bucket and +Inf, the sum
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+        REGISTRY[name] = self
+
+    def observe(self, value: float, **labels: str):
+        """
+        Count the value.
+
+        Parameters:
+            value (float): The observed value.
+            **labels (str): The values of all the labels of the metric.
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 1), [0.0]
+        counts, total = series
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels: str) -> t.Iterator[None]:
+        """
+        Observe the seconds the block took.
+
+        Parameters:
+            **labels (str): The values of all the labels of the metric.
+        """
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - began, **labels)
+
+    def clear(self):
+        """
+        Drop all the observations.
+        """
+        self._series.clear()
+
+    def render(self) -> list[str]:
+        """
+        Render the metric in the Prometheus text exposition format.
+
+        Returns:
+            list[str]: The lines of the metric.
+        """
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} histogram',
+        ]
+        for key, (counts, total) in sorted(self._series.items()):
+            labels = [f'{name}="{value}"' for name, value in zip(self.labelnames, key)]
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                le = '+Inf' if bound == math.inf else repr(float(bound))
+                bucket_labels = ','.join([*labels, f'le="{le}"'])
+                lines.append(f'{self.name}_bucket{{{bucket_labels}}} {cumulative}')
+            suffix = f'{{{",".join(labels)}}}' if labels else ''
+            lines.append(f'{self.name}_sum{suffix} {total[0]}')
+            lines.append(f'{self.name}_count{suffix} {cumulative}')
+        return lines
+
+
+class CacheGauge:
+    """
+    Statistics of a cache, read when the page is rendered.
+
+    Every numeric statistic of the cache is rendered as a gauge sample labeled with its name,
+    e.g. `pathfinder_state_cache{stat="hits"} 3`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        info: t.Callable[[], t.Mapping[str, int | float]],
+    ):
+        """
+        Parameters:
+            name (str): The metric name.
+            documentation (str): The help text.
+            info (Callable[[], Mapping[str, int | float]]): Returns the statistics, e.g. a `cache_info` method.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.info = info
+        REGISTRY[name] = self
+
+    def render(self) -> list[str]:
+        """
+        Render the metric in the Prometheus text exposition format.
+
+        Returns:
+            list[str]: The lines of the metric.
+        """
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} gauge',
+        ]
+        for stat, value in self.info().items():
+            # the pid identifies the process, it is not a statistic
+            if stat != 'pid':
+                lines.append(f'{self.name}{{stat="{stat}"}} {value}')
+        return lines
+
+
+REGISTRY: dict[str, Histogram | CacheGauge] = {}
+
+REDIS_LATENCY = Histogram(
+    'pathfinder_redis_seconds',
+    'Time of the Redis calls of the state storage.',
+    ('operation',),
+)
+SERIALIZATION_TIME = Histogram(
+    'pathfinder_serialization_seconds',
+    'Time of encoding and decoding the robot states.',
+    ('operation',),
+)
+EXECUTOR_WAIT = Histogram(
+    'pathfinder_executor_wait_seconds',
+    'Time the tasks waited in the executor queue before a worker started them.',
+    ('task',),
+)
+SEARCH_TIME = Histogram(
+    'pathfinder_search_seconds', 'Time of the searches and other tasks.', ('task',)
+)
+NODES_EXPANDED = Histogram(
+    'pathfinder_nodes_expanded',
+    'Nodes expanded by a search.',
+    ('task',),
+    buckets=COUNT_BUCKETS,
+)
+REQUEST_TIME = Histogram(
+    'pathfinder_request_seconds',
+    'Time to answer a SetField, a MoveRequest of a Moving stream or a MoveBatch.',
+    ('rpc',),
+)
+
+
+def render() -> str:
+    """
+    Render all the metrics in the Prometheus text exposition format.
+
+    Returns:
+        str: The metrics page.
+    """
+    return ''.join(
+        f'{line}\n' for metric in REGISTRY.values() for line in metric.render()
+    )
+
+
+# the pages served by `start_server`: the content type and the function rendering the page
+PAGES: dict[str, tuple[str, t.Callable[[], str]]] = {
+    '/metrics': ('text/plain; version=0.0.4; charset=utf-8', render)
+}
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request = await reader.readline()
+        # the headers are not needed
+        while (await reader.readline()).strip():
+            pass
+        parts = request.decode(errors='replace').split()
+        page = PAGES.get(parts[1]) if len(parts) >= 2 and parts[0] == 'GET' else None
+        if page is not None:
+            content_type, render_page = page
+            status, body = '200 OK', render_page().encode()
+        else:
+            content_type, status, body = 'text/plain', '404 Not Found', b'Not found\n'
+        writer.write(
+            f'HTTP/1.1 {status}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            'Connection: close\r\n\r\n'.encode() + body
+        )
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(port: int, host: str | None = None) -> asyncio.Server | None:
+    """
+    Serve the metrics page at `/metrics` and the other `PAGES` over HTTP.
+
+    Parameters:
+        port (int): The port to listen on.
+        host (str | None): The interface to listen on, all of them if None.
+
+    Returns:
+        asyncio.Server | None: The server, or None if the port can't be used; the service works without it.
+    """
+    try:
+        server = await asyncio.start_server(_handle, host, port)
+    except OSError as e:
+        logging.error(f'Metrics are not served: {e}')
+        return None
+    logging.info(f'Metrics served on port {port} at /metrics')
+    return server
@@ -0,0 +1,231 @@
+import collections
+import contextlib
+import contextvars
+import logging
+import random
+import time
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson as json
+from pydantic import BaseModel
+
+from core import metrics
+from core.config import settings
+from pathfinder.stats import Measurement, SearchStats
+
+# the gRPC metadata which asks to trace every request of the call
+METADATA_KEY = 'x-pathfinder-trace'
+
+
+class Trace(BaseModel):
+    """
+    Where the time of one request went.
+
+    Attributes:
+        rpc: The method of the request, empty for a profiled task outside of the traced requests.
+        robot_id: The robot of the request, empty for a whole MoveBatch.
+        started: The wall clock time the request started at.
+        seconds: The time of the request.
+        timings: The seconds spent in redis, serialization, executor_wait and search; handler is the rest.
+        tasks: The number of the tasks run for the request, by function name.
+        search: The work of the searches of the request.
+        state_cache_hits: The robot states found in process memory, see `state.cache`.
+        profiles: The cProfile reports of the tasks picked by `settings.profile_sample_rate`.
+    """
+
+    rpc: str
+    robot_id: str = ''
+    started: float
+    seconds: float = 0.0
+    timings: dict[str, float] = {}
+    tasks: dict[str, int] = {}
+    search: SearchStats = SearchStats()
+    state_cache_hits: int = 0
+    profiles: list[str] = []
+
+    def add_time(self, part: str, seconds: float):
+        self.timings[part] = self.timings.get(part, 0.0) + seconds
+
+    def add_task(self, task: str, measurement: Measurement, wait: float | None):
+        self.tasks[task] = self.tasks.get(task, 0) + 1
+        if wait is not None:
+            self.add_time('executor_wait', wait)
+        self.add_time('search', measurement.seconds)
+        work = measurement.stats
+        self.search.expanded += work.expanded
+        self.search.open_peak = max(self.search.open_peak, work.open_peak)
+        self.search.heuristic_calls += work.heuristic_calls
+        self.search.cache_hits += work.cache_hits
+        if measurement.profile is not None:
+            self.profiles.append(measurement.profile)
+
+
+# the trace of the request handled by the current task, the tasks it starts share it
+_active: contextvars.ContextVar[Trace | None] = contextvars.ContextVar(
+    'trace', default=None
+)
+# the latest traces of the process
+traces: collections.deque[Trace] = collections.deque(maxlen=settings.trace_buffer_size)
+
+
+def requested(metadata: t.Mapping[str, str | bytes] | None) -> bool:
+    """
+    Check whether the client asked to trace the call.
+
+    Parameters:
+        metadata (Mapping[str, str | bytes] | None): The metadata of the call, the multidict of grpclib.
+
+    Returns:
+        bool: True if `x-pathfinder-trace` is set to anything but 0, false or no.
+    """
+    value = metadata.get(METADATA_KEY) if metadata else None
+    if isinstance(value, bytes):
+        value = value.decode(errors='replace')
+    return value is not None and value.lower() not in ('', '0', 'false', 'no')
+
+
+def _sampled(rate: float) -> bool:
+    return rate > 0 and random.random() < rate
+
+
+@contextlib.contextmanager
+def trace(
+    rpc: str, robot_id: str = '', forced: bool = False
+) -> t.Iterator[Trace | None]:
+    """
+    Trace the request if it is sampled, see `settings.trace_sample_rate`.
+
+    The trace is active in the block and the tasks started from it, and is stored when the block exits.
+
+    Parameters:
+        rpc (str): The method of the request.
+        robot_id (str): The robot of the request.
+        forced (bool): Trace the request whatever the sampling, see `requested`.
+
+    Yields:
+        Trace | None: The trace, None if the request isn't traced.
+    """
+    if not forced and not _sampled(settings.trace_sample_rate):
+        yield None
+        return
+    record = Trace(rpc=rpc, robot_id=robot_id, started=time.time())
+    token = _active.set(record)
+    began = time.perf_counter()
+    try:
+        yield record
+    finally:
+        _active.reset(token)
+        record.seconds = time.perf_counter() - began
+        # the parts of the concurrent moves of a MoveBatch may add up to more than the request
+        record.timings['handler'] = max(
+            record.seconds - sum(record.timings.values()), 0.0
+        )
+        store(record)
+
+
+def span(part: str) -> t.ContextManager[None]:
+    """
+    Add the time of the block to the part of the active trace.
+
+    Costs a context variable lookup when no request is traced.
+
+    Parameters:
+        part (str): The part, e.g. redis.
+
+    Returns:
+        ContextManager[None]: The context manager timing the block.
+    """
+    record = _active.get()
+    if record is None:
+        return contextlib.nullcontext()
+    return _span(record, part)
+
+
+@contextlib.contextmanager
+def _span(record: Trace, part: str) -> t.Iterator[None]:
+    began = time.perf_counter()
+    try:
+        yield
+    finally:
+        record.add_time(part, time.perf_counter() - began)
+
+
+def should_profile() -> bool:
+    """
+    Decide whether to run the next task under cProfile, see `settings.profile_sample_rate`.
+    """
+    return _sampled(settings.profile_sample_rate)
+
+
+def record_task(task: str, measurement: Measurement, wait: float | None = None):
+    """
+    Add the measurements of a task to the active trace.
+
+    A profiled task outside of the traced requests is stored in a trace of its own.
+
+    Parameters:
+        task (str): The function name of the task.
+        measurement (Measurement): The measurements of the task.
+        wait (float | None): The seconds the task waited for a worker, None if it ran inline.
+    """
+    record = _active.get()
+    if record is not None:
+        record.add_task(task, measurement, wait)
+    elif measurement.profile is not None:
+        record = Trace(rpc='', started=measurement.started, seconds=measurement.seconds)
+        record.add_task(task, measurement, wait)
+        store(record)
+
+
+def count_state_cache_hits(hits: int = 1):
+    """
+    Add the robot states found in process memory to the active trace.
+    """
+    record = _active.get()
+    if record is not None:
+        record.state_cache_hits += hits
+
+
+# appends the traces to `settings.trace_file` in order, off the event loop
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='traces')
+
+
+def _append(path: str, record: Trace):
+    try:
+        with open(path, 'ab') as file:
+            file.write(json.dumps(record.model_dump()) + b'\n')
+    except OSError as e:
+        logging.error(f'Trace is not written to {path}: {e}')
+
+
+def store(record: Trace):
+    """
+    Keep the trace in the ring buffer and append it to `settings.trace_file`, if set.
+
+    The file is written by a thread, see `flush`.
+
+    Parameters:
+        record (Trace): The finished trace.
+    """
+    traces.append(record)
+    if not settings.trace_file:
+        return
+    _writer.submit(_append, settings.trace_file, record)
+
+
+def flush():
+    """
+    Wait until the stored traces are written to the file.
+    """
+    _writer.submit(lambda: None).result()
+
+
+def dump() -> str:
+    """
+    Get the traces of the ring buffer as a JSON list, the latest last.
+    """
+    return json.dumps([record.model_dump() for record in traces]).decode()
+
+
+metrics.PAGES['/traces'] = ('application/json', dump)
@@ -1,6 +1,7 @@
 import logging
 
-from redis.asyncio import Redis, default_backoff
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.utils import HIREDIS_AVAILABLE
 
 from core import exceptions as exc
 from core.config import settings
@@ -18,12 +19,26 @@ class RedisConnector:
         """
         Initializes the RedisConnector object. Establishes a connection to the Redis database.
 
+        The connections are pooled: at most `settings.redis_max_connections` are open, a request
+        waits up to `settings.redis_pool_timeout` for a free one instead of failing. The
+        connections idle for `settings.redis_health_check_interval` are checked before use.
+
         Raises:
             PathfinderError: If the connection to the Redis database fails.
         """
-        self._connection_to_await = Redis.from_url(
-            settings.redis_url, retry_on_timeout=True, socket_connect_timeout=10
+        options = {}
+        if not settings.redis_unix_socket:
+            options['socket_keepalive'] = settings.redis_socket_keepalive
+        pool = BlockingConnectionPool.from_url(
+            settings.redis_url,
+            max_connections=settings.redis_max_connections,
+            timeout=settings.redis_pool_timeout,
+            health_check_interval=settings.redis_health_check_interval,
+            retry_on_timeout=True,
+            socket_connect_timeout=10,
+            **options,
         )
+        self._connection_to_await = Redis.from_pool(pool)
         self._connection: Redis | None = None
 
     async def __aenter__(self):
@@ -34,9 +49,13 @@ class RedisConnector:
             Redis: The Redis connection.
         """
         self._connection = await self._connection_to_await
-        is_alive = self._connection.ping()
+        is_alive = await self._connection.ping()
         if not is_alive:
             raise exc.PathfinderError("Redis connection failed")
+        logging.info(
+            f"Connected to Redis at {settings.redis_url}, "
+            f"{'hiredis' if HIREDIS_AVAILABLE else 'pure Python'} protocol parser"
+        )
         return self._connection
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
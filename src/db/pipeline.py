@@ -0,0 +1,92 @@
+import asyncio
+import typing as t
+
+from redis.asyncio import Redis
+
+# queues one command on the client it is given
+Command = t.Callable[[t.Any], t.Awaitable[t.Any]]
+
+
+class CommandBatcher:
+    """
+    Sends the commands issued concurrently by many requests to Redis in one pipeline.
+
+    A command is queued until the current iteration of the event loop is over, then all the queued
+    commands go out in one round trip. Under many concurrent streams this replaces a round trip
+    (and a pooled connection) per request with one per loop iteration. The pipeline isn't a
+    transaction: the commands are independent, a failed command fails only its own caller.
+    """
+
+    def __init__(self, connection: Redis):
+        """
+        Parameters:
+            connection (Redis): The Redis connection.
+        """
+        self.redis = connection
+        self._queued: list[tuple[Command, asyncio.Future]] = []
+        self._sending: set[asyncio.Task] = set()
+
+    async def execute(self, command: Command) -> t.Any:
+        """
+        Executes the command with the others issued in the same iteration of the event loop.
+
+        Parameters:
+            command (Command): A function queueing one command on the given client, e.g.
+                `lambda client: client.mget(keys)`. Registered scripts are called with `client=`.
+
+        Returns:
+            Any: The result of the command.
+        """
+        loop = asyncio.get_running_loop()
+        if not self._queued:
+            loop.call_soon(self._flush)
+        future = loop.create_future()
+        self._queued.append((command, future))
+        return await future
+
+    def _flush(self):
+        batch, self._queued = self._queued, []
+        task = asyncio.create_task(self._send(batch))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: list[tuple[Command, asyncio.Future]]):
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for command, _ in batch:
+                    await command(pipe)
+                results = await pipe.execute(raise_on_error=False)
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            _resolve(future, result)
+
+
+def _resolve(future: asyncio.Future, result: t.Any):
+    # the caller may have been cancelled while the batch was out
+    if future.done():
+        return
+    if isinstance(result, Exception):
+        future.set_exception(result)
+    else:
+        future.set_result(result)
+
+
+async def execute(
+    connection: Redis, batcher: CommandBatcher | None, command: Command
+) -> t.Any:
+    """
+    Executes the command in a batch if there is a batcher, else on its own.
+
+    Parameters:
+        connection (Redis): The Redis connection.
+        batcher (CommandBatcher | None): The batcher of the connection, if any.
+        command (Command): A function queueing one command on the given client.
+
+    Returns:
+        Any: The result of the command.
+    """
+    if batcher is None:
+        return await command(connection)
+    return await batcher.execute(command)
@@ -1,8 +1,12 @@
 import datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from pydantic_numpy.model import NumpyModel  # type: ignore
-from pydantic_numpy.typing import Np2DArrayInt32  # type: ignore
+from pydantic_numpy.typing import (  # type: ignore
+    Np1DArrayInt32,
+    Np2DArrayInt32,
+    Np2DArrayUint8,
+)
 
 
 class ActionCount(BaseModel):
@@ -10,8 +14,46 @@ class ActionCount(BaseModel):
     when: datetime.datetime
 
 
+class Abstraction(NumpyModel):
+    """
+    The abstract graph of a maze split into square clusters, built by `pathfinder.hpa`.
+
+    The nodes are the cells on both sides of the cluster entrances. Nodes of adjacent clusters
+    are linked by the entrance transitions, nodes of the same cluster by their shortest distance
+    inside the cluster. Edges are stored in the CSR layout.
+
+    Attributes:
+        cluster_size (int): The side of a cluster in cells.
+        nodes (Np2DArrayInt32): The node cells, sorted by cluster.
+        cluster_offsets (Np1DArrayInt32): The nodes of cluster c are nodes[cluster_offsets[c]:cluster_offsets[c + 1]].
+        edge_offsets (Np1DArrayInt32): The edges of node v are at [edge_offsets[v]:edge_offsets[v + 1]] of the edge arrays.
+        edge_targets (Np1DArrayInt32): The target node of each edge.
+        edge_costs (Np1DArrayInt32): The length of each edge in cells.
+    """
+
+    cluster_size: int
+    nodes: Np2DArrayInt32
+    cluster_offsets: Np1DArrayInt32
+    edge_offsets: Np1DArrayInt32
+    edge_targets: Np1DArrayInt32
+    edge_costs: Np1DArrayInt32
+
+
 class Entry(NumpyModel):
-    maze: Np2DArrayInt32
+    maze: Np2DArrayUint8
     current: tuple[int, int]
     action_count: int
     action_count_log: list[ActionCount]
+    # cached path to the nearest target, starting with the cell it was planned from, and the
+    # index of the current cell in it
+    plan: list[tuple[int, int]] = []
+    plan_targets: list[tuple[int, int]] = []
+    plan_index: int = 0
+    # precomputed by the algorithms which preprocess the field, see AlgorithmProtocol.prepare
+    abstraction: Abstraction | None = None
+    # version of the stored state the entry was read at, see State.set_progress
+    version: int = Field(default=0, exclude=True)
+    # content digest of the stored field, see state.codec.field_id
+    field_id: str = Field(default='', exclude=True)
+    # the plan has been replaced since the entry was read and has to be saved, see State.set_progress
+    plan_changed: bool = Field(default=False, exclude=True)
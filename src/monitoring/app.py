@@ -1,10 +1,102 @@
-import numpy as np
+"""
+Dashboard of the latency breakdown of a running Pathfinder server.
+
+Scrapes the metrics page of the server (see core.metrics) and shows where the time of a step
+goes: Redis, serialization, the wait for a worker and the search itself.
+
+    PYTHONPATH=. METRICS_URL=http://localhost:8000/metrics streamlit run monitoring/app.py
+"""
+
+import os
+import time
+
 import pandas as pd
 import streamlit as st
 
-# Generate some data
-np.random.seed(0)
-df = pd.DataFrame(np.random.randn(20, 3), columns=['a', 'b', 'c'])
+from monitoring.prometheus import Histogram, fetch
+
+METRICS_URL = os.environ.get('METRICS_URL', 'http://localhost:8000/metrics')
+# scrapes kept for the charts
+HISTORY = 120
+QUANTILES = {'p50': 0.5, 'p90': 0.9, 'p99': 0.99}
+SECTIONS = {
+    'pathfinder_request_seconds': 'Requests',
+    'pathfinder_redis_seconds': 'Redis',
+    'pathfinder_serialization_seconds': 'Serialization',
+    'pathfinder_executor_wait_seconds': 'Executor queue wait',
+    'pathfinder_search_seconds': 'Search',
+    'pathfinder_nodes_expanded': 'Nodes expanded',
+}
+
+
+def series_name(histogram: Histogram) -> str:
+    labels = ','.join(histogram.labels.values())
+    return f'{SECTIONS.get(histogram.name, histogram.name)}: {labels}'
+
+
+def summarize(histograms: list[Histogram], scale: float) -> pd.DataFrame:
+    rows = []
+    for histogram in histograms:
+        row = {
+            'series': series_name(histogram),
+            'count': int(histogram.count),
+            'mean': histogram.mean * scale,
+        }
+        for title, q in QUANTILES.items():
+            row[title] = histogram.quantile(q) * scale
+        rows.append(row)
+    return pd.DataFrame(rows).set_index('series') if rows else pd.DataFrame()
+
+
+st.set_page_config(page_title='Pathfinder metrics', layout='wide')
+st.title('Pathfinder latency breakdown')
+
+url = st.sidebar.text_input('Metrics URL', METRICS_URL)
+interval = st.sidebar.slider('Refresh, seconds', 1, 60, 5)
+window = st.sidebar.radio('Statistics', ['since the last refresh', 'since the start'])
+
+try:
+    current = {series_name(item): item for item in fetch(url)}
+except OSError as e:
+    st.error(f'Cannot read {url}: {e}')
+    current = {}
+
+history = st.session_state.setdefault('history', [])
+previous = history[-1][1] if history else {}
+if current:
+    history.append((pd.Timestamp.now(), current))
+    del history[:-HISTORY]
+
+if window == 'since the start':
+    shown = list(current.values())
+else:
+    shown = [item.since(previous.get(name)) for name, item in current.items()]
+
+times = [item for item in shown if item.name != 'pathfinder_nodes_expanded']
+if times:
+    st.subheader('Where the time goes: total and per call, ms')
+    table = summarize(times, 1e3)
+    st.bar_chart(table['mean'] * table['count'])
+    st.dataframe(table.style.format(precision=3), use_container_width=True)
+
+nodes = [item for item in shown if item.name == 'pathfinder_nodes_expanded']
+if nodes:
+    st.subheader('Nodes expanded per search')
+    st.dataframe(summarize(nodes, 1).style.format(precision=0))
+
+if len(history) > 1:
+    st.subheader('p99 over time, ms')
+    p99 = {}
+    for (_, before), (when, after) in zip(history, history[1:]):
+        p99[when] = {
+            name: item.since(before.get(name)).quantile(0.99) * 1e3
+            for name, item in after.items()
+            if item.name != 'pathfinder_nodes_expanded'
+        }
+    st.line_chart(pd.DataFrame.from_dict(p99, orient='index'))
+
+if not current:
+    st.info('No metrics yet: is the server running with METRICS_PORT set?')
 
-# Plot the data
-st.line_chart(df)
+time.sleep(interval)
+st.rerun()
@@ -0,0 +1,144 @@
+import math
+import re
+import urllib.request
+
+from pydantic import BaseModel
+
+SAMPLE = re.compile(
+    r'^(?P<name>[a-zA-Z_:][\w:]*)(?:\{(?P<labels>.*)\})?\s+(?P<value>\S+)'
+)
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+class Histogram(BaseModel):
+    """
+    One series of a Prometheus histogram.
+
+    Attributes:
+        name: The metric name.
+        labels: The labels of the series, without `le`.
+        buckets: The upper bounds of the buckets with their cumulative counts, ending with +Inf.
+        sum: The sum of the observations.
+        count: The number of the observations.
+    """
+
+    name: str
+    labels: dict[str, str]
+    buckets: list[tuple[float, float]] = []
+    sum: float = 0.0
+    count: float = 0.0
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate the quantile like `histogram_quantile` of PromQL.
+
+        The observations are assumed to be spread evenly within the bucket the quantile falls into.
+
+        Args:
+            q (float): The quantile, from 0 to 1.
+
+        Returns:
+            float: The estimate, nan without observations; the largest finite bound if it falls into +Inf.
+        """
+        if not self.count:
+            return math.nan
+        rank = q * self.count
+        lower, below = 0.0, 0.0
+        for bound, cumulative in self.buckets:
+            if cumulative >= rank:
+                if math.isinf(bound):
+                    return lower
+                inside = cumulative - below
+                return (
+                    lower + (bound - lower) * (rank - below) / inside
+                    if inside
+                    else bound
+                )
+            lower, below = bound, cumulative
+        return lower
+
+    def since(self, previous: 'Histogram | None') -> 'Histogram':
+        """
+        Get the observations made after the previous scrape of the series.
+
+        Args:
+            previous (Histogram | None): The series at the previous scrape, None if it didn't exist.
+
+        Returns:
+            Histogram: The difference, the whole series if the server has been restarted since.
+        """
+        if previous is None or previous.count > self.count:
+            return self
+        return Histogram(
+            name=self.name,
+            labels=self.labels,
+            buckets=[
+                (bound, cumulative - before)
+                for (bound, cumulative), (_, before) in zip(
+                    self.buckets, previous.buckets
+                )
+            ],
+            sum=self.sum - previous.sum,
+            count=self.count - previous.count,
+        )
+
+
+def _add_sample(series: dict[tuple, Histogram], match: re.Match):
+    # a bucket, the sum or the count of a histogram series
+    base, _, suffix = match['name'].rpartition('_')
+    labels = dict(LABEL.findall(match['labels'] or ''))
+    le = labels.pop('le', None)
+    key = (base, tuple(sorted(labels.items())))
+    histogram = series.get(key)
+    if histogram is None:
+        histogram = series[key] = Histogram(name=base, labels=labels)
+    value = float(match['value'])
+    if suffix == 'bucket' and le is not None:
+        histogram.buckets.append((float(le), value))
+    elif suffix == 'sum':
+        histogram.sum = value
+    elif suffix == 'count':
+        histogram.count = value
+
+
+def parse(text: str) -> list[Histogram]:
+    """
+    Parse the histograms of a page in the Prometheus text exposition format.
+
+    Args:
+        text (str): The page.
+
+    Returns:
+        list[Histogram]: Every series of every histogram, in the order of the page. The other metrics are skipped.
+    """
+    histograms: set[str] = set()
+    series: dict[tuple, Histogram] = {}
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(maxsplit=3)
+            if kind.strip() == 'histogram':
+                histograms.add(name)
+            continue
+        match = SAMPLE.match(line)
+        if match is not None and match['name'].rpartition('_')[0] in histograms:
+            _add_sample(series, match)
+    return list(series.values())
+
+
+def fetch(url: str, timeout: float = 5) -> list[Histogram]:
+    """
+    Fetch and parse the histograms of a metrics page.
+
+    Args:
+        url (str): The URL of the page, e.g. http://localhost:8000/metrics.
+        timeout (float, optional): The seconds to wait for the page. Defaults to 5.
+
+    Returns:
+        list[Histogram]: Every series of every histogram.
+    """
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return parse(response.read().decode())
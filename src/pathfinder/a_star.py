@@ -1,11 +1,29 @@
 import enum
 import heapq
-from functools import cache
+import math
+import os
+import threading
+import typing as t
+from functools import lru_cache
 
+import numpy as np
 from numpy.typing import NDArray
 
+from core.config import settings
+from pathfinder import stats
 from pathfinder.abstract import AlgorithmProtocol
 
+# the per-cell heuristic field is precomputed when cells * goals doesn't exceed this size
+HEURISTIC_FIELD_MAX_SIZE = 2**16
+# below this number of goals a Python loop over the goals is cheaper than a NumPy call
+VECTORIZE_MIN_GOALS = 16
+
+# neighbors in the order they are expanded: right, left, down, up
+NEIGHBORS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+# among equally short paths the first move is chosen in this order: down, right, up, left
+MOVE_PREFERENCE = ((1, 0), (0, 1), (-1, 0), (0, -1))
+MOVE_RANK = {move: rank for rank, move in enumerate(MOVE_PREFERENCE)}
+
 
 class Mode(str, enum.Enum):
     """
@@ -22,12 +40,13 @@ class Mode(str, enum.Enum):
     DIAGONAL = "diagonal"
 
 
-# TODO: implement shared cache between processes(via redis)
-@cache
 def distance(a: tuple[int, int], b: tuple[int, int], mode: str = Mode.MANHATTAN):
     """
     Calculate the heuristic distance between a and b according to the specified mode.
 
+    Only the modes listed in `settings.distance_cache_modes` go through the bounded per-process
+    cache, the others are cheaper to compute than to look up.
+
     Args:
         a (tuple[int, int]): The first point.
         b (tuple[int, int]): The second point.
@@ -39,7 +58,13 @@ def distance(a: tuple[int, int], b: tuple[int, int], mode: str = Mode.MANHATTAN)
     Raises:
         ValueError: If the mode is invalid.
     """
+    if mode in _CACHED_MODES:
+        _thread_lookups.lookups += 1
+        return _cached_distance(a, b, mode)
+    return _distance(a, b, mode)
 
+
+def _distance(a: tuple[int, int], b: tuple[int, int], mode: str) -> float:
     if mode == Mode.MANHATTAN:
         return abs(b[0] - a[0]) + abs(b[1] - a[1])
     elif mode == Mode.EUCLIDEAN:
@@ -50,6 +75,62 @@ def distance(a: tuple[int, int], b: tuple[int, int], mode: str = Mode.MANHATTAN)
         raise ValueError("Invalid mode")
 
 
+class _Lookups(threading.local):
+    # the lookups and the misses of the distance cache by the current thread: the cache is
+    # shared by the search threads, its own statistics mix their hits
+    lookups = 0
+    misses = 0
+
+
+_thread_lookups = _Lookups()
+
+
+def _missed_distance(a: tuple[int, int], b: tuple[int, int], mode: str) -> float:
+    # called by the cache on a miss, in the thread of the lookup
+    _thread_lookups.misses += 1
+    return _distance(a, b, mode)
+
+
+def _thread_hits() -> int:
+    return _thread_lookups.lookups - _thread_lookups.misses
+
+
+_CACHED_MODES = frozenset(settings.distance_cache_modes)
+_cached_distance = lru_cache(maxsize=settings.distance_cache_size)(_missed_distance)
+
+
+def distance_cache_info() -> dict[str, int | float]:
+    """
+    Get the statistics of the distance cache of the current process.
+
+    Every process pool worker has its own cache, so the statistics are per worker. They are
+    reported with the measured tasks, see `pathfinder.stats.cache_info`.
+
+    Returns:
+        dict[str, int | float]: The worker pid, cache hits, misses, current and maximum size and hit rate.
+    """
+    info = _cached_distance.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'pid': os.getpid(),
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'maxsize': info.maxsize or 0,
+        'hit_rate': info.hits / lookups if lookups else 0.0,
+    }
+
+
+stats.watch_cache('distance', distance_cache_info)
+
+
+def distance_cache_clear():
+    """
+    Clear the distance cache of the current process and reset its statistics.
+    """
+    _cached_distance.cache_clear()
+
+
 def heuristic(
     point: tuple[int, int], goals: list[tuple[int, int]], mode: str = Mode.MANHATTAN
 ):
@@ -71,6 +152,101 @@ def heuristic(
     return min(distance(point, goal, mode) for goal in goals)
 
 
+def nearest_goal_distance(
+    points: NDArray, goals: NDArray, mode: str = Mode.MANHATTAN
+) -> NDArray:
+    """
+    Calculate the heuristic distance between each point and its nearest goal at once.
+
+    Args:
+        points (numpy.NDArray): The from points as an array of shape (K, 2).
+        goals (numpy.NDArray): The goals as an array of shape (G, 2).
+        mode (Mode, optional): The type of heuristic to be used. Defaults to Mode.MANHATTAN.
+
+    Returns:
+        numpy.NDArray: The distances to the nearest goal, of shape (K,).
+
+    Raises:
+        ValueError: If the mode is invalid.
+    """
+    delta = np.abs(points[:, np.newaxis, :] - goals[np.newaxis, :, :])
+
+    if mode == Mode.MANHATTAN:
+        distances = delta.sum(axis=2)
+    elif mode == Mode.EUCLIDEAN:
+        distances = np.sqrt((delta**2).sum(axis=2))
+    elif mode == Mode.DIAGONAL:
+        distances = delta.max(axis=2)
+    else:
+        raise ValueError("Invalid mode")
+
+    return distances.min(axis=1)
+
+
+class GoalHeuristic:
+    """
+    The heuristic distance to the nearest goal, prepared once per search.
+
+    For small grids the distance is precomputed for every cell, so evaluating it is a lookup.
+    Otherwise the goals are kept as an array and a batch of points is evaluated with one NumPy
+    call, which pays off with many goals; with a few goals `heuristic` is used as is.
+    """
+
+    def __init__(
+        self,
+        goals: list[tuple[int, int]],
+        mode: str = Mode.MANHATTAN,
+        shape: tuple[int, ...] | None = None,
+    ):
+        """
+        Args:
+            goals (list[tuple[int, int]]): The list of goals.
+            mode (Mode, optional): The type of heuristic to be used. Defaults to Mode.MANHATTAN.
+            shape (tuple[int, int], optional): The maze shape, needed to precompute the per-cell field.
+
+        Raises:
+            ValueError: If the mode is invalid.
+        """
+        self.goals = goals
+        self.mode = mode
+        self._goal_array = np.array(goals, dtype=np.int64).reshape(-1, 2)
+        self._field = None
+        self._columns = 0
+
+        if shape is not None and shape[0] * shape[1] * len(goals) <= (
+            HEURISTIC_FIELD_MAX_SIZE
+        ):
+            cells = np.indices(shape).reshape(2, -1).T
+            field = nearest_goal_distance(cells, self._goal_array, mode)
+            self._field = field.astype(np.float64).data
+            self._columns = shape[1]
+
+    def __call__(self, point: tuple[int, int]) -> float:
+        """
+        Calculate the heuristic distance between point and the nearest goal.
+        """
+        return self.batch([point])[0]
+
+    def batch(self, points: list[tuple[int, int]]) -> list[float]:
+        """
+        Calculate the heuristic distances between the points and their nearest goals.
+
+        Args:
+            points (list[tuple[int, int]]): The from points.
+
+        Returns:
+            list[float]: The distances to the nearest goal, in the order of points.
+        """
+        if self._field is not None:
+            field, columns = self._field, self._columns
+            return [field[i * columns + j] for i, j in points]
+        if len(self.goals) < VECTORIZE_MIN_GOALS:
+            return [heuristic(point, self.goals, self.mode) for point in points]
+        return nearest_goal_distance(
+            np.array(points, dtype=np.int64), self._goal_array, self.mode
+        ).tolist()
+
+
 def search(
     maze: NDArray,
     start: tuple[int, int],
@@ -80,6 +256,9 @@ def search(
     """
     Implement the A* search algorithm.
 
+    Among equally short paths to the nearest goals the one starting with the most preferred move
+    (see MOVE_PREFERENCE) is returned, so every engine makes the same first move on ties.
+
     Args:
         maze (numpy.NDArray): The maze represented as a 2D array.
         start (tuple[int, int]): The start point.
@@ -90,64 +269,147 @@ def search(
         list[tuple[int, int]] | None: A list of tuples representing the path from the start point to the goal point, or None if no path exists.
     """
 
-    neighbors = [(0, 1), (0, -1), (1, 0), (-1, 0)]
-    close_set = set()
-    open_set: list = []
+    goal_set = set(goals)
+    close_set: set[tuple[int, int]] = set()
 
+    estimate = GoalHeuristic(goals, mode, maze.shape)
     gscore = {start: 0}
-    fscore = {start: heuristic(start, goals, mode)}
-    # binary heap is faster than list on insert while keeping the order
-    heapq.heappush(open_set, (fscore[start], start))
-
     came_from: dict[tuple[int, int], tuple[int, int]] = {}
-    while len(open_set) > 0:
-        current = heapq.heappop(open_set)[1]
-
-        if current in goals:
-            data = []
-            while current in came_from:
-                data.append(current)
-                current = came_from[current]
-            data.reverse()
-            return data
+    # rank in MOVE_PREFERENCE of the first move of the best known path to the node
+    first_move: dict[tuple[int, int], int] = {}
+    # binary heap with lazy deletion: a node is pushed again when a shorter path to it is found,
+    # stale entries are skipped on pop, so membership is never looked up in the heap itself.
+    # On equal f the node with the lower g goes first, so all the predecessors of a node on its
+    # shortest paths are expanded before it and its first move is final when it is expanded
+    open_set: list = [(estimate(start), 0, start)]
+    # heuristic evaluations and the largest open set, reported with the expanded nodes
+    evaluated, peak = 1, 1
+    # the distance cache is consulted by the heuristic only with a few goals on a large maze
+    cache_hits = _thread_hits()
+
+    while open_set:
+        fscore, g, current = heapq.heappop(open_set)
+
+        if current in close_set:
+            # discard the stale entry of the node which has been already expanded
+            continue
+
+        if current in goal_set:
+            # the other nearest goals are queued with the same scores: pick the best first move
+            current = _best_goal(open_set, fscore, g, current, goal_set, first_move)
+            _count(len(close_set), peak, evaluated, mode, cache_hits)
+            return _unwind(came_from, current)
 
         close_set.add(current)
-        for i, j in neighbors:
-            neighbor = current[0] + i, current[1] + j
-            tentative_g_score = gscore[current] + distance(current, neighbor, mode)
-
-            if 0 <= neighbor[0] < maze.shape[0]:
-                if 0 <= neighbor[1] < maze.shape[1]:
-                    if maze[neighbor[0]][neighbor[1]] == 1:
-                        # discard the neighbor which is an obstacle
-                        continue
-                else:
-                    # discard the neighbor which is out of range
-                    continue
-            else:
-                # discard the neighbor which is out of range
-                continue
-
-            if neighbor in close_set and tentative_g_score >= gscore.get(neighbor, 0):
-                # discard the neighbor which has been already visited
-                continue
-
-            if tentative_g_score < gscore.get(neighbor, 0) or neighbor not in [
-                i for i in open_set
-            ]:
-                came_from[neighbor] = current
-                gscore[neighbor] = tentative_g_score
-                fscore[neighbor] = tentative_g_score + heuristic(neighbor, goals, mode)
-                heapq.heappush(open_set, (fscore[neighbor], neighbor))
-
+        improved = _expand(
+            maze, start, current, g, close_set, gscore, came_from, first_move
+        )
+
+        if improved:
+            # evaluate the heuristic for all improved neighbors at once
+            for neighbor, h in zip(improved, estimate.batch(improved)):
+                g_neighbor = gscore[neighbor]
+                heapq.heappush(open_set, (g_neighbor + h, g_neighbor, neighbor))
+            evaluated += len(improved)
+            if len(open_set) > peak:
+                peak = len(open_set)
+
+    _count(len(close_set), peak, evaluated, mode, cache_hits)
     return None
 
 
+def _neighbors(
+    maze: NDArray, current: tuple[int, int], close_set: set[tuple[int, int]]
+) -> t.Iterator[tuple[tuple[int, int], tuple[int, int]]]:
+    # the move to each free neighbor which has not been expanded yet, and the neighbor
+    for i, j in NEIGHBORS:
+        neighbor = current[0] + i, current[1] + j
+
+        if not (0 <= neighbor[0] < maze.shape[0] and 0 <= neighbor[1] < maze.shape[1]):
+            # discard the neighbor which is out of range
+            continue
+        if maze[neighbor[0], neighbor[1]] == 1:
+            # discard the neighbor which is an obstacle
+            continue
+        if neighbor in close_set:
+            # the heuristic is consistent, so the expanded nodes already have the best score
+            continue
+        yield (i, j), neighbor
+
+
+def _expand(
+    maze: NDArray,
+    start: tuple[int, int],
+    current: tuple[int, int],
+    g: int,
+    close_set: set[tuple[int, int]],
+    gscore: dict[tuple[int, int], int],
+    came_from: dict[tuple[int, int], tuple[int, int]],
+    first_move: dict[tuple[int, int], int],
+) -> list[tuple[int, int]]:
+    # update the paths to the neighbors, return the neighbors whose g-score has improved
+    improved = []
+    for move_to, neighbor in _neighbors(maze, current, close_set):
+        move = MOVE_RANK[move_to] if current == start else first_move[current]
+        # neighbors are adjacent cells: every mode measures the step as 1
+        tentative_g_score = g + 1
+        known_g_score = gscore.get(neighbor, math.inf)
+        if tentative_g_score == known_g_score:
+            # equally short path: prefer the better first move, then the latest parent
+            if move <= first_move[neighbor]:
+                came_from[neighbor] = current
+                first_move[neighbor] = move
+        elif tentative_g_score < known_g_score:
+            came_from[neighbor] = current
+            gscore[neighbor] = tentative_g_score
+            first_move[neighbor] = move
+            improved.append(neighbor)
+    return improved
+
+
+def _best_goal(
+    open_set: list,
+    fscore: float,
+    g: int,
+    current: tuple[int, int],
+    goal_set: set[tuple[int, int]],
+    first_move: dict[tuple[int, int], int],
+) -> tuple[int, int]:
+    # the queued goals with the same scores as the current one, by the rank of the first move
+    while open_set and open_set[0][:2] == (fscore, g):
+        other = heapq.heappop(open_set)[2]
+        if other in goal_set and first_move[other] < first_move[current]:
+            current = other
+    return current
+
+
+def _unwind(
+    came_from: dict[tuple[int, int], tuple[int, int]], current: tuple[int, int]
+) -> list[tuple[int, int]]:
+    data = []
+    while current in came_from:
+        data.append(current)
+        current = came_from[current]
+    data.reverse()
+    return data
+
+
+def _count(expanded: int, peak: int, evaluated: int, mode: str, cache_hits: int):
+    stats.count_search(expanded, peak, evaluated)
+    if mode in _CACHED_MODES:
+        stats.count_cache_hits(_thread_hits() - cache_hits)
+
+
 class AStar(AlgorithmProtocol):
     def __init__(self, mode: str = Mode.MANHATTAN):
         self.mode = mode
 
     def search(
-        self, maze: NDArray, start: tuple[int, int], goals: list[tuple[int, int]]
+        self,
+        maze: NDArray,
+        start: tuple[int, int],
+        goals: list[tuple[int, int]],
+        prepared: None = None,
+        field_id: str = '',
     ) -> list[tuple[int, int]] | None:
         return search(maze, start, goals, self.mode)
@@ -5,6 +5,9 @@ from numpy.typing import NDArray
 
 
 class AlgorithmProtocol(t.Protocol):
+    # whether `prepare` builds per-field data worth keeping for all the moves on the field
+    preprocessing: t.ClassVar[bool] = False
+
     def __init__(self, mode: str = 'default', process_pool=None) -> None:
         """
         Args:
@@ -12,9 +15,26 @@ class AlgorithmProtocol(t.Protocol):
         """
         ...
 
+    def prepare(self, maze: NDArray) -> t.Any:
+        """
+        Precompute the data reused by the searches on the maze.
+
+        Args:
+            maze (numpy.NDArray): The maze represented as a 2D array.
+
+        Returns:
+            Any: The data to pass to `search` as prepared, None if the algorithm needs none.
+        """
+        return None
+
     @abc.abstractmethod
     def search(
-        self, maze: NDArray, start: t.Tuple[int, int], goals: t.List[t.Tuple[int, int]]
+        self,
+        maze: NDArray,
+        start: t.Tuple[int, int],
+        goals: t.List[t.Tuple[int, int]],
+        prepared: t.Any = None,
+        field_id: str = '',
     ) -> t.List[t.Tuple[int, int]] | None:
         """
         Implement the A* search algorithm.
@@ -23,6 +43,8 @@ class AlgorithmProtocol(t.Protocol):
             maze (numpy.NDArray): The maze represented as a 2D array.
             start (tuple[int, int]): The start point.
             goals (list[tuple[int, int]]): The goal points.
+            prepared (Any, optional): The result of `prepare` for the maze.
+            field_id (str, optional): The id of the field, for the caches kept per field. Empty if unknown.
 
         Returns:
             list[tuple[int, int]] | None: A list of tuples representing the path from the start point to the goal point, or None if no path exists.
@@ -0,0 +1,196 @@
+import enum
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from numpy.typing import NDArray
+
+from core.config import settings
+from pathfinder import stats
+from pathfinder.a_star import MOVE_PREFERENCE
+from pathfinder.abstract import AlgorithmProtocol
+
+UNREACHABLE = -1
+
+
+class Mode(str, enum.Enum):
+    """
+    Enum class for specifying the BFS variant.
+
+    Attributes:
+        MULTISOURCE: Search from all goals at once towards every cell of the maze.
+    """
+
+    MULTISOURCE = "multisource"
+
+
+def distance_field(maze: NDArray, goals: list[tuple[int, int]]) -> NDArray:
+    """
+    Calculate the distance to the nearest goal for every cell with a reverse BFS from all goals.
+
+    The BFS advances the whole wavefront with a few NumPy operations per level, so the cost is
+    proportional to the path length in Python and to the number of cells in NumPy.
+
+    Args:
+        maze (numpy.NDArray): The maze represented as a 2D array.
+        goals (list[tuple[int, int]]): The goal points.
+
+    Returns:
+        numpy.NDArray: The distances as an int32 array of the maze shape, UNREACHABLE for the cells without a path to any goal.
+    """
+    n, m = maze.shape
+    size = n * m
+    free = (np.asarray(maze) != 1).ravel()
+    field = np.full(size, UNREACHABLE, dtype=np.int32)
+
+    frontier = np.unique(np.array([i * m + j for i, j in goals], dtype=np.int64))
+    frontier = frontier[free[frontier]]
+    field[frontier] = 0
+
+    level = 0
+    expanded = peak = 0
+    while frontier.size:
+        level += 1
+        expanded += frontier.size
+        peak = max(peak, frontier.size)
+        columns = frontier % m
+        candidates = np.concatenate(
+            (
+                frontier[columns < m - 1] + 1,
+                frontier[columns > 0] - 1,
+                frontier[frontier < size - m] + m,
+                frontier[frontier >= m] - m,
+            )
+        )
+        candidates = candidates[free[candidates] & (field[candidates] == UNREACHABLE)]
+        frontier = np.unique(candidates)
+        field[frontier] = level
+
+    stats.count_search(expanded, peak)
+    return field.reshape(n, m)
+
+
+def _fingerprint(maze: NDArray) -> tuple:
+    return maze.shape, hashlib.blake2b(maze.tobytes(), digest_size=16).digest()
+
+
+_fields: OrderedDict[tuple, NDArray] = OrderedDict()
+# the searches of the THREAD placement share the cache, see services.dispatch
+_fields_lock = threading.Lock()
+
+
+def cached_distance_field(
+    maze: NDArray, goals: list[tuple[int, int]], field_id: str = ''
+) -> NDArray:
+    """
+    Get the distance field of the maze and goals from the per-process LRU cache.
+
+    The field depends only on the maze and the set of goals, so the subsequent moves towards the
+    same goals reuse it. At most `settings.distance_field_cache_size` fields are kept. The fields
+    are keyed by the field id, so a repeated lookup costs O(goals); without the id the whole maze
+    is hashed on every call.
+
+    Args:
+        maze (numpy.NDArray): The maze represented as a 2D array.
+        goals (list[tuple[int, int]]): The goal points.
+        field_id (str, optional): The id of the maze content, see `state.codec.field_id`.
+
+    Returns:
+        numpy.NDArray: The distance field, see `distance_field`.
+    """
+    key = (field_id or _fingerprint(maze), frozenset(goals))
+    with _fields_lock:
+        field = _fields.get(key)
+        if field is not None:
+            _fields.move_to_end(key)
+    if field is not None:
+        stats.count_cache_hits()
+        return field
+
+    # computed out of the lock, two threads may compute the same field at worst
+    field = distance_field(maze, goals)
+    with _fields_lock:
+        _fields[key] = field
+        while len(_fields) > settings.distance_field_cache_size:
+            _fields.popitem(last=False)
+    return field
+
+
+def distance_field_cache_clear():
+    """
+    Clear the distance field cache of the current process.
+    """
+    with _fields_lock:
+        _fields.clear()
+
+
+def descend(field: NDArray, start: tuple[int, int]) -> list[tuple[int, int]] | None:
+    """
+    Follow the distance field from the start point down to the nearest goal.
+
+    Among equally short paths the moves are chosen in the order of MOVE_PREFERENCE, so the first
+    move is the same as the one of `pathfinder.a_star.search`.
+
+    Args:
+        field (numpy.NDArray): The distance field, see `distance_field`.
+        start (tuple[int, int]): The start point.
+
+    Returns:
+        list[tuple[int, int]] | None: A list of tuples representing the path from the start point to the goal point, or None if no path exists.
+    """
+    n, m = field.shape
+    level = int(field[start])
+    if level == UNREACHABLE:
+        return None
+
+    path = []
+    current = start
+    while level > 0:
+        level -= 1
+        for i, j in MOVE_PREFERENCE:
+            neighbor = current[0] + i, current[1] + j
+            if 0 <= neighbor[0] < n and 0 <= neighbor[1] < m:
+                if field[neighbor] == level:
+                    break
+        current = neighbor
+        path.append(current)
+    return path
+
+
+def search(
+    maze: NDArray,
+    start: tuple[int, int],
+    goals: list[tuple[int, int]],
+    field_id: str = '',
+) -> list[tuple[int, int]] | None:
+    """
+    Find the shortest path to the nearest goal with the multi-source distance field.
+
+    Args:
+        maze (numpy.NDArray): The maze represented as a 2D array.
+        start (tuple[int, int]): The start point.
+        goals (list[tuple[int, int]]): The goal points.
+        field_id (str, optional): The id of the field, see `cached_distance_field`.
+
+    Returns:
+        list[tuple[int, int]] | None: A list of tuples representing the path from the start point to the goal point, or None if no path exists.
+    """
+    return descend(cached_distance_field(maze, goals, field_id), start)
+
+
+class MultiSourceBFS(AlgorithmProtocol):
+    def __init__(self, mode: str = Mode.MULTISOURCE):
+        if mode != Mode.MULTISOURCE:
+            raise ValueError(f'Unknown BFS mode: {mode}')
+        self.mode = mode
+
+    def search(
+        self,
+        maze: NDArray,
+        start: tuple[int, int],
+        goals: list[tuple[int, int]],
+        prepared: None = None,
+        field_id: str = '',
+    ) -> list[tuple[int, int]] | None:
+        return search(maze, start, goals, field_id)
@@ -0,0 +1,89 @@
+import numpy as np
+from numpy.typing import NDArray
+
+# the label of the obstacles
+OBSTACLE = 0
+
+
+def label_components(maze: NDArray) -> NDArray:
+    """
+    Label the connected components of the free cells, the moves being the four directions.
+
+    A vectorized union-find over the horizontal runs of free cells: every round hooks the root of
+    the larger index of each vertical edge between two trees to the smaller one and flattens the
+    trees by pointer jumping, until no edge joins two trees. Only the first edge between the same
+    pair of runs is kept, so the open areas cost little more than the corridors.
+
+    Args:
+        maze (numpy.NDArray): The maze represented as a 2D array.
+
+    Returns:
+        numpy.NDArray: The labels of the cells in the maze shape, OBSTACLE for the obstacles and 1 to
+        the number of components for the free cells, in the smallest unsigned type which fits.
+    """
+    n, m = maze.shape
+    free = np.asarray(maze) != 1
+
+    run_start = free.copy()
+    run_start[:, 1:] &= ~free[:, :-1]
+    # the run of every free cell, the obstacles get the run before them
+    run = np.cumsum(run_start, dtype=np.int32).reshape(n, m) - 1
+    runs = int(run[-1, -1]) + 1 if run.size else 0
+    if not runs:
+        return np.zeros((n, m), dtype=np.uint8)
+
+    vertical = free[:-1] & free[1:]
+    vertical[:, 1:] &= ~(free[:-1, :-1] & free[1:, :-1])
+    upper, lower = run[:-1][vertical], run[1:][vertical]
+
+    parent = np.arange(runs, dtype=np.int32)
+    while upper.size:
+        upper_root, lower_root = parent[upper], parent[lower]
+        apart = upper_root != lower_root
+        upper, lower = upper[apart], lower[apart]
+        upper_root, lower_root = upper_root[apart], lower_root[apart]
+        # a root hooked by many edges keeps one of them, the others are joined in the next rounds;
+        # the indices only decrease, so there are no cycles
+        parent[np.maximum(upper_root, lower_root)] = np.minimum(upper_root, lower_root)
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+
+    is_root = parent == np.arange(runs)
+    count = int(is_root.sum())
+    run_labels = np.cumsum(is_root).astype(np.min_scalar_type(count))[parent]
+    # the obstacles before the first run index it with -1, their label is dropped anyway
+    return np.where(free, run_labels[run], OBSTACLE).astype(run_labels.dtype)
+
+
+def reachable(
+    labels: NDArray, start: tuple[int, int], goals: list[tuple[int, int]]
+) -> list[tuple[int, int]]:
+    """
+    Get the goals in the component of the start, in O(goals).
+
+    A start on an obstacle, which the searches step out of, reaches the components of its free
+    neighbors.
+
+    Args:
+        labels (numpy.NDArray): The labels of the maze, see `label_components`.
+        start (tuple[int, int]): The start point.
+        goals (list[tuple[int, int]]): The goal points.
+
+    Returns:
+        list[tuple[int, int]]: The goals reachable from the start, in the order of the goals.
+    """
+    component = labels[start]
+    if component != OBSTACLE:
+        return [goal for goal in goals if labels[goal] == component]
+
+    n, m = labels.shape
+    around = {
+        labels[start[0] + i, start[1] + j]
+        for i, j in ((0, 1), (0, -1), (1, 0), (-1, 0))
+        if 0 <= start[0] + i < n and 0 <= start[1] + j < m
+    }
+    around.discard(OBSTACLE)
+    return [goal for goal in goals if labels[goal] in around]
@@ -1,4 +1,5 @@
 import logging
+import typing as t
 
 from numpy.typing import NDArray
 
@@ -6,42 +7,91 @@ from core.enums import Direction
 from pathfinder.managers import get_algo
 
 
-def determine_direction(
-    maze: NDArray, current: tuple[int, int], goals: list[tuple[int, int]], algo: str
-) -> int:
+def prepare_field(maze: NDArray, algo: str) -> t.Any:
     """
-    Determine the direction to move based on the current position, goals, and algorithm.
+    Precompute the data the algorithm reuses for all the searches on the maze.
+
+    Parameters:
+    maze (NDArray): The maze represented as a 2D array.
+    algo (str): The name of the algorithm to use for determining the path.
+
+    Returns:
+    Any: The prepared data, None if the algorithm needs none.
+    """
+    return get_algo(algo).prepare(maze)
+
+
+def plan_route(
+    maze: NDArray,
+    current: tuple[int, int],
+    goals: list[tuple[int, int]],
+    algo: str,
+    prepared: t.Any = None,
+    field_id: str = '',
+) -> list[tuple[int, int]] | None:
+    """
+    Compute the path from the current position to the nearest goal.
 
     Parameters:
     maze (NDArray): The maze represented as a 2D array.
     current (tuple[int, int]): The current position in the maze.
     goals (list[tuple[int, int]]): The list of goal positions in the maze.
     algo (str): The name of the algorithm to use for determining the path.
+    prepared (Any): The result of `prepare_field` for the maze.
+    field_id (str): The id of the field, see `state.codec.field_id`. Empty if unknown.
 
     Returns:
-    int: The direction to move next.
+    list[tuple[int, int]] | None: The path without the current position, or None if no goal is reachable.
+    Hierarchical algorithms may return only the beginning of the path.
+    """
+    return get_algo(algo).search(maze, current, goals, prepared, field_id)
 
-    Raises:
-    ValueError: If the goals are not reachable or the current position is already at a goal.
+
+def next_step_from_plan(
+    plan: list[tuple[int, int]],
+    plan_targets: list[tuple[int, int]],
+    current: tuple[int, int],
+    goals: list[tuple[int, int]],
+    start: int = 0,
+) -> tuple[int, int] | None:
     """
+    Get the next cell of a previously computed plan if the plan is still valid.
 
-    algorithm = get_algo(algo)
+    The plan is valid while the robot stands on its cell at `start`, its last cell is still a goal
+    and no goal has been added since it was computed: removing goals can't bring another goal
+    closer than the planned one. A partial plan, which doesn't end at a goal, is valid only while
+    the goals stay the same.
 
-    if not goals:
-        return Direction.FINISH
+    Parameters:
+    plan (list[tuple[int, int]]): The planned path, starting with the position it was planned from.
+    plan_targets (list[tuple[int, int]]): The goals the plan was computed for.
+    current (tuple[int, int]): The current position in the maze.
+    goals (list[tuple[int, int]]): The current list of goal positions.
+    start (int, optional): The index of the cell of the plan the robot has reached. Defaults to 0.
 
-    path: list[tuple[int, int]] | None = algorithm.search(maze, current, goals)
+    Returns:
+    tuple[int, int] | None: The next cell to move to, or None if the plan must be recomputed.
+    """
+    if len(plan) < start + 2 or plan[start] != current:
+        return None
+    if plan[-1] not in goals and set(goals) != set(plan_targets):
+        return None
+    if not set(goals) <= set(plan_targets):
+        return None
+    return plan[start + 1]
 
-    if not path:
-        if path is None:
-            logging.error("Goals are not reachable")
-        else:
-            logging.error("Already in place")
 
-        return Direction.ERROR
+def direction_to(current: tuple[int, int], where_to: tuple[int, int]) -> int:
+    """
+    Convert a move between two adjacent cells into a direction.
 
-    where_to: tuple[int, int] = path[0]
+    Parameters:
+    current (tuple[int, int]): The current position in the maze.
+    where_to (tuple[int, int]): The adjacent cell to move to.
 
+    Returns:
+    int: The direction to move next.
+    """
     if where_to[0] > current[0]:
         return Direction.DOWN
     if where_to[0] < current[0]:
@@ -53,3 +103,52 @@ def determine_direction(
 
     logging.error("Unknown direction")
     return Direction.ERROR
+
+
+def direction_from_path(
+    current: tuple[int, int], path: list[tuple[int, int]] | None
+) -> int:
+    """
+    Determine the direction of the first move of the path.
+
+    Parameters:
+    current (tuple[int, int]): The current position in the maze.
+    path (list[tuple[int, int]] | None): The path without the current position.
+
+    Returns:
+    int: The direction to move next, or ERROR if there is no move to make.
+    """
+    if not path:
+        if path is None:
+            logging.error("Goals are not reachable")
+        else:
+            logging.error("Already in place")
+
+        return Direction.ERROR
+
+    return direction_to(current, path[0])
+
+
+def determine_direction(
+    maze: NDArray, current: tuple[int, int], goals: list[tuple[int, int]], algo: str
+) -> int:
+    """
+    Determine the direction to move based on the current position, goals, and algorithm.
+
+    Parameters:
+    maze (NDArray): The maze represented as a 2D array.
+    current (tuple[int, int]): The current position in the maze.
+    goals (list[tuple[int, int]]): The list of goal positions in the maze.
+    algo (str): The name of the algorithm to use for determining the path.
+
+    Returns:
+    int: The direction to move next.
+
+    Raises:
+    ValueError: If the goals are not reachable or the current position is already at a goal.
+    """
+
+    if not goals:
+        return Direction.FINISH
+
+    return direction_from_path(current, plan_route(maze, current, goals, algo))
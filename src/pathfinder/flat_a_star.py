@@ -0,0 +1,184 @@
+import heapq
+
+import numpy as np
+from numpy.typing import NDArray
+
+from pathfinder import stats
+from pathfinder.a_star import MOVE_RANK, GoalHeuristic, Mode
+from pathfinder.abstract import AlgorithmProtocol
+
+
+def search(
+    maze: NDArray,
+    start: tuple[int, int],
+    goals: list[tuple[int, int]],
+    mode: str = Mode.MANHATTAN,
+) -> list[tuple[int, int]] | None:
+    """
+    Implement the A* search algorithm over preallocated flat arrays.
+
+    Cell (i, j) is addressed by the flat index i * M + j. The g-scores, parents and closed flags
+    are kept in NumPy arrays of the maze size instead of dicts keyed by tuples, and are accessed
+    through memoryviews, which yield plain Python scalars. Expansion order and tie breaking are the
+    same as in `pathfinder.a_star.search`, so both engines return the same paths.
+
+    Args:
+        maze (numpy.NDArray): The maze represented as a 2D array.
+        start (tuple[int, int]): The start point.
+        goals (list[tuple[int, int]]): The goal points.
+        mode (Mode, optional): The type of heuristic to be used. Defaults to Mode.MANHATTAN ("manhattan").
+
+    Returns:
+        list[tuple[int, int]] | None: A list of tuples representing the path from the start point to the goal point, or None if no path exists.
+    """
+    n, m = maze.shape
+    size = n * m
+
+    blocked_array = (np.asarray(maze) == 1).ravel()
+    goal_array = np.zeros(size, dtype=np.bool_)
+    goal_array[[i * m + j for i, j in goals]] = True
+    gscore_array = np.full(size, np.inf)
+    came_from_array = np.full(size, -1, dtype=np.int64)
+    close_array = np.zeros(size, dtype=np.bool_)
+    first_move_array = np.zeros(size, dtype=np.int8)
+
+    blocked = blocked_array.data
+    is_goal = goal_array.data
+    gscore = gscore_array.data
+    came_from = came_from_array.data
+    close_set = close_array.data
+    first_move = first_move_array.data
+
+    estimate = GoalHeuristic(goals, mode, maze.shape)
+    origin = start[0] * m + start[1]
+    gscore[origin] = 0
+    open_set: list = [(estimate(start), 0, origin)]
+    expanded = 0
+    evaluated, peak = 1, 1
+
+    while open_set:
+        fscore, g, current = heapq.heappop(open_set)
+
+        if close_set[current]:
+            # discard the stale entry of the node which has been already expanded
+            continue
+
+        if is_goal[current]:
+            # the other nearest goals are queued with the same scores: pick the best first move
+            current = _best_goal(open_set, fscore, g, current, is_goal, first_move)
+            stats.count_search(expanded, peak, evaluated)
+            return _unwind(came_from, origin, current, m)
+
+        close_set[current] = True
+        expanded += 1
+        tentative_g_score = g + 1
+        improved = _expand(
+            current,
+            origin,
+            tentative_g_score,
+            n,
+            m,
+            blocked,
+            close_set,
+            gscore,
+            came_from,
+            first_move,
+        )
+
+        if improved:
+            # evaluate the heuristic for all improved neighbors at once
+            points = [divmod(neighbor, m) for neighbor in improved]
+            for neighbor, h in zip(improved, estimate.batch(points)):
+                heapq.heappush(
+                    open_set, (tentative_g_score + h, tentative_g_score, neighbor)
+                )
+            evaluated += len(improved)
+            if len(open_set) > peak:
+                peak = len(open_set)
+
+    stats.count_search(expanded, peak, evaluated)
+    return None
+
+
+def _expand(
+    current: int,
+    origin: int,
+    tentative_g_score: int,
+    n: int,
+    m: int,
+    blocked: memoryview,
+    close_set: memoryview,
+    gscore: memoryview,
+    came_from: memoryview,
+    first_move: memoryview,
+) -> list[int]:
+    # update the paths to the neighbors, return the neighbors whose g-score has improved
+    row, column = divmod(current, m)
+    improved = []
+
+    # same order as in pathfinder.a_star.search: right, left, down, up
+    for neighbor, inside, rank in (
+        (current + 1, column + 1 < m, MOVE_RANK[0, 1]),
+        (current - 1, column > 0, MOVE_RANK[0, -1]),
+        (current + m, row + 1 < n, MOVE_RANK[1, 0]),
+        (current - m, row > 0, MOVE_RANK[-1, 0]),
+    ):
+        if not inside or blocked[neighbor] or close_set[neighbor]:
+            # discard the neighbor which is out of range, an obstacle or already expanded
+            continue
+
+        move = rank if current == origin else first_move[current]
+        known_g_score = gscore[neighbor]
+        if tentative_g_score == known_g_score:
+            # equally short path: prefer the better first move, then the latest parent
+            if move <= first_move[neighbor]:
+                came_from[neighbor] = current
+                first_move[neighbor] = move
+        elif tentative_g_score < known_g_score:
+            came_from[neighbor] = current
+            gscore[neighbor] = tentative_g_score
+            first_move[neighbor] = move
+            improved.append(neighbor)
+    return improved
+
+
+def _best_goal(
+    open_set: list,
+    fscore: float,
+    g: int,
+    current: int,
+    is_goal: memoryview,
+    first_move: memoryview,
+) -> int:
+    # the queued goals with the same scores as the current one, by the rank of the first move
+    while open_set and open_set[0][:2] == (fscore, g):
+        other = heapq.heappop(open_set)[2]
+        if is_goal[other] and first_move[other] < first_move[current]:
+            current = other
+    return current
+
+
+def _unwind(
+    came_from: memoryview, origin: int, current: int, m: int
+) -> list[tuple[int, int]]:
+    data = []
+    while current != origin:
+        data.append(divmod(current, m))
+        current = came_from[current]
+    data.reverse()
+    return data
+
+
+class FlatAStar(AlgorithmProtocol):
+    def __init__(self, mode: str = Mode.MANHATTAN):
+        self.mode = mode
+
+    def search(
+        self,
+        maze: NDArray,
+        start: tuple[int, int],
+        goals: list[tuple[int, int]],
+        prepared: None = None,
+        field_id: str = '',
+    ) -> list[tuple[int, int]] | None:
+        return search(maze, start, goals, self.mode)
@@ -0,0 +1,431 @@
+import functools
+import heapq
+import math
+import typing as t
+from collections import deque
+
+import numpy as np
+from numpy.typing import NDArray
+
+from core.config import settings
+from models import Abstraction
+from pathfinder import stats
+from pathfinder.a_star import MOVE_PREFERENCE, GoalHeuristic, Mode
+from pathfinder.abstract import AlgorithmProtocol
+
+# free border segments at least this long get two transitions, one at each end
+WIDE_ENTRANCE = 6
+
+# virtual nodes of the abstract search
+START = -1
+GOAL = -2
+
+
+def _segments(mask: NDArray, cluster_size: int) -> list[tuple[int, int]]:
+    """
+    Find the runs of True in mask, split at the cluster boundaries.
+
+    Returns:
+        list[tuple[int, int]]: The first and last index of each run.
+    """
+    index = np.arange(mask.size)
+    edge = np.zeros(1, dtype=np.bool_)
+    before = np.concatenate((edge, mask[:-1]))
+    after = np.concatenate((mask[1:], edge))
+    starts = mask & (~before | (index % cluster_size == 0))
+    ends = mask & (~after | (index % cluster_size == cluster_size - 1))
+    return list(zip(np.flatnonzero(starts).tolist(), np.flatnonzero(ends).tolist()))
+
+
+def _transitions(free: NDArray, cluster_size: int) -> NDArray:
+    """
+    Find the entrance transitions between adjacent clusters.
+
+    Returns:
+        numpy.NDArray: Pairs of flat cell indices on both sides of each transition, (T, 2).
+    """
+    n, m = free.shape
+    transitions: list[tuple[int, int]] = []
+
+    for border in range(cluster_size, m, cluster_size):
+        for first, last in _segments(
+            free[:, border - 1] & free[:, border], cluster_size
+        ):
+            rows = (
+                (first, last)
+                if last - first + 1 >= WIDE_ENTRANCE
+                else ((first + last) // 2,)
+            )
+            transitions.extend((row * m + border - 1, row * m + border) for row in rows)
+
+    for border in range(cluster_size, n, cluster_size):
+        for first, last in _segments(free[border - 1] & free[border], cluster_size):
+            columns = (
+                (first, last)
+                if last - first + 1 >= WIDE_ENTRANCE
+                else ((first + last) // 2,)
+            )
+            transitions.extend(
+                ((border - 1) * m + column, border * m + column) for column in columns
+            )
+
+    return np.array(transitions, dtype=np.int64).reshape(-1, 2)
+
+
+def _cluster_distances(free: NDArray, cluster_size: int, sources: NDArray) -> NDArray:
+    """
+    Calculate the distances from the sources with a BFS which doesn't cross cluster boundaries.
+
+    Every source spreads over its own cluster only, so one BFS serves one source per cluster.
+
+    Returns:
+        numpy.NDArray: The flat distances, -1 for the cells not reached.
+    """
+    n, m = free.shape
+    flat_free = free.ravel()
+    distances = np.full(n * m, -1, dtype=np.int32)
+    frontier = sources
+    distances[frontier] = 0
+
+    level = 0
+    while frontier.size:
+        level += 1
+        rows, columns = np.divmod(frontier, m)
+        candidates = np.concatenate(
+            (
+                frontier[
+                    (columns % cluster_size != cluster_size - 1) & (columns < m - 1)
+                ]
+                + 1,
+                frontier[columns % cluster_size != 0] - 1,
+                frontier[(rows % cluster_size != cluster_size - 1) & (rows < n - 1)]
+                + m,
+                frontier[rows % cluster_size != 0] - m,
+            )
+        )
+        candidates = candidates[flat_free[candidates] & (distances[candidates] == -1)]
+        frontier = np.unique(candidates)
+        distances[frontier] = level
+
+    return distances
+
+
+def build_abstraction(maze: NDArray, cluster_size: int) -> Abstraction:
+    """
+    Split the maze into clusters and precompute the abstract graph of their entrances.
+
+    Args:
+        maze (numpy.NDArray): The maze represented as a 2D array.
+        cluster_size (int): The side of a cluster in cells.
+
+    Returns:
+        Abstraction: The abstract graph.
+    """
+    n, m = maze.shape
+    free = np.asarray(maze) != 1
+    row_clusters, column_clusters = -(-n // cluster_size), -(-m // cluster_size)
+
+    transitions = _transitions(free, cluster_size)
+    cells = np.unique(transitions)
+    rows, columns = np.divmod(cells, m)
+    clusters = (rows // cluster_size) * column_clusters + columns // cluster_size
+    order = np.lexsort((cells, clusters))
+    cells, clusters = cells[order], clusters[order]
+    cluster_offsets = np.searchsorted(
+        clusters, np.arange(row_clusters * column_clusters + 1)
+    )
+    node_of_cell = dict(zip(cells.tolist(), range(cells.size)))
+
+    sources, targets, costs = [], [], []
+    for a, b in transitions.tolist():
+        sources += [node_of_cell[a], node_of_cell[b]]
+        targets += [node_of_cell[b], node_of_cell[a]]
+        costs += [1, 1]
+
+    # the k-th nodes of all clusters are connected to the other nodes of their cluster at once
+    slots = np.arange(cells.size) - cluster_offsets[clusters]
+    for slot in range(int(slots.max(initial=-1)) + 1):
+        distances = _cluster_distances(free, cluster_size, cells[slots == slot])[cells]
+        has_slot = cluster_offsets[clusters + 1] - cluster_offsets[clusters] > slot
+        source = cluster_offsets[clusters] + slot
+        linked = np.flatnonzero(has_slot & (distances > 0))
+        sources += source[linked].tolist()
+        targets += linked.tolist()
+        costs += distances[linked].tolist()
+
+    sources_array = np.array(sources, dtype=np.int32)
+    order = np.argsort(sources_array, kind='stable')
+    return Abstraction(
+        cluster_size=cluster_size,
+        nodes=np.column_stack(np.divmod(cells, m)).reshape(-1, 2),
+        cluster_offsets=cluster_offsets,
+        edge_offsets=np.searchsorted(sources_array[order], np.arange(cells.size + 1)),
+        edge_targets=np.array(targets, dtype=np.int32)[order],
+        edge_costs=np.array(costs, dtype=np.int32)[order],
+    )
+
+
+def _local_bfs(
+    free: NDArray, cluster_size: int, sources: list[tuple[int, int]]
+) -> tuple[dict[tuple[int, int], int], dict[tuple[int, int], tuple[int, int]]]:
+    """
+    Run a BFS from the sources inside the cluster of the first source.
+
+    Returns:
+        tuple[dict, dict]: The distances and the parents of the reached cells.
+    """
+    n, m = free.shape
+    top = sources[0][0] // cluster_size * cluster_size
+    left = sources[0][1] // cluster_size * cluster_size
+    bottom, right = min(top + cluster_size, n), min(left + cluster_size, m)
+
+    distances = dict.fromkeys(sources, 0)
+    parents: dict[tuple[int, int], tuple[int, int]] = {}
+    queue = deque(sources)
+    while queue:
+        current = queue.popleft()
+        for i, j in MOVE_PREFERENCE:
+            neighbor = current[0] + i, current[1] + j
+            if not (top <= neighbor[0] < bottom and left <= neighbor[1] < right):
+                continue
+            if neighbor in distances or not free[neighbor]:
+                continue
+            distances[neighbor] = distances[current] + 1
+            parents[neighbor] = current
+            queue.append(neighbor)
+
+    stats.count_expanded(len(distances))
+    return distances, parents
+
+
+def _trace(
+    parents: dict[tuple[int, int], tuple[int, int]], cell: tuple[int, int]
+) -> list[tuple[int, int]]:
+    path = []
+    while cell in parents:
+        path.append(cell)
+        cell = parents[cell]
+    path.reverse()
+    return path
+
+
+def _cluster_nodes(
+    cluster_offsets: list[int], size: int, column_clusters: int, cell: tuple[int, int]
+) -> range:
+    cluster = (cell[0] // size) * column_clusters + cell[1] // size
+    return range(cluster_offsets[cluster], cluster_offsets[cluster + 1])
+
+
+def _goal_edges(
+    free: NDArray,
+    size: int,
+    cluster_nodes: t.Callable[[tuple[int, int]], range],
+    nodes: list[tuple[int, int]],
+    goals: list[tuple[int, int]],
+) -> dict[int, int]:
+    """
+    Connect the goals to the nodes of their clusters, one local search per cluster.
+
+    Returns:
+        dict[int, int]: The distance from each connected node to the nearest goal of its cluster.
+    """
+    goals_by_cluster: dict[range, list[tuple[int, int]]] = {}
+    for goal in goals:
+        if free[goal]:
+            goals_by_cluster.setdefault(cluster_nodes(goal), []).append(goal)
+
+    goal_edges: dict[int, int] = {}
+    for cluster, cluster_goals in goals_by_cluster.items():
+        distances, _ = _local_bfs(free, size, cluster_goals)
+        goal_edges.update(
+            (node, distances[nodes[node]])
+            for node in cluster
+            if nodes[node] in distances
+        )
+    return goal_edges
+
+
+def _edges(
+    abstraction: Abstraction,
+    start_edges: list[tuple[int, int]],
+    goal_edges: dict[int, int],
+    node: int,
+) -> list[tuple[int, int]]:
+    """
+    Get the edges of an abstract node, with the virtual ones of the start and the goals.
+    """
+    if node == START:
+        return start_edges
+    edge_range = slice(
+        abstraction.edge_offsets[node], abstraction.edge_offsets[node + 1]
+    )
+    edges = list(
+        zip(
+            abstraction.edge_targets[edge_range].tolist(),
+            abstraction.edge_costs[edge_range].tolist(),
+        )
+    )
+    if node in goal_edges:
+        edges.append((GOAL, goal_edges[node]))
+    return edges
+
+
+def _unwind(came_from: dict[int, int]) -> list[int]:
+    hops = [GOAL]
+    while hops[-1] in came_from:
+        hops.append(came_from[hops[-1]])
+    hops.reverse()
+    return hops
+
+
+def _abstract_search(
+    abstraction: Abstraction,
+    nodes: list[tuple[int, int]],
+    start_edges: list[tuple[int, int]],
+    goal_edges: dict[int, int],
+    estimate: GoalHeuristic,
+    start: tuple[int, int],
+) -> list[int] | None:
+    """
+    Run A* over the abstract graph from the virtual start node to the virtual goal node.
+
+    Returns:
+        list[int] | None: The abstract nodes of the path, from START to GOAL, or None if the goal is not reached.
+    """
+    gscore = {START: 0}
+    came_from: dict[int, int] = {}
+    close_set: set[int] = set()
+    open_set: list = [(estimate(start), 0, START)]
+    evaluated, peak = 1, 1
+    while open_set:
+        _, g, current = heapq.heappop(open_set)
+        if current in close_set:
+            continue
+        if current == GOAL:
+            stats.count_search(len(close_set), peak, evaluated)
+            return _unwind(came_from)
+        close_set.add(current)
+
+        for neighbor, cost in _edges(abstraction, start_edges, goal_edges, current):
+            tentative_g_score = g + cost
+            if neighbor in close_set or tentative_g_score >= gscore.get(
+                neighbor, math.inf
+            ):
+                continue
+            gscore[neighbor] = tentative_g_score
+            came_from[neighbor] = current
+            h = 0.0 if neighbor == GOAL else estimate(nodes[neighbor])
+            evaluated += neighbor != GOAL
+            heapq.heappush(
+                open_set, (tentative_g_score + h, tentative_g_score, neighbor)
+            )
+            peak = max(peak, len(open_set))
+
+    stats.count_search(len(close_set), peak, evaluated)
+    return None
+
+
+def _first_segment(
+    hops: list[int],
+    nodes: list[tuple[int, int]],
+    start_distances: dict[tuple[int, int], int],
+    start_parents: dict[tuple[int, int], tuple[int, int]],
+    nearest_goal: tuple[int, int] | None,
+) -> list[tuple[int, int]] | None:
+    """
+    Refine the abstract path into the cells up to its first move out of the start cluster.
+    """
+    # until the first move is found the hops start at the start cell
+    for hop in hops[1:]:
+        if hop == GOAL:
+            return _trace(start_parents, t.cast(tuple[int, int], nearest_goal))
+        cell = nodes[hop]
+        if cell not in start_distances:
+            # the transition into the adjacent cluster
+            return [cell]
+        path = _trace(start_parents, cell)
+        if path:
+            return path
+    return None
+
+
+def search(
+    maze: NDArray,
+    start: tuple[int, int],
+    goals: list[tuple[int, int]],
+    mode: str = Mode.MANHATTAN,
+    abstraction: Abstraction | None = None,
+) -> list[tuple[int, int]] | None:
+    """
+    Implement the hierarchical path-finding (HPA*) search.
+
+    The start and the goals are connected to the entrances of their clusters by local searches,
+    then A* runs over the abstract graph. Only the first segment of the abstract path, which stays
+    in the start cluster or crosses one entrance, is refined into cells: the returned path leads
+    towards the nearest goal but ends at a goal only when the goal is in the start cluster.
+    The paths are near-optimal.
+
+    Args:
+        maze (numpy.NDArray): The maze represented as a 2D array.
+        start (tuple[int, int]): The start point.
+        goals (list[tuple[int, int]]): The goal points.
+        mode (Mode, optional): The type of heuristic to be used. Defaults to Mode.MANHATTAN ("manhattan").
+        abstraction (Abstraction, optional): The abstract graph of the maze, built if not provided.
+
+    Returns:
+        list[tuple[int, int]] | None: A list of tuples representing the first segment of the path, or None if no path exists.
+    """
+    if start in goals:
+        return []
+    if abstraction is None:
+        abstraction = build_abstraction(maze, settings.hpa_cluster_size)
+
+    free = np.asarray(maze) != 1
+    size = abstraction.cluster_size
+    cluster_nodes = functools.partial(
+        _cluster_nodes,
+        abstraction.cluster_offsets.tolist(),
+        size,
+        -(-maze.shape[1] // size),
+    )
+    nodes = [(i, j) for i, j in abstraction.nodes.tolist()]
+
+    start_distances, start_parents = _local_bfs(free, size, [start])
+    start_edges = [
+        (node, start_distances[nodes[node]])
+        for node in cluster_nodes(start)
+        if nodes[node] in start_distances
+    ]
+    goal_edges = _goal_edges(free, size, cluster_nodes, nodes, goals)
+
+    reachable_goals = [goal for goal in goals if goal in start_distances]
+    nearest_goal = min(reachable_goals, key=start_distances.__getitem__, default=None)
+    if nearest_goal is not None:
+        start_edges.append((GOAL, start_distances[nearest_goal]))
+
+    hops = _abstract_search(
+        abstraction, nodes, start_edges, goal_edges, GoalHeuristic(goals, mode), start
+    )
+    if hops is None:
+        return None
+    return _first_segment(hops, nodes, start_distances, start_parents, nearest_goal)
+
+
+class HPAStar(AlgorithmProtocol):
+    preprocessing = True
+
+    def __init__(self, mode: str = Mode.MANHATTAN):
+        self.mode = mode
+
+    def prepare(self, maze: NDArray) -> Abstraction:
+        return build_abstraction(maze, settings.hpa_cluster_size)
+
+    def search(
+        self,
+        maze: NDArray,
+        start: tuple[int, int],
+        goals: list[tuple[int, int]],
+        prepared: Abstraction | None = None,
+        field_id: str = '',
+    ) -> list[tuple[int, int]] | None:
+        return search(maze, start, goals, self.mode, prepared)
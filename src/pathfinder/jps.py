@@ -0,0 +1,243 @@
+import heapq
+import math
+import typing as t
+
+import numpy as np
+from numpy.typing import NDArray
+
+from pathfinder import stats
+from pathfinder.a_star import MOVE_PREFERENCE, GoalHeuristic, Mode
+from pathfinder.abstract import AlgorithmProtocol
+
+
+def _jump(
+    free: memoryview, is_goal: memoryview, node: int, step: int, side: int
+) -> int | None:
+    """
+    Move from node in the direction of step until a jump point is found.
+
+    Args:
+        free (memoryview): The free cells of the padded maze, indexed by flat index.
+        is_goal (memoryview): The goal cells of the padded maze, indexed by flat index.
+        node (int): The flat index of the node to jump from.
+        step (int): The flat offset of the direction: ±1 horizontally, ±width vertically.
+        side (int): The flat offset perpendicular to step.
+
+    Returns:
+        int | None: The flat index of the jump point, or None if the jump runs into an obstacle.
+    """
+    vertical = side == 1
+    while True:
+        node += step
+        if not free[node]:
+            return None
+        if is_goal[node]:
+            return node
+        # a forced neighbor: the side cell is free while the cell behind it is blocked
+        if (free[node - side] and not free[node - side - step]) or (
+            free[node + side] and not free[node + side - step]
+        ):
+            return node
+        # moving vertically, the node is a jump point if a horizontal jump from it succeeds
+        if vertical and (
+            _jump(free, is_goal, node, 1, step) is not None
+            or _jump(free, is_goal, node, -1, step) is not None
+        ):
+            return node
+
+
+def _successors(
+    free: memoryview,
+    is_goal: memoryview,
+    width: int,
+    node: int,
+    came_by: int,
+    close_set: set[int],
+) -> t.Iterator[tuple[int, int]]:
+    """
+    Find the jump points reachable from the node in its natural directions.
+
+    Args:
+        free (memoryview): The free cells of the padded maze, indexed by flat index.
+        is_goal (memoryview): The goal cells of the padded maze, indexed by flat index.
+        width (int): The width of the padded maze.
+        node (int): The flat index of the node.
+        came_by (int): The flat offset of the move into the node, 0 for the origin.
+        close_set (set[int]): The expanded nodes, which are skipped.
+
+    Yields:
+        tuple[int, int]: The flat index of a jump point and the flat offset of the jump direction.
+    """
+    if came_by == 0:
+        # the origin has no parent: all directions are natural
+        steps = [(1, width), (-1, width), (width, 1), (-width, 1)]
+    elif abs(came_by) == 1:
+        steps = [(came_by, width), (width, 1), (-width, 1)]
+    else:
+        steps = [(came_by, 1), (1, width), (-1, width)]
+
+    for step, side in steps:
+        jump_point = _jump(free, is_goal, node, step, side)
+        if jump_point is not None and jump_point not in close_set:
+            yield jump_point, step
+
+
+def _point(node: int, width: int) -> tuple[int, int]:
+    i, j = divmod(node, width)
+    return i - 1, j - 1
+
+
+def _unwind(
+    came_from: dict[int, int], direction: dict[int, int], node: int
+) -> list[int]:
+    """
+    Expand the jumps leading to the node into the path cells, without the origin.
+    """
+    data = []
+    while node in came_from:
+        parent = came_from[node]
+        step = direction[node]
+        while node != parent:
+            data.append(node)
+            node -= step
+    data.reverse()
+    return data
+
+
+def _search(
+    free: memoryview,
+    is_goal: memoryview,
+    width: int,
+    origin: int,
+    estimate: GoalHeuristic,
+    bound: float = math.inf,
+) -> list[int] | None:
+    """
+    Run A* over the jump points from the origin.
+
+    Args:
+        free (memoryview): The free cells of the padded maze, indexed by flat index.
+        is_goal (memoryview): The goal cells of the padded maze, indexed by flat index.
+        width (int): The width of the padded maze.
+        origin (int): The flat index of the start node.
+        estimate (GoalHeuristic): The heuristic distance to the nearest goal.
+        bound (float, optional): The nodes with a greater f-score are discarded. Defaults to no bound.
+
+    Returns:
+        list[int] | None: The flat indices of the path cells without the origin, or None if no path within the bound exists.
+    """
+    fscore = estimate(_point(origin, width))
+    if fscore > bound:
+        return None
+
+    close_set: set[int] = set()
+    gscore = {origin: 0}
+    came_from: dict[int, int] = {}
+    direction = {origin: 0}
+    open_set: list = [(fscore, 0, origin)]
+    evaluated, peak = 1, 1
+
+    while open_set:
+        _, g, current = heapq.heappop(open_set)
+
+        if current in close_set:
+            # discard the stale entry of the node which has been already expanded
+            continue
+
+        if is_goal[current]:
+            stats.count_search(len(close_set), peak, evaluated)
+            return _unwind(came_from, direction, current)
+
+        close_set.add(current)
+        successors = _successors(
+            free, is_goal, width, current, direction[current], close_set
+        )
+        for jump_point, step in successors:
+            tentative_g_score = g + abs(jump_point - current) // abs(step)
+            if tentative_g_score >= gscore.get(jump_point, math.inf):
+                continue
+
+            fscore = tentative_g_score + estimate(_point(jump_point, width))
+            evaluated += 1
+            if fscore > bound:
+                continue
+
+            came_from[jump_point] = current
+            direction[jump_point] = step
+            gscore[jump_point] = tentative_g_score
+            heapq.heappush(open_set, (fscore, tentative_g_score, jump_point))
+            peak = max(peak, len(open_set))
+
+    stats.count_search(len(close_set), peak, evaluated)
+    return None
+
+
+def search(
+    maze: NDArray,
+    start: tuple[int, int],
+    goals: list[tuple[int, int]],
+    mode: str = Mode.MANHATTAN,
+) -> list[tuple[int, int]] | None:
+    """
+    Implement the Jump Point Search algorithm for 4-connected uniform-cost grids.
+
+    JPS expands only the jump points, where the shortest paths may turn, and skips the symmetric
+    paths of open areas. To make the same first move as `pathfinder.a_star.search` on ties, the
+    search is run from the start neighbors in the order of MOVE_PREFERENCE, each bounded to beat
+    the best path found so far; the bound discards the neighbors leading away from the goals at
+    once. The neighbors of a free start are connected through it, so if the first, unbounded
+    search fails, the goals are unreachable and the other neighbors are not searched.
+
+    Args:
+        maze (numpy.NDArray): The maze represented as a 2D array.
+        start (tuple[int, int]): The start point.
+        goals (list[tuple[int, int]]): The goal points.
+        mode (Mode, optional): The type of heuristic to be used. Defaults to Mode.MANHATTAN ("manhattan").
+
+    Returns:
+        list[tuple[int, int]] | None: A list of tuples representing the path from the start point to the goal point, or None if no path exists.
+    """
+    if start in goals:
+        return []
+
+    # the border of obstacles removes the range checks
+    width = maze.shape[1] + 2
+    free_array = np.pad(np.asarray(maze) != 1, 1, constant_values=False).ravel()
+    goal_array = np.zeros_like(free_array)
+    goal_array[[(i + 1) * width + j + 1 for i, j in goals]] = True
+    free, is_goal = free_array.data, goal_array.data
+    estimate = GoalHeuristic(goals, mode, maze.shape)
+    connected = free[(start[0] + 1) * width + start[1] + 1]
+
+    best: list[int] | None = None
+    for i, j in MOVE_PREFERENCE:
+        neighbor = (start[0] + i + 1) * width + start[1] + j + 1
+        if not free[neighbor]:
+            continue
+
+        bound = math.inf if best is None else len(best) - 2
+        path = _search(free, is_goal, width, neighbor, estimate, bound)
+        if path is not None:
+            best = [neighbor, *path]
+        elif best is None and connected:
+            # the unbounded search has covered the whole component of the start
+            return None
+
+    if best is None:
+        return None
+    return [(node // width - 1, node % width - 1) for node in best]
+
+
+class JumpPointSearch(AlgorithmProtocol):
+    def __init__(self, mode: str = Mode.MANHATTAN):
+        self.mode = mode
+
+    def search(
+        self,
+        maze: NDArray,
+        start: tuple[int, int],
+        goals: list[tuple[int, int]],
+        prepared: None = None,
+        field_id: str = '',
+    ) -> list[tuple[int, int]] | None:
+        return search(maze, start, goals, self.mode)
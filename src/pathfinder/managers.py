@@ -3,15 +3,22 @@ import logging
 
 from pathfinder.a_star import AStar
 from pathfinder.abstract import AlgorithmProtocol
+from pathfinder.bfs import MultiSourceBFS
+from pathfinder.flat_a_star import FlatAStar
+from pathfinder.hpa import HPAStar
+from pathfinder.jps import JumpPointSearch
 
 
 class Algorithm(enum.Enum):
     """
     Enum representing the available algorithms.
-    Currently only supports A* algorithm.
     """
 
     ASTAR = 'astar'
+    FLAT_ASTAR = 'flat_astar'
+    BFS = 'bfs'
+    JPS = 'jps'
+    HPA = 'hpa'
 
 
 def get_algo(algo: str) -> AlgorithmProtocol:
@@ -31,6 +38,14 @@ def get_algo(algo: str) -> AlgorithmProtocol:
 
     if algo == Algorithm.ASTAR.value:
         return AStar(mode)
+    elif algo == Algorithm.FLAT_ASTAR.value:
+        return FlatAStar(mode)
+    elif algo == Algorithm.BFS.value:
+        return MultiSourceBFS(mode)
+    elif algo == Algorithm.JPS.value:
+        return JumpPointSearch(mode)
+    elif algo == Algorithm.HPA.value:
+        return HPAStar(mode)
     else:
         logging.error(f'Unknown algorithm: {algo}')
         raise ValueError(f'Unknown algorithm: {algo}')
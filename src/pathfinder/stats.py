@@ -0,0 +1,212 @@
+import cProfile
+import io
+import pstats
+import threading
+import time
+import typing as t
+
+from pydantic import BaseModel
+
+# functions listed in a profile report
+PROFILE_LINES = 30
+
+
+class SearchStats(BaseModel):
+    """
+    Counters of the search work done by the current thread.
+
+    Attributes:
+        expanded: The expanded nodes: cells, jump points or abstract graph nodes, depending on the algorithm.
+        open_peak: The largest size of the open set (the BFS frontier) in one search.
+        heuristic_calls: The heuristic evaluations.
+        cache_hits: The lookups served by the per-process caches of the distances and the fields.
+    """
+
+    expanded: int = 0
+    open_peak: int = 0
+    heuristic_calls: int = 0
+    cache_hits: int = 0
+
+
+# searches run in the threads of the server process as well, see services.dispatch
+_local = threading.local()
+# the statistics of the per-process caches, reported with every measured task, see `watch_cache`
+_caches: dict[str, t.Callable[[], dict[str, int | float]]] = {}
+# the latest reported statistics of every cache, by cache name and process id
+_reported: dict[str, dict[int, dict[str, int | float]]] = {}
+# the statistics summed over the processes
+CACHE_TOTALS = ('hits', 'misses', 'size', 'maxsize')
+
+
+def _current() -> SearchStats:
+    try:
+        return _local.current
+    except AttributeError:
+        _local.current = SearchStats()
+        return _local.current
+
+
+def count_expanded(nodes: int):
+    """
+    Add the expanded nodes to the counters of the current thread.
+
+    The algorithms count in local variables and report once per search, so the counters cost
+    nothing in their inner loops.
+
+    Args:
+        nodes (int): The number of nodes expanded.
+    """
+    _current().expanded += nodes
+
+
+def count_search(expanded: int, open_peak: int, heuristic_calls: int = 0):
+    """
+    Add the work of a search to the counters of the current thread.
+
+    Args:
+        expanded (int): The number of nodes expanded.
+        open_peak (int): The largest size of the open set.
+        heuristic_calls (int, optional): The heuristic evaluations. Defaults to 0.
+    """
+    current = _current()
+    current.expanded += expanded
+    current.open_peak = max(current.open_peak, open_peak)
+    current.heuristic_calls += heuristic_calls
+
+
+def count_cache_hits(hits: int = 1):
+    """
+    Add the hits of a per-process cache to the counters of the current thread.
+
+    Args:
+        hits (int, optional): The number of hits. Defaults to 1.
+    """
+    _current().cache_hits += hits
+
+
+def take() -> SearchStats:
+    """
+    Get the counters of the current thread and start new ones.
+
+    Returns:
+        SearchStats: The counters since the previous call.
+    """
+    taken = _current()
+    _local.current = SearchStats()
+    return taken
+
+
+def watch_cache(name: str, info: t.Callable[[], dict[str, int | float]]):
+    """
+    Report the statistics of a per-process cache with every task measured by `measure`.
+
+    Args:
+        name (str): The name of the cache.
+        info (Callable[[], dict[str, int | float]]): Returns the statistics of the cache in the current process: the pid and the CACHE_TOTALS at least.
+    """
+    _caches[name] = info
+
+
+def report_caches(measurement: 'Measurement'):
+    """
+    Keep the cache statistics of the process the task ran in, see `cache_info`.
+
+    Args:
+        measurement (Measurement): The measurements of a task, possibly run in another process.
+    """
+    for name, info in measurement.caches.items():
+        _reported.setdefault(name, {})[int(info['pid'])] = info
+
+
+def cache_info(name: str) -> dict[str, int | float]:
+    """
+    Get the statistics of a per-process cache summed over the processes the tasks ran in.
+
+    The statistics of the pool workers are the latest ones reported with their tasks, see
+    `report_caches`, those of the current process are read now.
+
+    Args:
+        name (str): The name of the cache, see `watch_cache`.
+
+    Returns:
+        dict[str, int | float]: The number of processes, the summed CACHE_TOTALS and the hit rate.
+    """
+    reported = _reported.setdefault(name, {})
+    own = _caches[name]()
+    reported[int(own['pid'])] = own
+    totals = {
+        stat: sum(info[stat] for info in reported.values()) for stat in CACHE_TOTALS
+    }
+    lookups = totals['hits'] + totals['misses']
+    return {
+        'processes': len(reported),
+        **totals,
+        'hit_rate': totals['hits'] / lookups if lookups else 0.0,
+    }
+
+
+class Measurement(t.NamedTuple):
+    """
+    The outcome of a task run by `measure`.
+
+    Attributes:
+        result: What the task returned.
+        started: The wall clock time the task started at, comparable between the processes.
+        seconds: The time the task took.
+        stats: The search work done by the task.
+        profile: The cProfile report of the task, if it was run by `profile`.
+        caches: The statistics of the per-process caches after the task, see `watch_cache`.
+    """
+
+    result: t.Any
+    started: float
+    seconds: float
+    stats: SearchStats
+    profile: str | None = None
+    caches: t.Mapping[str, dict[str, int | float]] = {}
+
+
+def measure(func: t.Callable[..., t.Any], *args: t.Any) -> Measurement:
+    """
+    Run the task and measure it in the process it runs in.
+
+    Submitted to an executor in place of the task, so the server learns how long the task waited
+    for a worker and how long it ran, not only the time of the round trip.
+
+    Args:
+        func (Callable): The task.
+        *args: The arguments of the task.
+
+    Returns:
+        Measurement: The result of the task and its measurements.
+    """
+    # drop the work of the tasks which were not measured
+    take()
+    started = time.time()
+    began = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - began
+    caches = {name: info() for name, info in _caches.items()}
+    return Measurement(result, started, seconds, take(), caches=caches)
+
+
+def profile(func: t.Callable[..., t.Any], *args: t.Any) -> Measurement:
+    """
+    Run the task under cProfile and measure it, see `measure`.
+
+    The profiler slows the task down, and the measured time with it.
+
+    Args:
+        func (Callable): The task.
+        *args: The arguments of the task.
+
+    Returns:
+        Measurement: The result of the task, its measurements and the report of the functions by cumulative time.
+    """
+    profiler = cProfile.Profile()
+    measurement = profiler.runcall(measure, func, *args)
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(
+        PROFILE_LINES
+    )
+    return measurement._replace(profile=report.getvalue())
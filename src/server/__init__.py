@@ -0,0 +1,7 @@
+import importlib
+import sys
+
+# the gRPC code generated by `make protoc` imports the messages as the top-level pathfinder_pb2
+sys.modules.setdefault(
+    'pathfinder_pb2', importlib.import_module('server.lib.pathfinder_pb2')
+)
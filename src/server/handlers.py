@@ -4,6 +4,7 @@ from concurrent import futures as cf
 from grpclib import GRPCError, Status
 from grpclib.server import Stream
 
+from core import metrics, tracing
 from core.enums import Direction
 from core.exceptions import PathfinderError
 from server.lib import pathfinder_pb2 as grpc_models
@@ -16,14 +17,15 @@ class Pathfinder(PathFinderBase):
     """
     This class handles the gRPC requests for setting fields and moving.
     It uses a process pool executor (for computing path) and a state object (to persist results) to perform these operations.
+    The requests are traced when sampled or when the call has the `x-pathfinder-trace` metadata, see `core.tracing`.
     """
 
-    def __init__(self, executor: cf.ProcessPoolExecutor, state: State):
+    def __init__(self, executor: cf.Executor, state: State):
         """
         Initialize the Pathfinder with a process pool executor and a state object.
 
         Parameters:
-        executor (cf.ProcessPoolExecutor): The process pool executor.
+        executor (cf.Executor): The executor for the searches, see `services.executor`.
         state (State): The state object.
         """
         self._executor = executor
@@ -43,7 +45,12 @@ class Pathfinder(PathFinderBase):
             raise GRPCError(Status.INVALID_ARGUMENT, 'No Field for SetField provided')
         logging.debug(f"SetField request: {request}")
         try:
-            result = await field_state.set_field(self._state, request)
+            with metrics.REQUEST_TIME.time(rpc='SetField'), tracing.trace(
+                'SetField', request.robot_id, tracing.requested(stream.metadata)
+            ):
+                result = await field_state.set_field(
+                    self._state, request, self._executor
+                )
             logging.debug(f"SetField answered: {result}")
             await stream.send_message(result)
         except PathfinderError as e:
@@ -57,23 +64,67 @@ class Pathfinder(PathFinderBase):
         """
         Handle the Moving gRPC request: retrieve direction for list of targets.
 
+        The whole route is driven over one stream: every MoveRequest is answered with a
+        MoveResponse until the client closes the stream.
+
         Parameters:
         stream (Stream[grpc_models.MoveRequest, grpc_models.MoveResponse]): The gRPC stream.
         """
-        request = await stream.recv_message()
+        session = field_state.MovingSession(self._state, self._executor)
+        traced = tracing.requested(stream.metadata)
+        received = False
+        try:
+            async for request in stream:
+                received = True
+                logging.debug(f"Moving request: {request}")
+                try:
+                    with metrics.REQUEST_TIME.time(rpc='Moving'), tracing.trace(
+                        'Moving', request.robot_id, traced
+                    ):
+                        result = await session.move(request)
+                except PathfinderError as e:
+                    logging.error('Houston, we have a problem!')
+                    logging.error(e)
+                    result = grpc_models.MoveResponse()
+                    result.direction = Direction.ERROR  # type: ignore
+                await stream.send_message(result)
+                logging.debug(f"Moving answered: {result}")
+        finally:
+            await session.close()
 
-        if request is None:
+        if not received:
             logging.error("No MoveRequest provided")
             raise GRPCError(Status.INVALID_ARGUMENT, 'No MoveRequest provided')
 
-        logging.debug(f"Moving request: {request}")
-        try:
-            result = await field_state.moving(self._state, self._executor, request)
-            await stream.send_message(result)
-            logging.debug(f"Moving answered: {result}")
-        except PathfinderError as e:
-            logging.error('Houston, we have a problem!')
-            logging.error(e)
-            response = grpc_models.MoveResponse()
-            response.direction = Direction.ERROR  # type: ignore
-            await stream.send_message(response)
+    async def MoveBatch(
+        self,
+        stream: Stream[grpc_models.MoveBatchRequest, grpc_models.MoveBatchResponse],
+    ):
+        """
+        Handle the MoveBatch gRPC request: retrieve the next moves of many robots in one call.
+
+        Parameters:
+        stream (Stream[grpc_models.MoveBatchRequest, grpc_models.MoveBatchResponse]): The gRPC stream.
+        """
+        request = await stream.recv_message()
+
+        if request is None:
+            logging.error("No MoveBatchRequest provided")
+            raise GRPCError(Status.INVALID_ARGUMENT, 'No MoveBatchRequest provided')
+        logging.debug(f"MoveBatch request for {len(request.requests)} robots")
+        with metrics.REQUEST_TIME.time(rpc='MoveBatch'), tracing.trace(
+            'MoveBatch', forced=tracing.requested(stream.metadata)
+        ):
+            directions = await field_state.move_batch(
+                self._state, self._executor, list(request.requests)
+            )
+        result = grpc_models.MoveBatchResponse(
+            responses=[
+                grpc_models.RobotMoveResponse(
+                    robot_id=move_request.robot_id, direction=direction  # type: ignore
+                )
+                for move_request, direction in zip(request.requests, directions)
+            ]
+        )
+        await stream.send_message(result)
+        logging.debug(f"MoveBatch answered: {result}")
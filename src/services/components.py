@@ -0,0 +1,60 @@
+from collections import OrderedDict
+
+from numpy.typing import NDArray
+
+from core.config import settings
+
+
+class ComponentRegistry:
+    """
+    Labels of the connected components of the fields, kept by the server process.
+
+    The labels tell in O(targets) which targets the robot can't reach, so they are dropped before
+    the search instead of making it explore the whole component of the robot. They are keyed by
+    the field id, so the robots on the same field share them.
+    """
+
+    def __init__(self, size: int):
+        """
+        Parameters:
+        size (int): The maximum number of fields, the least recently used are dropped.
+        """
+        self.size = size
+        self._labels: OrderedDict[str, NDArray] = OrderedDict()
+
+    def get(self, field_id: str) -> NDArray | None:
+        """
+        Get the labels of the field.
+
+        Parameters:
+        field_id (str): The id of the field, see `state.codec.field_id`.
+
+        Returns:
+        NDArray | None: The labels, see `pathfinder.components.label_components`, or None if they aren't kept.
+        """
+        labels = self._labels.get(field_id)
+        if labels is not None:
+            self._labels.move_to_end(field_id)
+        return labels
+
+    def put(self, field_id: str, labels: NDArray):
+        """
+        Keep the labels of the field.
+
+        Parameters:
+        field_id (str): The id of the field.
+        labels (NDArray): The labels of the field.
+        """
+        self._labels[field_id] = labels
+        self._labels.move_to_end(field_id)
+        while len(self._labels) > self.size:
+            self._labels.popitem(last=False)
+
+    def clear(self):
+        """
+        Drop the labels of all the fields.
+        """
+        self._labels.clear()
+
+
+registry = ComponentRegistry(settings.component_cache_size)
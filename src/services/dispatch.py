@@ -0,0 +1,137 @@
+import asyncio
+import enum
+import logging
+import math
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+import numpy as np
+
+from core.config import settings
+from pathfinder.finder import plan_route, prepare_field
+
+
+class Placement(enum.Enum):
+    """
+    Where a search runs.
+
+    Attributes:
+        INLINE: In the event loop, for searches cheaper than a round trip to the process pool.
+        THREAD: In a thread, without the IPC cost but still under the GIL.
+        POOL: In the process pool.
+    """
+
+    INLINE = 'inline'
+    THREAD = 'thread'
+    POOL = 'pool'
+
+
+def estimate_cost(shape: tuple[int, ...], targets: int) -> float:
+    """
+    Estimate the cost of a search in abstract units.
+
+    The search may expand every cell of the maze. The heuristic of many targets is evaluated in
+    batches, so its cost grows slower than the number of targets.
+
+    Parameters:
+    shape (tuple[int, ...]): The shape of the maze.
+    targets (int): The number of targets.
+
+    Returns:
+    float: The estimated cost.
+    """
+    return math.prod(shape) * (1 + math.log2(max(targets, 1)))
+
+
+class DispatchPolicy:
+    """
+    Chooses where to run a search by its estimated cost.
+    """
+
+    def __init__(self, inline_max_cost: float, thread_max_cost: float):
+        """
+        Parameters:
+        inline_max_cost (float): The searches up to this cost run inline.
+        thread_max_cost (float): The searches up to this cost run in a thread, the rest in the pool.
+        """
+        self.inline_max_cost = inline_max_cost
+        self.thread_max_cost = thread_max_cost
+        self._threads: ThreadPoolExecutor | None = None
+
+    def choose(self, cost: float) -> Placement:
+        """
+        Parameters:
+        cost (float): The estimated cost of the search, see `estimate_cost`.
+
+        Returns:
+        Placement: Where to run the search.
+        """
+        if cost <= self.inline_max_cost:
+            return Placement.INLINE
+        if cost <= self.thread_max_cost:
+            return Placement.THREAD
+        return Placement.POOL
+
+    @property
+    def threads(self) -> Executor:
+        """
+        The thread pool for the searches of the THREAD placement.
+        """
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(
+                max_workers=settings.pool_size, thread_name_prefix='search'
+            )
+        return self._threads
+
+    def shutdown(self):
+        """
+        Wait for the searches running in threads and stop the threads.
+
+        The thread pool is started again on the next use of `threads`.
+        """
+        if self._threads is not None:
+            self._threads.shutdown()
+            self._threads = None
+
+
+policy = DispatchPolicy(
+    settings.inline_search_max_cost, settings.thread_search_max_cost
+)
+
+
+def _probe():
+    return None
+
+
+async def calibrate(executor: Executor, rounds: int = 20):
+    """
+    Set the thresholds of the policy from the measured costs of this machine.
+
+    The searches which take less time inline than a round trip to the process pool run inline.
+    The thread threshold keeps its configured ratio to the inline one.
+
+    Parameters:
+    executor (Executor): The process pool.
+    rounds (int): The number of round trips to measure.
+    """
+    loop = asyncio.get_running_loop()
+    # the first task starts the worker
+    await loop.run_in_executor(executor, _probe)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await loop.run_in_executor(executor, _probe)
+    round_trip = (time.perf_counter() - start) / rounds
+
+    maze = np.zeros((64, 64), dtype=np.uint8)
+    prepared = prepare_field(maze, settings.algo)
+    start = time.perf_counter()
+    plan_route(maze, (0, 0), [(63, 63)], settings.algo, prepared)
+    per_cost = (time.perf_counter() - start) / estimate_cost(maze.shape, 1)
+
+    ratio = settings.thread_search_max_cost / settings.inline_search_max_cost
+    policy.inline_max_cost = round_trip / per_cost
+    policy.thread_max_cost = policy.inline_max_cost * ratio
+    logging.info(
+        f'Pool round trip {round_trip * 1e3:.3f}ms, searches run inline up to cost '
+        f'{policy.inline_max_cost:.0f} and in a thread up to {policy.thread_max_cost:.0f}'
+    )
@@ -0,0 +1,65 @@
+import itertools
+import zlib
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+
+
+class ShardedExecutor(Executor):
+    """
+    Process pool of single-worker shards, the work for a field always goes to the same worker.
+
+    The workers keep per-field data in memory: the fields decoded from shared memory, the
+    distance fields of the multi-source BFS and the memoized heuristic distances. A plain pool
+    hands the tasks to any idle worker, so every worker ends up building the same data. Routing
+    the tasks by the field keeps each field warm in one worker and the caches of the others free
+    for their own fields.
+    """
+
+    def __init__(self, shards: int):
+        """
+        Parameters:
+        shards (int): The number of worker processes.
+        """
+        if shards < 1:
+            raise ValueError('The number of shards must be at least 1')
+        self._shards = [ProcessPoolExecutor(max_workers=1) for _ in range(shards)]
+        self._next = itertools.cycle(self._shards)
+
+    def shard(self, key: str | None) -> Executor:
+        """
+        Gets the worker for the key.
+
+        Parameters:
+        key (str | None): The key of the work, e.g. the field id. Without one the workers are taken in turn.
+
+        Returns:
+        Executor: The single-worker pool for the key.
+        """
+        if not key:
+            return next(self._next)
+        return self._shards[zlib.crc32(key.encode()) % len(self._shards)]
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        """
+        Submits the work without a key to the next worker in turn.
+        """
+        return next(self._next).submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        for shard in self._shards:
+            shard.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+def shard_for(executor: Executor | None, key: str | None) -> Executor | None:
+    """
+    Gets the executor for the work with the key.
+
+    Parameters:
+    executor (Executor | None): The executor, sharded or not.
+    key (str | None): The key of the work, e.g. the field id.
+
+    Returns:
+    Executor | None: The worker for the key if the executor is sharded, else the executor itself.
+    """
+    if isinstance(executor, ShardedExecutor):
+        return executor.shard(key)
+    return executor
@@ -0,0 +1,185 @@
+import atexit
+import collections
+import contextlib
+import os
+import typing as t
+from collections import OrderedDict
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+from numpy.typing import NDArray
+
+import models
+from core.config import settings
+from pathfinder import stats
+from pathfinder.finder import plan_route
+from state import codec
+
+
+class FieldRegistry:
+    """
+    Shared memory blocks with the encoded fields, owned by the server process.
+
+    The searches submitted to the process pool get the name of the block instead of the pickled
+    maze: a worker attaches to the block, decodes the field once and keeps it for the next moves.
+    A block is named after the content of the field, so the robots on the same field share it.
+    The blocks used by the tasks in flight are pinned, see `lease`: they are not released until
+    the tasks are done, even if the registry grows over its size meanwhile.
+    """
+
+    def __init__(self, size: int):
+        """
+        Parameters:
+        size (int): The maximum number of blocks, the least recently used are released.
+        """
+        self.size = size
+        self._blocks: OrderedDict[str, SharedMemory] = OrderedDict()
+        self._pins: collections.Counter[str] = collections.Counter()
+
+    def register(self, entry: models.Entry) -> str:
+        """
+        Put the field of the robot into shared memory unless it is there already.
+
+        Parameters:
+        entry (models.Entry): The state of the robot.
+
+        Returns:
+        str: The name of the shared memory block.
+        """
+        field = None
+        if not entry.field_id:
+            field = codec.encode_field(entry)
+            entry.field_id = codec.field_id(field)
+
+        name = f'pf_{os.getpid()}_{entry.field_id}'
+        if name in self._blocks:
+            self._blocks.move_to_end(name)
+            return name
+
+        if field is None:
+            field = codec.encode_field(entry)
+        try:
+            block = SharedMemory(name, create=True, size=len(field))
+            block.buf[: len(field)] = field
+        except FileExistsError:
+            # the same name means the same content
+            block = SharedMemory(name)
+        self._blocks[name] = block
+        self._release_unused()
+        return name
+
+    @contextlib.contextmanager
+    def lease(self, entry: models.Entry) -> t.Iterator[str]:
+        """
+        Register the field of the robot and pin its block until the `with` statement exits.
+
+        Parameters:
+        entry (models.Entry): The state of the robot.
+
+        Yields:
+        str: The name of the shared memory block.
+        """
+        name = self.register(entry)
+        self._pins[name] += 1
+        try:
+            yield name
+        finally:
+            self._pins[name] -= 1
+            if not self._pins[name]:
+                del self._pins[name]
+                self._release_unused()
+
+    def owns(self, name: str) -> bool:
+        """
+        Check whether the block has been created by this registry.
+        """
+        return name in self._blocks
+
+    def _release_unused(self):
+        # the least recently used blocks go first, the pinned ones stay
+        excess = len(self._blocks) - self.size
+        if excess <= 0:
+            return
+        unpinned = [name for name in self._blocks if name not in self._pins]
+        for name in unpinned[:excess]:
+            released = self._blocks.pop(name)
+            released.close()
+            released.unlink()
+
+    def close(self):
+        """
+        Release all the blocks.
+        """
+        while self._blocks:
+            _, block = self._blocks.popitem()
+            block.close()
+            block.unlink()
+
+
+def share_resource_tracker():
+    """
+    Start the resource tracker of this process, before the process pool is forked.
+
+    On attaching to a block a worker registers it with the resource tracker, which unlinks the
+    blocks still registered when its processes exit. The workers forked after the tracker has
+    started share it with the server, so the registration is a no-op and the block is
+    unregistered once, by the registry. A worker forked before starts a tracker of its own,
+    which unlinks the blocks of the server when the worker exits.
+    """
+    resource_tracker.ensure_running()
+
+
+registry = FieldRegistry(settings.field_registry_size)
+atexit.register(registry.close)
+
+# the fields decoded by this process, by block name
+_fields: OrderedDict[str, tuple[NDArray, models.Abstraction | None]] = OrderedDict()
+
+
+def load_field(name: str) -> tuple[NDArray, models.Abstraction | None]:
+    """
+    Get the field from the shared memory block, decoding it on the first use in this process.
+
+    Parameters:
+    name (str): The name of the shared memory block.
+
+    Returns:
+    tuple[NDArray, models.Abstraction | None]: The maze and its abstraction, if any.
+    """
+    field = _fields.get(name)
+    if field is not None:
+        _fields.move_to_end(name)
+        stats.count_cache_hits()
+        return field
+
+    # attaching registers the block with the resource tracker, see `share_resource_tracker`
+    block = SharedMemory(name)
+    try:
+        field = codec.decode_field(bytes(block.buf))
+    finally:
+        block.close()
+
+    _fields[name] = field
+    while len(_fields) > settings.worker_field_cache_size:
+        _fields.popitem(last=False)
+    return field
+
+
+def plan_shared_route(
+    name: str, current: tuple[int, int], goals: list[tuple[int, int]], algo: str
+) -> list[tuple[int, int]] | None:
+    """
+    Compute the path from the current position to the nearest goal on a shared field.
+
+    Parameters:
+    name (str): The name of the shared memory block with the field.
+    current (tuple[int, int]): The current position in the maze.
+    goals (list[tuple[int, int]]): The list of goal positions in the maze.
+    algo (str): The name of the algorithm to use for determining the path.
+
+    Returns:
+    list[tuple[int, int]] | None: The path without the current position, or None if no goal is reachable.
+    """
+    maze, abstraction = load_field(name)
+    # the name is unique for the content of the field, like the field id
+    return plan_route(maze, current, goals, algo, abstraction, name)
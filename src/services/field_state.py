@@ -1,49 +1,82 @@
 import asyncio
+import collections
 import datetime
 import logging
+import time
 import typing as t
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import Executor
 
-from numpy import zeros
+import numpy as np
 from numpy.typing import NDArray
 
 import models
 from core import exceptions as exc
+from core import metrics, tracing
 from core.config import settings
 from core.enums import Direction, GridValues
-from pathfinder.finder import determine_direction
+from pathfinder import stats
+from pathfinder.components import label_components, reachable
+from pathfinder.finder import (
+    direction_from_path,
+    direction_to,
+    next_step_from_plan,
+    plan_route,
+    prepare_field,
+)
+from pathfinder.managers import get_algo
 from server.lib.pathfinder_pb2 import Empty, Field, MoveRequest, MoveResponse
-from services import validators
-from state.state import State
+from services import components, dispatch, field_registry, validators
+from services.executor import shard_for
+from state import codec
+from state.state import DEFAULT_KEY, State
 
 
 def build_maze(n: int, m: int, grid: str) -> NDArray:
     """
     Builds a maze represented as a 2D array from a string representation.
 
+    The grid is compared with the obstacle character in one vectorized operation over its bytes.
+
     Parameters:
     n (int): The number of rows in the maze.
     m (int): The number of columns in the maze.
-    grid (str): A string representation of the maze where 'O' represents an obstacle and '.' represents a free space.
+    grid (str): A string representation of the maze where '1' represents an obstacle and any other character a free space.
 
     Returns:
-    NDArray: A 2D numpy array representing the maze where 1 represents an obstacle and 0 represents a free space.
+    NDArray: A 2D uint8 numpy array representing the maze where 1 represents an obstacle and 0 represents a free space.
+    """
+    # every character becomes exactly one byte, non-ASCII ones are replaced by '?'
+    cells = np.frombuffer(grid.encode('ascii', 'replace'), dtype=np.uint8)
+    return (cells == ord(GridValues.OBSTACLE)).view(np.uint8).reshape(n, m)
+
+
+def state_key(robot_id: str) -> str:
     """
-    maze = zeros((n, m), dtype=int)
-    for i in range(n):
-        for j in range(m):
-            if grid[i * m + j] == GridValues.OBSTACLE:
-                maze[i][j] = 1
-    return maze
+    Gets the state key of the robot.
 
+    Parameters:
+    robot_id (str): The robot identity from the request, empty if the robot has none.
 
-async def set_field(state: State, field: Field) -> Empty:
+    Returns:
+    str: The key of the robot state.
+    """
+    return robot_id or DEFAULT_KEY
+
+
+async def set_field(
+    state: State, field: Field, executor: Executor | None = None
+) -> Empty:
     """
     Sets the state of the maze and the starting position of the robot.
 
+    If the configured algorithm preprocesses the maze, the result is stored with the state and
+    reused by all the moves on the field. The connected components of the field are labeled for
+    the moves as well, see `component_labels`.
+
     Parameters:
     state (State): The current state of the system.
-    field (Field): An object containing the dimensions of the maze and its grid representation.
+    field (Field): An object containing the dimensions of the maze, its grid representation and the robot identity.
+    executor (Executor | None): An executor for the preprocessing. Defaults to the loop's default executor.
 
     Returns:
     Empty: An empty response indicating that the operation was successful.
@@ -52,7 +85,8 @@ async def set_field(state: State, field: Field) -> Empty:
 
     maze = build_maze(field.N, field.M, field.grid)
 
-    entity: models.Entry | None = await state.get_state()
+    key = state_key(field.robot_id)
+    entity: models.Entry | None = await state.get_state(key)
 
     if not entity:
         entity = models.Entry(
@@ -61,47 +95,230 @@ async def set_field(state: State, field: Field) -> Empty:
             action_count=0,
             action_count_log=[],
         )
+        if get_algo(settings.algo).preprocessing:
+            # the abstraction is not there yet, equal mazes are preprocessed by the same worker
+            maze_id = codec.field_id(codec.encode_field(entity))
+            entity.abstraction = await run_in_executor(
+                shard_for(executor, maze_id), prepare_field, maze, settings.algo
+            )
 
-    await state.set_state(entity)
+    await state.set_state(entity, key)
+    if settings.shared_fields:
+        field_registry.registry.register(entity)
+    await component_labels(entity, state, key)
 
     return Empty()
 
 
+async def component_labels(
+    entry: models.Entry, state: State | None = None, key: str = DEFAULT_KEY
+) -> NDArray | None:
+    """
+    Gets the labels of the connected components of the robot's field.
+
+    The labels are kept in `services.components.registry` for the fields used by this process.
+    Given the state, the labels missing there are read from the storage, where they are saved
+    with the field, so a server replica or a restarted server doesn't label the field again.
+    They are computed in a thread only if the storage has none for the field, normally by SetField.
+
+    Parameters:
+    entry (models.Entry): The state of the robot.
+    state (State | None): The current state of the system, None to not use the storage.
+    key (str): The key of the robot state.
+
+    Returns:
+    NDArray | None: The labels, see `pathfinder.components.label_components`, or None if `settings.component_cache_size` is 0.
+    """
+    if not settings.component_cache_size:
+        return None
+    if not entry.field_id:
+        entry.field_id = codec.field_id(codec.encode_field(entry))
+
+    labels = components.registry.get(entry.field_id)
+    if labels is not None:
+        return labels
+
+    if state is not None:
+        labels = await state.get_components(entry.field_id, key)
+    if labels is None:
+        labels = await asyncio.get_event_loop().run_in_executor(
+            dispatch.policy.threads, label_components, entry.maze
+        )
+        if state is not None:
+            await state.set_components(labels, entry.field_id, key)
+    components.registry.put(entry.field_id, labels)
+    return labels
+
+
+def record(
+    func: t.Callable, measurement: stats.Measurement, submitted: float | None = None
+):
+    """
+    Records the measurements of a task in `core.metrics` and in the trace of the request, if any.
+
+    Parameters:
+    func (Callable): The task.
+    measurement (stats.Measurement): The measurements of the task.
+    submitted (float | None): The wall clock time the task was submitted to an executor, None if it ran inline.
+    """
+    task = func.__name__
+    wait = None
+    if submitted is not None:
+        wait = max(measurement.started - submitted, 0)
+        metrics.EXECUTOR_WAIT.observe(wait, task=task)
+    tracing.record_task(task, measurement, wait)
+    stats.report_caches(measurement)
+    metrics.SEARCH_TIME.observe(measurement.seconds, task=task)
+    if measurement.stats.expanded:
+        metrics.NODES_EXPANDED.observe(measurement.stats.expanded, task=task)
+
+
+def run_inline(func, *args):
+    """
+    Runs a function in the event loop and returns the result, recording its measurements.
+    """
+    run = stats.profile if tracing.should_profile() else stats.measure
+    measurement = run(func, *args)
+    record(func, measurement)
+    return measurement.result
+
+
 async def run_in_executor(executor, func, *args):
     """
     Runs a function in an executor and returns the result.
 
+    The function is measured in the worker, so the time it waited for the worker is recorded
+    apart from its own time, see `record`. A sampled part of the functions is run under cProfile,
+    see `core.tracing`.
+
     For testing simplicity
     """
-    return await asyncio.get_event_loop().run_in_executor(executor, func, *args)
+    run = stats.profile if tracing.should_profile() else stats.measure
+    submitted = time.time()
+    measurement = await asyncio.get_event_loop().run_in_executor(
+        executor, run, func, *args
+    )
+    record(func, measurement, submitted)
+    return measurement.result
 
 
-async def moving(
-    state: State, executor: ProcessPoolExecutor, move_request: MoveRequest
-) -> MoveResponse:
+def _set_plan(
+    entry: models.Entry, plan: list[tuple[int, int]], targets: list[tuple[int, int]]
+):
+    # the plan is stored apart from the progress and saved again only when it changes
+    entry.plan_changed = entry.plan_changed or bool(entry.plan or plan)
+    entry.plan, entry.plan_targets, entry.plan_index = plan, targets, 0
+
+
+async def next_direction(
+    executor: Executor,
+    entry: models.Entry,
+    maze: NDArray,
+    targets: list[tuple[int, int]],
+) -> int:
     """
-    Moves the robot according to the given request and updates the state accordingly.
+    Determines the next direction for the robot, reusing its cached plan when possible.
+
+    The path is recomputed only when the plan is exhausted, the planned target is gone or the
+    targets have changed. The targets out of the robot's connected component are not searched for,
+    ERROR is returned at once if no target is left. Cheap searches run inline or in a thread, the
+    rest in the process pool, see `services.dispatch`; a sharded pool runs all the searches on a
+    field in the same worker.
+    The plan of the entry is advanced by the returned move.
 
     Parameters:
-    state (State): The current state of the system.
-    executor (ProcessPoolExecutor): An executor for running tasks in parallel.
-    move_request (MoveRequest): An object containing the target positions for the robot.
+    executor (Executor): An executor for running tasks in parallel.
+    entry (models.Entry): The state of the robot.
+    maze (NDArray): The maze represented as a 2D array.
+    targets (list[tuple[int, int]]): The target positions for the robot.
 
     Returns:
-    MoveResponse: An object containing the direction in which the robot should move next.
+    int: The direction in which the robot should move next.
     """
-    entry: models.Entry | None = await state.get_state()
-    if not entry:
-        raise exc.PathfinderError('State not found for robot!')
+    if not targets:
+        _set_plan(entry, [], [])
+        return Direction.FINISH
 
+    where_to = next_step_from_plan(
+        entry.plan, entry.plan_targets, entry.current, targets, entry.plan_index
+    )
+    if where_to is None:
+        path: list[tuple[int, int]] | None
+        labels = await component_labels(entry)
+        goals = targets if labels is None else reachable(labels, entry.current, targets)
+        if not goals:
+            _set_plan(entry, [], [])
+            return direction_from_path(entry.current, None)
+
+        placement = dispatch.policy.choose(
+            dispatch.estimate_cost(maze.shape, len(goals))
+        )
+        if placement is not dispatch.Placement.POOL:
+            args = (
+                maze,
+                entry.current,
+                goals,
+                settings.algo,
+                entry.abstraction,
+                entry.field_id,
+            )
+            if placement is dispatch.Placement.INLINE:
+                path = run_inline(plan_route, *args)
+            else:
+                path = await run_in_executor(dispatch.policy.threads, plan_route, *args)
+        elif settings.shared_fields:
+            # the block mustn't be released by the other fields while the task is in flight
+            with field_registry.registry.lease(entry) as name:
+                path = await run_in_executor(
+                    shard_for(executor, entry.field_id),
+                    field_registry.plan_shared_route,
+                    name,
+                    entry.current,
+                    goals,
+                    settings.algo,
+                )
+        else:
+            path = await run_in_executor(
+                shard_for(executor, entry.field_id),
+                plan_route,
+                maze,
+                entry.current,
+                goals,
+                settings.algo,
+                entry.abstraction,
+                entry.field_id,
+            )
+        if not path:
+            _set_plan(entry, [], [])
+            return direction_from_path(entry.current, path)
+
+        _set_plan(entry, [entry.current, *path], targets)
+        where_to = path[0]
+
+    entry.plan_index += 1
+    return direction_to(entry.current, where_to)
+
+
+async def make_move(
+    executor: Executor, entry: models.Entry, move_request: MoveRequest
+) -> int:
+    """
+    Determines the next move of the robot and applies it to its state.
+
+    Parameters:
+    executor (Executor): An executor for running tasks in parallel.
+    entry (models.Entry): The state of the robot, updated in place.
+    move_request (MoveRequest): An object containing the robot identity and its target positions.
+
+    Returns:
+    int: The direction in which the robot should move next.
+    """
     maze: NDArray = t.cast(NDArray, entry.maze)
     targets: list[tuple[int, int]] = [(p.i, p.j) for p in move_request.targets]
 
     validators.validate_targets(maze.shape[0], maze.shape[1], move_request.targets)
 
-    direction: int = await run_in_executor(
-        executor, determine_direction, maze, entry.current, targets, settings.algo
-    )
+    direction: int = await next_direction(executor, entry, maze, targets)
 
     entry.action_count += 1
 
@@ -123,6 +340,198 @@ async def moving(
         case Direction.UP:
             entry.current = (entry.current[0] - 1, entry.current[1])
 
-    await state.set_state(entry)
+    return direction
+
+
+async def moving(
+    state: State, executor: Executor, move_request: MoveRequest
+) -> MoveResponse:
+    """
+    Moves the robot according to the given request and updates the state accordingly.
+
+    The state is updated optimistically: if another request has moved the robot meanwhile, the
+    move is computed again from the new state.
+
+    Parameters:
+    state (State): The current state of the system.
+    executor (Executor): An executor for running tasks in parallel.
+    move_request (MoveRequest): An object containing the robot identity and its target positions.
+
+    Returns:
+    MoveResponse: An object containing the direction in which the robot should move next.
+
+    Raises:
+    PathfinderError: If there is no state for the robot or it keeps changing concurrently.
+    """
+    key = state_key(move_request.robot_id)
+    for _ in range(settings.state_update_attempts):
+        entry: models.Entry | None = await state.get_state(key)
+        if not entry:
+            raise exc.PathfinderError(f'State not found for robot {key}!')
+
+        # the labels of a field new to this process come from the storage
+        await component_labels(entry, state, key)
+        direction = await make_move(executor, entry, move_request)
+        if await state.set_progress(entry, key):
+            return MoveResponse(direction=direction)  # type: ignore
+
+        logging.warning(f'State of robot {key} was changed concurrently, retrying')
+
+    raise exc.PathfinderError(f'Too many concurrent updates of robot {key}!')
+
+
+def _moved_once(keys: list[str]) -> list[int]:
+    # the indexes of the robots which appear in the batch once
+    counts = collections.Counter(keys)
+    for key, count in counts.items():
+        if count > 1:
+            logging.error(f'Robot {key} is moved more than once in a batch')
+    return [index for index, key in enumerate(keys) if counts[key] == 1]
+
+
+async def _batch_move(
+    state: State,
+    executor: Executor,
+    key: str,
+    entry: models.Entry | None,
+    move_request: MoveRequest,
+) -> tuple[int, models.Entry] | None:
+    # the move of one robot of a batch, None if it fails: the other robots still move
+    if not entry:
+        logging.error(f'State not found for robot {key}!')
+        return None
+    try:
+        await component_labels(entry, state, key)
+        return await make_move(executor, entry, move_request), entry
+    except exc.PathfinderError as e:
+        logging.error(e)
+    except Exception:
+        logging.exception(f'Failed to move robot {key}')
+    return None
+
+
+async def move_batch(
+    state: State, executor: Executor, move_requests: list[MoveRequest]
+) -> list[int]:
+    """
+    Moves many robots at once: reads their states together, searches concurrently and saves together.
+
+    A robot which has no state, sends invalid targets or appears in the batch more than once
+    gets ERROR, without affecting the others. The moves rejected by the version check are
+    computed again from the new states, like in `moving`.
+
+    Parameters:
+    state (State): The current state of the system.
+    executor (Executor): An executor for running tasks in parallel.
+    move_requests (list[MoveRequest]): The requests of the robots.
+
+    Returns:
+    list[int]: The direction of each robot, in the order of the requests.
+    """
+    directions: list[int] = [Direction.ERROR] * len(move_requests)
+    keys = [state_key(request.robot_id) for request in move_requests]
+    pending = _moved_once(keys)
+
+    for _ in range(settings.state_update_attempts):
+        if not pending:
+            break
+        entries = await state.get_states([keys[index] for index in pending])
+        results = await asyncio.gather(
+            *(
+                _batch_move(state, executor, keys[index], entry, move_requests[index])
+                for index, entry in zip(pending, entries)
+            )
+        )
+
+        moved: list[tuple[int, models.Entry]] = []
+        for index, result in zip(pending, results):
+            if result is not None:
+                directions[index], entry = result
+                moved.append((index, entry))
+
+        saved = await state.set_progresses(
+            [(entry, keys[index]) for index, entry in moved]
+        )
+        pending = [index for (index, _), ok in zip(moved, saved) if not ok]
+        for index in pending:
+            directions[index] = Direction.ERROR
+            logging.warning(
+                f'State of robot {keys[index]} was changed concurrently, retrying'
+            )
+
+    return directions
+
+
+class MovingSession:
+    """
+    Moves robots for the requests of one Moving stream.
+
+    The robot states are read once and kept in memory for the lifetime of the stream. They are
+    saved every `settings.stream_persist_interval` moves, on FINISH and when the session is
+    closed. If a state has been changed elsewhere meanwhile (e.g. by a new SetField), the saved
+    progress is rejected: the moves answered since the last save are discarded, the request
+    which found it out is answered with ERROR and the session continues from the stored state.
+    """
+
+    def __init__(self, state: State, executor: Executor):
+        """
+        Parameters:
+        state (State): The current state of the system.
+        executor (Executor): An executor for running tasks in parallel.
+        """
+        self._state = state
+        self._executor = executor
+        self._entries: dict[str, models.Entry] = {}
+        self._unsaved: dict[str, int] = {}
+
+    async def move(self, move_request: MoveRequest) -> MoveResponse:
+        """
+        Moves the robot according to the given request.
+
+        Parameters:
+        move_request (MoveRequest): An object containing the robot identity and its target positions.
+
+        Returns:
+        MoveResponse: An object containing the direction in which the robot should move next.
+
+        Raises:
+        PathfinderError: If there is no state for the robot or the request is invalid.
+        """
+        key = state_key(move_request.robot_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = await self._state.get_state(key)
+            if not entry:
+                raise exc.PathfinderError(f'State not found for robot {key}!')
+            await component_labels(entry, self._state, key)
+            self._entries[key] = entry
+
+        direction = await make_move(self._executor, entry, move_request)
+
+        self._unsaved[key] = self._unsaved.get(key, 0) + 1
+        if (
+            self._unsaved[key] >= settings.stream_persist_interval
+            or direction == Direction.FINISH
+        ) and not await self._save(key):
+            # the client must not go on from the position it was told about
+            direction = Direction.ERROR
+
+        return MoveResponse(direction=direction)  # type: ignore
+
+    async def _save(self, key: str) -> bool:
+        unsaved = self._unsaved.pop(key, 0)
+        if await self._state.set_progress(self._entries[key], key):
+            return True
+        logging.error(
+            f'State of robot {key} was changed elsewhere, '
+            f'{unsaved} answered moves are discarded, reloading'
+        )
+        del self._entries[key]
+        return False
 
-    return MoveResponse(direction=direction)  # type: ignore
+    async def close(self):
+        """
+        Saves the moves which haven't been saved yet.
+        """
+        for key in list(self._unsaved):
+            await self._save(key)
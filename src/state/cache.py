@@ -0,0 +1,174 @@
+from collections import OrderedDict
+
+from core import tracing
+from models import Entry
+from state.state import DEFAULT_KEY, BaseStorage, State
+
+
+def _copy(entry: Entry) -> Entry:
+    # the maze and the abstraction are never changed in place, the progress is copied
+    copy = entry.model_copy()
+    copy.action_count_log = list(entry.action_count_log)
+    copy.plan = list(entry.plan)
+    copy.plan_targets = list(entry.plan_targets)
+    return copy
+
+
+class CachedState(State):
+    """Write-through cache of the decoded robot states in process memory.
+
+    The states are read and decoded once and then served from memory as copies, so a hit costs
+    only a read of the state version instead of the whole state and the decoding of the maze.
+    Every save goes to the storage first. A cached state is outdated if another server replica
+    has changed it: its version differs on the next hit, so it is dropped and read again. The
+    version check of `set_progress` still rejects the moves of a state changed between the read
+    and the save, which drops the cached state as well.
+    """
+
+    def __init__(self, storage: BaseStorage, size: int):
+        """Initialize the CachedState instance.
+
+        Args:
+            storage (BaseStorage): The storage backend.
+            size (int): The maximum number of cached states, the least recently used are dropped.
+        """
+        super().__init__(storage)
+        self.size = size
+        self._entries: OrderedDict[str, Entry] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _store(self, key: str, entry: Entry):
+        self._entries[key] = _copy(entry)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def _lookup(self, key: str, version: int) -> Entry | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.version != version:
+            # changed by another replica
+            self.invalidate(key)
+            return None
+        self.hits += 1
+        tracing.count_state_cache_hits()
+        self._entries.move_to_end(key)
+        return _copy(entry)
+
+    async def set_state(self, value: Entry, key: str = DEFAULT_KEY):
+        """Set state, both the field and the progress, and cache it.
+
+        Args:
+            value (Entry): The state value.
+            key (str, optional): The state key. Defaults to 'robot_id'.
+        """
+        await super().set_state(value, key)
+        self._store(key, value)
+
+    async def set_progress(self, value: Entry, key: str = DEFAULT_KEY) -> bool:
+        """Set the progress part of the state unless the state has changed since it was read.
+
+        The cached state is replaced by the saved one, or dropped if the save is rejected.
+
+        Args:
+            value (Entry): The state value.
+            key (str, optional): The state key. Defaults to 'robot_id'.
+
+        Returns:
+            bool: True if saved, False if the value is stale and has to be read again.
+        """
+        saved = await super().set_progress(value, key)
+        self._update(key, value, saved)
+        return saved
+
+    async def set_progresses(self, values: list[tuple[Entry, str]]) -> list[bool]:
+        """Set the progress of many robots and update the cache, see `set_progress`.
+
+        Args:
+            values (list[tuple[Entry, str]]): The state value and the state key of each robot.
+
+        Returns:
+            list[bool]: For each robot, True if saved, False if the value is stale and has to be read again.
+        """
+        saved = await super().set_progresses(values)
+        for (value, key), ok in zip(values, saved):
+            self._update(key, value, ok)
+        return saved
+
+    def _update(self, key: str, value: Entry, saved: bool):
+        if saved:
+            self._store(key, value)
+        else:
+            self.invalidate(key)
+
+    async def get_state(self, key: str = DEFAULT_KEY) -> Entry | None:
+        """Get state from the cache if its version is current, or from the storage.
+
+        Args:
+            key (str, optional): The state key. Defaults to 'robot_id'.
+
+        Returns:
+            Entry | None: A copy of the state, or None if the key does not exist.
+        """
+        if key in self._entries:
+            entry = self._lookup(key, await self.storage.retrieve_version(key))
+            if entry is not None:
+                return entry
+
+        self.misses += 1
+        entry = await super().get_state(key)
+        if entry is not None:
+            self._store(key, entry)
+        return entry
+
+    async def get_states(self, keys: list[str]) -> list[Entry | None]:
+        """Get the states of many robots from the cache, the missing and outdated ones from the storage at once.
+
+        Args:
+            keys (list[str]): The state keys.
+
+        Returns:
+            list[Entry | None]: A copy of the state of each robot, None for the keys which don't exist.
+        """
+        cached = [key for key in keys if key in self._entries]
+        versions = dict(zip(cached, await self.storage.retrieve_versions(cached)))
+        entries = {
+            key: self._lookup(key, versions[key]) if key in versions else None
+            for key in keys
+        }
+        missing = [key for key, entry in entries.items() if entry is None]
+        if missing:
+            self.misses += len(missing)
+            for key, entry in zip(missing, await super().get_states(missing)):
+                if entry is not None:
+                    self._store(key, entry)
+                entries[key] = entry
+        return [entries[key] for key in keys]
+
+    def invalidate(self, key: str):
+        """Drop the cached state.
+
+        Args:
+            key (str): The state key.
+        """
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def cache_info(self) -> dict[str, int | float]:
+        """Get the statistics of the cache.
+
+        Returns:
+            dict[str, int | float]: The hits, misses, invalidations, current and maximum size and hit rate.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'size': len(self._entries),
+            'maxsize': self.size,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
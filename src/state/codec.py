@@ -0,0 +1,322 @@
+import hashlib
+import struct
+import zlib
+
+import numpy as np
+import orjson as json
+from numpy.typing import NDArray
+
+from models import Abstraction, Entry
+
+FIELD_MAGIC = b'PF'
+PROGRESS_MAGIC = b'PP'
+COMPONENTS_MAGIC = b'PC'
+PLAN_MAGIC = b'PL'
+VERSION = 2
+# the progress and the plan are stored apart since the format version 3
+PROGRESS_VERSION = 3
+# magic, version, N, M, cluster size of the abstraction (0 without one)
+FIELD_HEADER = struct.Struct('<2sBIII')
+# magic, version, current, action count, index of the current cell in the plan; the JSON tail
+# takes the rest
+PROGRESS_HEADER = struct.Struct('<2sBiiQI')
+# the progress of the format version 2, the plan is in its JSON tail
+PROGRESS_HEADER_V2 = struct.Struct('<2sBiiQ')
+# magic, version, number of cells of the plan, number of targets; the int32 coordinates follow
+PLAN_HEADER = struct.Struct('<2sBII')
+COUNT = struct.Struct('<I')
+# magic, version, digest of the field, N, M, bytes per label; the compressed labels take the rest
+COMPONENTS_HEADER = struct.Struct('<2sB8sIIB')
+# the whole state in one blob, kept in a hash by the format version 1: magic, version, N, M,
+# current, action count, length of the JSON tail
+LEGACY_HEADER = struct.Struct('<2sBIIiiQI')
+LEGACY_VERSION = 1
+# the progress fields kept in the JSON tail
+TAIL_FIELDS = {'action_count_log'}
+ABSTRACTION_ARRAYS = (
+    'nodes',
+    'cluster_offsets',
+    'edge_offsets',
+    'edge_targets',
+    'edge_costs',
+)
+
+
+def encode_field(entry: Entry) -> bytes:
+    """
+    Encode the immutable part of the robot state: the maze and its abstraction.
+
+    The layout is a fixed header, the bit-packed maze (one bit per cell, set for obstacles) and,
+    if present, the int32 arrays of the HPA* abstraction, each prefixed with its length.
+
+    Args:
+        entry (Entry): The robot state.
+
+    Returns:
+        bytes: The encoded field.
+    """
+    maze = np.asarray(entry.maze)
+    abstraction = entry.abstraction
+    chunks = [
+        FIELD_HEADER.pack(
+            FIELD_MAGIC,
+            VERSION,
+            maze.shape[0],
+            maze.shape[1],
+            0 if abstraction is None else abstraction.cluster_size,
+        ),
+        np.packbits(maze == 1).tobytes(),
+    ]
+    if abstraction is not None:
+        for name in ABSTRACTION_ARRAYS:
+            array = np.ascontiguousarray(getattr(abstraction, name), dtype='<i4')
+            chunks += [COUNT.pack(array.size), array.tobytes()]
+    return b''.join(chunks)
+
+
+def encode_progress(entry: Entry) -> bytes:
+    """
+    Encode the mutable part of the robot state: the position, the counters and the place in the plan.
+
+    The plan itself is encoded by `encode_plan`, it changes only when the path is computed again.
+
+    Args:
+        entry (Entry): The robot state.
+
+    Returns:
+        bytes: The encoded progress.
+    """
+    tail = entry.model_dump(mode='json', include=TAIL_FIELDS, exclude_defaults=True)
+    tail['action_count_log'] = tail.get('action_count_log', [])
+    header = PROGRESS_HEADER.pack(
+        PROGRESS_MAGIC,
+        PROGRESS_VERSION,
+        *entry.current,
+        entry.action_count,
+        entry.plan_index,
+    )
+    return header + json.dumps(tail)
+
+
+def encode_plan(entry: Entry) -> bytes:
+    """
+    Encode the plan of the robot and the targets it was computed for.
+
+    Args:
+        entry (Entry): The robot state.
+
+    Returns:
+        bytes: The encoded plan.
+    """
+    header = PLAN_HEADER.pack(
+        PLAN_MAGIC, PROGRESS_VERSION, len(entry.plan), len(entry.plan_targets)
+    )
+    cells = np.array([*entry.plan, *entry.plan_targets], dtype='<i4')
+    return header + cells.tobytes()
+
+
+def decode_plan(plan: bytes) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+    """
+    Decode the plan encoded by `encode_plan`.
+
+    Args:
+        plan (bytes): The encoded plan.
+
+    Returns:
+        tuple[list[tuple[int, int]], list[tuple[int, int]]]: The plan and its targets.
+
+    Raises:
+        ValueError: If the data is not in a known format.
+    """
+    magic, version, length, targets = PLAN_HEADER.unpack_from(plan)
+    if magic != PLAN_MAGIC or version != PROGRESS_VERSION:
+        raise ValueError(f'Unknown plan format: {magic!r} version {version}')
+    cells = np.frombuffer(plan, dtype='<i4', offset=PLAN_HEADER.size).reshape(-1, 2)
+    points = [(int(i), int(j)) for i, j in cells]
+    return points[:length], points[length : length + targets]
+
+
+def field_id(field: bytes) -> str:
+    """
+    Identify the encoded field by its content.
+
+    Args:
+        field (bytes): The encoded field.
+
+    Returns:
+        str: The hex digest of the field.
+    """
+    return hashlib.blake2b(field, digest_size=8).hexdigest()
+
+
+def decode_field(field: bytes) -> tuple[NDArray, Abstraction | None]:
+    """
+    Decode the field encoded by `encode_field`.
+
+    Args:
+        field (bytes): The encoded field.
+
+    Returns:
+        tuple[NDArray, Abstraction | None]: The maze and its abstraction, if any.
+
+    Raises:
+        ValueError: If the data is not in a known format.
+    """
+    magic, version, n, m, cluster_size = FIELD_HEADER.unpack_from(field)
+    if magic != FIELD_MAGIC or version != VERSION:
+        raise ValueError(f'Unknown field format: {magic!r} version {version}')
+
+    maze, offset = _decode_maze(field, FIELD_HEADER.size, n, m)
+    if not cluster_size:
+        return maze, None
+    return maze, _decode_abstraction(field, offset, cluster_size)
+
+
+def _decode_maze(data: bytes, offset: int, n: int, m: int) -> tuple[NDArray, int]:
+    maze_length = (n * m + 7) // 8
+    bits = np.frombuffer(data, dtype=np.uint8, count=maze_length, offset=offset)
+    maze = np.unpackbits(bits, count=n * m).reshape(n, m)
+    return maze, offset + maze_length
+
+
+def _decode_abstraction(data: bytes, offset: int, cluster_size: int) -> Abstraction:
+    arrays = {}
+    for name in ABSTRACTION_ARRAYS:
+        (count,) = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        arrays[name] = np.frombuffer(data, dtype='<i4', count=count, offset=offset)
+        offset += 4 * count
+    arrays['nodes'] = arrays['nodes'].reshape(-1, 2)
+    return Abstraction(cluster_size=cluster_size, **arrays)
+
+
+def decode_entry(field: bytes, progress: bytes, plan: bytes | None = None) -> Entry:
+    """
+    Decode the robot state encoded by `encode_field`, `encode_progress` and `encode_plan`.
+
+    The progress of the format version 2 carries the plan itself, the entry is marked to store
+    the plan apart on the next save.
+
+    Args:
+        field (bytes): The encoded field.
+        progress (bytes): The encoded progress.
+        plan (bytes | None, optional): The encoded plan, None if there is none.
+
+    Returns:
+        Entry: The robot state.
+
+    Raises:
+        ValueError: If the data is not in a known format.
+    """
+    maze, abstraction = decode_field(field)
+
+    magic, version = progress[:2], progress[2]
+    if magic != PROGRESS_MAGIC or version not in (VERSION, PROGRESS_VERSION):
+        raise ValueError(f'Unknown progress format: {magic!r} version {version}')
+    if version == VERSION:
+        _, _, i, j, action_count = PROGRESS_HEADER_V2.unpack_from(progress)
+        tail = json.loads(progress[PROGRESS_HEADER_V2.size :])
+        entry = Entry(maze=maze, current=(i, j), action_count=action_count, **tail)
+        entry.plan_changed = bool(entry.plan)
+    else:
+        _, _, i, j, action_count, plan_index = PROGRESS_HEADER.unpack_from(progress)
+        tail = json.loads(progress[PROGRESS_HEADER.size :])
+        entry = Entry(maze=maze, current=(i, j), action_count=action_count, **tail)
+        path, targets = decode_plan(plan) if plan else ([], [])
+        if path:
+            entry.plan, entry.plan_targets, entry.plan_index = path, targets, plan_index
+
+    if abstraction is not None:
+        entry.abstraction = abstraction
+    entry.field_id = field_id(field)
+    return entry
+
+
+def encode_components(labels: NDArray, field: str) -> bytes:
+    """
+    Encode the labels of the connected components of a field.
+
+    The labels are stored with the id of the field they were computed for. They are long runs of
+    equal values, so they are compressed.
+
+    Args:
+        labels (numpy.NDArray): The labels, see `pathfinder.components.label_components`.
+        field (str): The id of the field, see `field_id`.
+
+    Returns:
+        bytes: The encoded labels.
+    """
+    header = COMPONENTS_HEADER.pack(
+        COMPONENTS_MAGIC,
+        VERSION,
+        bytes.fromhex(field),
+        labels.shape[0],
+        labels.shape[1],
+        labels.dtype.itemsize,
+    )
+    data = np.ascontiguousarray(labels, dtype=labels.dtype.newbyteorder('<'))
+    return header + zlib.compress(data.tobytes(), 1)
+
+
+def decode_components(data: bytes, field: str) -> NDArray | None:
+    """
+    Decode the labels encoded by `encode_components`.
+
+    Args:
+        data (bytes): The encoded labels.
+        field (str): The id of the field the labels are expected for.
+
+    Returns:
+        numpy.NDArray | None: The labels, or None if they were computed for another field.
+
+    Raises:
+        ValueError: If the data is not in a known format.
+    """
+    magic, version, digest, n, m, itemsize = COMPONENTS_HEADER.unpack_from(data)
+    if magic != COMPONENTS_MAGIC or version != VERSION:
+        raise ValueError(f'Unknown components format: {magic!r} version {version}')
+    if digest.hex() != field:
+        return None
+    labels = zlib.decompress(data[COMPONENTS_HEADER.size :])
+    return (
+        np.frombuffer(labels, dtype=f'<u{itemsize}')
+        .reshape(n, m)
+        .astype(f'u{itemsize}')
+    )
+
+
+def decode_legacy(data: bytes) -> Entry:
+    """
+    Decode the robot state stored by the previous versions.
+
+    It is either a JSON-encoded entry or a single blob of the format version 1, which kept the
+    field and the progress together. The plan of the entry is marked to be stored apart.
+
+    Args:
+        data (bytes): The stored entry.
+
+    Returns:
+        Entry: The robot state.
+
+    Raises:
+        ValueError: If the data is not in a known format.
+    """
+    if not data.startswith(FIELD_MAGIC):
+        entry = Entry(**json.loads(data))
+        entry.plan_changed = bool(entry.plan)
+        return entry
+
+    _, version, n, m, i, j, action_count, tail_length = LEGACY_HEADER.unpack_from(data)
+    if version != LEGACY_VERSION:
+        raise ValueError(f'Unknown legacy state format version: {version}')
+
+    maze, offset = _decode_maze(data, LEGACY_HEADER.size, n, m)
+    tail = json.loads(data[offset : offset + tail_length])
+    cluster_size = tail.pop('cluster_size', None)
+    if cluster_size is not None:
+        tail['abstraction'] = _decode_abstraction(
+            data, offset + tail_length, cluster_size
+        )
+    entry = Entry(maze=maze, current=(i, j), action_count=action_count, **tail)
+    entry.plan_changed = bool(entry.plan)
+    return entry
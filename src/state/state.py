@@ -1,46 +1,199 @@
+import contextlib
 import logging
+import typing as t
 from abc import ABC, abstractmethod
 from functools import cache
-from typing import Any
 
 import orjson as json
+from numpy.typing import NDArray
 from redis.asyncio import Redis
 
+from core import metrics, tracing
 from core.config import settings
 from core.enums import StateStorage
 from core.exceptions import PathfinderError
+from db.pipeline import CommandBatcher, execute
 from models import Entry
+from state import codec
+
+# the parts of the robot state
+FIELD = 'field'
+PROGRESS = 'progress'
+PLAN = 'plan'
+PARTS = (FIELD, PROGRESS, PLAN)
+# the labels of the connected components of the field, read apart from the parts
+COMPONENTS = 'components'
+# the counter of the state changes, stored next to the parts
+VERSION = 'version'
+# the key of the robots which don't identify themselves
+DEFAULT_KEY = 'robot_id'
+
+
+# KEYS: progress, version, plan; ARGV: progress, expected version, plan (empty to keep it)
+SAVE_PROGRESS_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[2]) or '0') ~= tonumber(ARGV[2]) then
+    return false
+end
+redis.call('SET', KEYS[1], ARGV[1])
+if ARGV[3] ~= '' then
+    redis.call('SET', KEYS[3], ARGV[3])
+end
+return redis.call('INCR', KEYS[2])
+"""
+
+
+@contextlib.contextmanager
+def _timed(histogram: metrics.Histogram, operation: str, part: str) -> t.Iterator[None]:
+    # the time goes to the metrics and to the trace of the request, if it is traced
+    with histogram.time(operation=operation), tracing.span(part):
+        yield
 
 
 class BaseStorage(ABC):
     """Abstract base class for state storage.
 
     This class defines the interface for all concrete storage classes. It includes methods for saving and retrieving state.
+    The state of each robot consists of independently stored parts, see `State`.
     """
 
     @abstractmethod
-    async def save_state(self, state: dict[str, Any]):
+    async def save_state(self, key: str, parts: dict[str, bytes]) -> int:
         """Abstract method for saving state.
 
         Args:
-            state (dict[str, Any]): The state to be saved.
+            key (str): The state key.
+            parts (dict[str, bytes]): The encoded parts to be saved, the other parts are kept.
+
+        Returns:
+            int: The new version of the state.
+        """
+        ...
+
+    @abstractmethod
+    async def save_progress(
+        self, key: str, progress: bytes, version: int, plan: bytes | None = None
+    ) -> int | None:
+        """Abstract method for atomically saving the progress if the state version is unchanged.
+
+        Args:
+            key (str): The state key.
+            progress (bytes): The encoded progress.
+            version (int): The version of the state the progress was computed from.
+            plan (bytes | None, optional): The encoded plan, saved with the progress if it has changed.
+
+        Returns:
+            int | None: The new version of the state, or None if the state has been changed since.
         """
         ...
 
     @abstractmethod
-    async def retrieve_state(self) -> dict[str, Any]:
+    async def retrieve_state(self, key: str) -> tuple[dict[str, bytes], int]:
         """Abstract method for retrieving state.
 
+        Args:
+            key (str): The state key.
+
         Returns:
-            dict[str, Any]: The retrieved state.
+            tuple[dict[str, bytes], int]: The stored parts of the state and its version.
         """
         ...
 
+    async def retrieve_version(self, key: str) -> int:
+        """Retrieve only the version of the state.
+
+        Storages which can read it apart from the parts should override this method.
+
+        Args:
+            key (str): The state key.
+
+        Returns:
+            int: The version of the state, 0 if there is none.
+        """
+        _, version = await self.retrieve_state(key)
+        return version
+
+    async def retrieve_versions(self, keys: list[str]) -> list[int]:
+        """Retrieve only the versions of many states, see `retrieve_version`.
+
+        Args:
+            keys (list[str]): The state keys.
+
+        Returns:
+            list[int]: The version of each state, in the order of the keys.
+        """
+        return [await self.retrieve_version(key) for key in keys]
+
+    async def retrieve_states(
+        self, keys: list[str]
+    ) -> list[tuple[dict[str, bytes], int]]:
+        """Retrieve the states of many robots.
+
+        Storages which can do it in fewer round trips should override this method.
+
+        Args:
+            keys (list[str]): The state keys.
+
+        Returns:
+            list[tuple[dict[str, bytes], int]]: The stored parts and the version of each state, in the order of the keys.
+        """
+        return [await self.retrieve_state(key) for key in keys]
+
+    async def save_progresses(
+        self, progresses: list[tuple[str, bytes, int, bytes | None]]
+    ) -> list[int | None]:
+        """Save the progress of many robots, each if its state version is unchanged.
+
+        Storages which can do it in fewer round trips should override this method.
+
+        Args:
+            progresses (list[tuple[str, bytes, int, bytes | None]]): The state key, the encoded progress, the version it was computed from and the encoded plan if it has changed.
+
+        Returns:
+            list[int | None]: The new version of each state, or None if it has been changed since.
+        """
+        return [await self.save_progress(*progress) for progress in progresses]
+
+    async def save_components(self, key: str, components: bytes):
+        """Save the labels of the connected components of the field of the robot.
+
+        The labels don't change the version of the state. Storages which don't keep them
+        may skip them: the labels are computed again when needed.
+
+        Args:
+            key (str): The state key.
+            components (bytes): The encoded labels.
+        """
+
+    async def retrieve_components(self, key: str) -> bytes | None:
+        """Retrieve the labels saved by `save_components`.
+
+        Args:
+            key (str): The state key.
+
+        Returns:
+            bytes | None: The encoded labels, or None if there are none.
+        """
+        return None
+
+    async def retrieve_legacy_state(self, key: str) -> bytes | None:
+        """Retrieve the state saved by the previous versions in a single blob.
+
+        Args:
+            key (str): The state key.
+
+        Returns:
+            bytes | None: The JSON-encoded entry, or None if there is none.
+        """
+        return None
+
 
 class RedisStorage(BaseStorage):
     """Concrete storage class for Redis.
 
     This class implements the BaseStorage interface using Redis for state storage.
+    Every part of the state is stored in its own key: `<prefix>:<state key>:<part>`.
+    Unless `settings.redis_batch_commands` is off, the reads and the progress updates issued
+    concurrently by many requests are sent in one pipeline, see `db.pipeline.CommandBatcher`.
     """
 
     def __init__(self, connection: Redis):
@@ -50,32 +203,212 @@ class RedisStorage(BaseStorage):
             connection (Redis): The Redis connection.
         """
         self.redis = connection
+        self._save_progress = connection.register_script(SAVE_PROGRESS_SCRIPT)
+        self._batcher = (
+            CommandBatcher(connection) if settings.redis_batch_commands else None
+        )
+
+    @staticmethod
+    def _key(key: str, part: str) -> str:
+        return f'{settings.redis_server_state_key}:{key}:{part}'
+
+    def _progress_keys(self, key: str) -> list[str]:
+        # the keys of the compare-and-set script
+        return [self._key(key, part) for part in (PROGRESS, VERSION, PLAN)]
+
+    async def save_state(self, key: str, parts: dict[str, bytes]) -> int:
+        """Save state parts to Redis and bump the version in one round trip.
+
+        Args:
+            key (str): The state key.
+            parts (dict[str, bytes]): The encoded parts to be saved.
+
+        Returns:
+            int: The new version of the state.
+        """
+        with _timed(metrics.REDIS_LATENCY, 'save_state', 'redis'):
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.mset(
+                    {self._key(key, part): value for part, value in parts.items()}
+                )
+                pipe.incr(self._key(key, VERSION))
+                _, version = await pipe.execute()
+        return version
+
+    async def save_progress(
+        self, key: str, progress: bytes, version: int, plan: bytes | None = None
+    ) -> int | None:
+        """Save the progress with a server-side compare-and-set of the version in one round trip.
+
+        Args:
+            key (str): The state key.
+            progress (bytes): The encoded progress.
+            version (int): The version of the state the progress was computed from.
+            plan (bytes | None, optional): The encoded plan, saved with the progress if it has changed.
+
+        Returns:
+            int | None: The new version of the state, or None if the state has been changed since.
+        """
+        keys = self._progress_keys(key)
+        args: list[bytes | int] = [progress, version, plan or b'']
+        with _timed(metrics.REDIS_LATENCY, 'save_progress', 'redis'):
+            return await execute(
+                self.redis,
+                self._batcher,
+                lambda client: self._save_progress(keys=keys, args=args, client=client),
+            )
+
+    async def retrieve_state(self, key: str) -> tuple[dict[str, bytes], int]:
+        """Retrieve all state parts and the version from Redis in one round trip.
 
-    async def save_state(self, state: dict[str, Any]):
-        """Save state to Redis.
+        Args:
+            key (str): The state key.
+
+        Returns:
+            tuple[dict[str, bytes], int]: The stored parts of the state and its version.
+        """
+        keys = [self._key(key, part) for part in (*PARTS, VERSION)]
+        with _timed(metrics.REDIS_LATENCY, 'retrieve_state', 'redis'):
+            *values, version = await execute(
+                self.redis, self._batcher, lambda client: client.mget(keys)
+            )
+        parts = {part: value for part, value in zip(PARTS, values) if value is not None}
+        return parts, int(version or 0)
+
+    async def retrieve_version(self, key: str) -> int:
+        """Retrieve the version of the state from Redis, a single small GET.
+
+        Args:
+            key (str): The state key.
+
+        Returns:
+            int: The version of the state, 0 if there is none.
+        """
+        name = self._key(key, VERSION)
+        with _timed(metrics.REDIS_LATENCY, 'retrieve_version', 'redis'):
+            version = await execute(
+                self.redis, self._batcher, lambda client: client.get(name)
+            )
+        return int(version or 0)
+
+    async def retrieve_versions(self, keys: list[str]) -> list[int]:
+        """Retrieve the versions of many states from Redis with one MGET.
 
         Args:
-            state (dict[str, Any]): The state to be saved.
+            keys (list[str]): The state keys.
+
+        Returns:
+            list[int]: The version of each state, in the order of the keys.
         """
-        serialized = json.dumps(state)
-        await self.redis.set(settings.redis_server_state_key, serialized)
+        if not keys:
+            return []
+        with _timed(metrics.REDIS_LATENCY, 'retrieve_versions', 'redis'):
+            versions = await self.redis.mget([self._key(key, VERSION) for key in keys])
+        return [int(version or 0) for version in versions]
 
-    async def retrieve_state(self) -> dict[str, Any]:
-        """Retrieve state from Redis.
+    async def retrieve_states(
+        self, keys: list[str]
+    ) -> list[tuple[dict[str, bytes], int]]:
+        """Retrieve the parts and the versions of many states from Redis with one MGET.
+
+        Args:
+            keys (list[str]): The state keys.
 
         Returns:
-            dict[str, Any]: The retrieved state.
+            list[tuple[dict[str, bytes], int]]: The stored parts and the version of each state, in the order of the keys.
         """
-        serialized = await self.redis.get(settings.redis_server_state_key)
+        if not keys:
+            return []
+        names = (*PARTS, VERSION)
+        with _timed(metrics.REDIS_LATENCY, 'retrieve_states', 'redis'):
+            values = await self.redis.mget(
+                [self._key(key, name) for key in keys for name in names]
+            )
+        states = []
+        for offset in range(0, len(values), len(names)):
+            *stored, version = values[offset : offset + len(names)]
+            parts = {
+                part: value for part, value in zip(PARTS, stored) if value is not None
+            }
+            states.append((parts, int(version or 0)))
+        return states
+
+    async def save_progresses(
+        self, progresses: list[tuple[str, bytes, int, bytes | None]]
+    ) -> list[int | None]:
+        """Save the progress of many robots with the compare-and-set script in one pipeline.
+
+        Every progress is checked and saved atomically on its own, a stale one doesn't fail the others.
+
+        Args:
+            progresses (list[tuple[str, bytes, int, bytes | None]]): The state key, the encoded progress, the version it was computed from and the encoded plan if it has changed.
+
+        Returns:
+            list[int | None]: The new version of each state, or None if it has been changed since.
+        """
+        if not progresses:
+            return []
+        with _timed(metrics.REDIS_LATENCY, 'save_progresses', 'redis'):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, progress, version, plan in progresses:
+                    await self._save_progress(
+                        keys=self._progress_keys(key),
+                        args=[progress, version, plan or b''],
+                        client=pipe,
+                    )
+                return await pipe.execute()
+
+    async def save_components(self, key: str, components: bytes):
+        """Save the labels of the connected components to their own key.
+
+        Args:
+            key (str): The state key.
+            components (bytes): The encoded labels.
+        """
+        with _timed(metrics.REDIS_LATENCY, 'save_components', 'redis'):
+            await self.redis.set(self._key(key, COMPONENTS), components)
+
+    async def retrieve_components(self, key: str) -> bytes | None:
+        """Retrieve the labels of the connected components from Redis.
+
+        Args:
+            key (str): The state key.
+
+        Returns:
+            bytes | None: The encoded labels, or None if there are none.
+        """
+        with _timed(metrics.REDIS_LATENCY, 'retrieve_components', 'redis'):
+            return await self.redis.get(self._key(key, COMPONENTS))
+
+    async def retrieve_legacy_state(self, key: str) -> bytes | None:
+        """Retrieve the state from the key shared by all robots, used by the previous versions.
+
+        The key holds either a JSON object of JSON-encoded entries or, since the format
+        version 1, a hash of binary entries.
+
+        Args:
+            key (str): The state key.
+
+        Returns:
+            bytes | None: The stored entry, see `codec.decode_legacy`, or None if there is none.
+        """
+        shared_key = settings.redis_server_state_key
+        if await self.redis.type(shared_key) in (b'hash', 'hash'):
+            return await self.redis.hget(shared_key, key)  # type: ignore
+        serialized = await self.redis.get(shared_key)
         if not serialized:
-            return {}
-        return json.loads(serialized)
+            return None
+        value = json.loads(serialized).get(key)
+        return value.encode() if value else None
 
 
 class State:
     """Class for managing state.
 
     This class provides methods for setting and getting state using a specified storage backend.
+    The immutable field (the maze and its precomputed data) is stored apart from the progress
+    (the position, the counters and the place in the plan) and from the plan, which changes only
+    when the path is computed again, so a move rewrites only a few bytes.
     """
 
     def __init__(self, storage: BaseStorage):
@@ -86,39 +419,159 @@ class State:
         """
         self.storage = storage
 
-    async def set_state(self, value: Entry, key: str = 'robot_id'):
-        """Set state.
+    async def set_state(self, value: Entry, key: str = DEFAULT_KEY):
+        """Set state: the field, the progress and the plan.
 
         Args:
             value (Entry): The state value.
             key (str, optional): The state key. Defaults to 'robot_id'.
         """
-        state = await self.storage.retrieve_state()
-        state[key] = value.model_dump_json()
-        await self.storage.save_state(state)
+        with _timed(metrics.SERIALIZATION_TIME, 'encode_state', 'serialization'):
+            field = codec.encode_field(value)
+            progress = codec.encode_progress(value)
+            plan = codec.encode_plan(value)
+        value.version = await self.storage.save_state(
+            key, {FIELD: field, PROGRESS: progress, PLAN: plan}
+        )
+        value.field_id = codec.field_id(field)
+        value.plan_changed = False
+
+    async def set_progress(self, value: Entry, key: str = DEFAULT_KEY) -> bool:
+        """Set the progress part of the state unless the state has changed since it was read.
+
+        The field is expected to be unchanged. The plan is written only if it has changed, see
+        `Entry.plan_changed`. The check and the write are atomic, so concurrent moves of the same
+        robot can't overwrite each other.
+
+        Args:
+            value (Entry): The state value.
+            key (str, optional): The state key. Defaults to 'robot_id'.
+
+        Returns:
+            bool: True if saved, False if the value is stale and has to be read again.
+        """
+        with _timed(metrics.SERIALIZATION_TIME, 'encode_progress', 'serialization'):
+            progress = codec.encode_progress(value)
+            plan = codec.encode_plan(value) if value.plan_changed else None
+        version = await self.storage.save_progress(key, progress, value.version, plan)
+        if version is None:
+            return False
+        value.version = version
+        value.plan_changed = False
+        return True
+
+    async def set_progresses(self, values: list[tuple[Entry, str]]) -> list[bool]:
+        """Set the progress of many robots, see `set_progress`.
 
-    async def get_state(self, key: str = 'robot_id') -> Entry | None:
+        Args:
+            values (list[tuple[Entry, str]]): The state value and the state key of each robot.
+
+        Returns:
+            list[bool]: For each robot, True if saved, False if the value is stale and has to be read again.
+        """
+        with _timed(metrics.SERIALIZATION_TIME, 'encode_progresses', 'serialization'):
+            progresses = [
+                (
+                    key,
+                    codec.encode_progress(value),
+                    value.version,
+                    codec.encode_plan(value) if value.plan_changed else None,
+                )
+                for value, key in values
+            ]
+        versions = await self.storage.save_progresses(progresses)
+        for (value, _), version in zip(values, versions):
+            if version is not None:
+                value.version = version
+                value.plan_changed = False
+        return [version is not None for version in versions]
+
+    async def get_state(self, key: str = DEFAULT_KEY) -> Entry | None:
         """Get state.
 
+        The state saved by the previous versions is migrated to the current layout.
+
         Args:
             key (str, optional): The state key. Defaults to 'robot_id'.
 
         Returns:
             Entry | None: The retrieved state value, or None if the key does not exist.
         """
-        state = await self.storage.retrieve_state()
-        value = state.get(key)
-        if not value:
+        parts, version = await self.storage.retrieve_state(key)
+        return await self._decode(key, parts, version)
+
+    async def get_states(self, keys: list[str]) -> list[Entry | None]:
+        """Get the states of many robots, reading the storage once.
+
+        Args:
+            keys (list[str]): The state keys.
+
+        Returns:
+            list[Entry | None]: The state of each robot, None for the keys which don't exist.
+        """
+        states = await self.storage.retrieve_states(keys)
+        return [
+            await self._decode(key, parts, version)
+            for key, (parts, version) in zip(keys, states)
+        ]
+
+    async def set_components(
+        self, labels: NDArray, field_id: str, key: str = DEFAULT_KEY
+    ):
+        """Set the labels of the connected components of the field of the robot.
+
+        Args:
+            labels (NDArray): The labels, see `pathfinder.components.label_components`.
+            field_id (str): The id of the field the labels are computed for.
+            key (str, optional): The state key. Defaults to 'robot_id'.
+        """
+        with _timed(metrics.SERIALIZATION_TIME, 'encode_components', 'serialization'):
+            components = codec.encode_components(labels, field_id)
+        await self.storage.save_components(key, components)
+
+    async def get_components(
+        self, field_id: str, key: str = DEFAULT_KEY
+    ) -> NDArray | None:
+        """Get the labels of the connected components of the field of the robot.
+
+        Args:
+            field_id (str): The id of the current field of the robot.
+            key (str, optional): The state key. Defaults to 'robot_id'.
+
+        Returns:
+            NDArray | None: The labels, or None if there are none for the field.
+        """
+        components = await self.storage.retrieve_components(key)
+        if not components:
+            return None
+        with _timed(metrics.SERIALIZATION_TIME, 'decode_components', 'serialization'):
+            return codec.decode_components(components, field_id)
+
+    async def _decode(
+        self, key: str, parts: dict[str, bytes], version: int
+    ) -> Entry | None:
+        if FIELD in parts and PROGRESS in parts:
+            with _timed(metrics.SERIALIZATION_TIME, 'decode_state', 'serialization'):
+                entry = codec.decode_entry(
+                    parts[FIELD], parts[PROGRESS], parts.get(PLAN)
+                )
+            entry.version = version
+            return entry
+
+        legacy = await self.storage.retrieve_legacy_state(key)
+        if not legacy:
             return None
 
-        model_dict = json.loads(value)
-        return Entry(**model_dict)
+        entry = codec.decode_legacy(legacy)
+        await self.set_state(entry, key)
+        return entry
 
 
 def get_state(connection: Redis) -> State:
     """Get a State instance.
 
     This function returns a State instance configured with the appropriate storage backend based on the application settings.
+    Unless `settings.state_cache_size` is 0, the states are cached in process memory by `state.cache.CachedState`.
 
     Args:
         connection (Redis): The Redis connection.
@@ -130,7 +583,13 @@ def get_state(connection: Redis) -> State:
         PathfinderError: If the state storage mode is unknown.
     """
     if settings.state_storage == StateStorage.REDIS:
-        return State(RedisStorage(connection))
+        storage = RedisStorage(connection)
+        if settings.state_cache_size:
+            # imported here: the cache module builds on this one
+            from state.cache import CachedState
+
+            return CachedState(storage, settings.state_cache_size)
+        return State(storage)
     message = f'Unknown state mode: {settings.state_storage}'
     logging.error(f'Unknown state mode: {settings.state_storage}')
     raise PathfinderError(message)
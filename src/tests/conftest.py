@@ -1,9 +1,17 @@
+import importlib.util
 import typing as t
 
+import numpy as np
 import pytest
 from fakeredis.aioredis import FakeRedis
+from numpy.typing import NDArray
 from redis.asyncio import Redis
 
+from benchmarks.generators import pick_points
+
+# the maze, the start and the goals, all on different free cells
+Sample = tuple[NDArray, tuple[int, int], list[tuple[int, int]]]
+
 
 # Mock Redis connection
 @pytest.fixture
@@ -19,3 +27,21 @@ def async_redis_mock(redis_conn):
         return redis_conn
 
     return mock_redis_conn()
+
+
+# fakeredis runs Lua scripts only with lupa installed, see the lua extra of fakeredis
+@pytest.fixture
+def lua():
+    if importlib.util.find_spec('lupa') is None:
+        pytest.fail('lupa is not installed, install requirements/local.txt')
+
+
+# Random maze with the start and the goals for the search tests
+@pytest.fixture
+def random_maze() -> t.Callable[[tuple[int, int], float, int, int], Sample]:
+    def make(shape: tuple[int, int], density: float, goals: int, seed: int) -> Sample:
+        maze = (np.random.default_rng(seed).random(shape) < density).astype(int)
+        start, targets = pick_points(maze, goals, seed)
+        return maze, start, targets
+
+    return make
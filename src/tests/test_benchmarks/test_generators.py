@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from benchmarks.generators import Kind, generate, pick_points
+from pathfinder.bfs import UNREACHABLE, distance_field
+
+
+@pytest.mark.parametrize("kind", list(Kind))
+def test_generate_is_reproducible(kind):
+    maze = generate(kind, 33, 47, seed=1)
+    assert maze.shape == (33, 47) and maze.dtype == np.uint8
+    assert np.array_equal(maze, generate(kind, 33, 47, seed=1))
+
+
+def test_random_density():
+    maze = generate(Kind.RANDOM, 200, 200, seed=2, density=0.3)
+    assert 0.28 < maze.mean() < 0.32
+    assert not np.array_equal(maze, generate(Kind.RANDOM, 200, 200, seed=3))
+
+
+@pytest.mark.parametrize("kind", [Kind.CORRIDORS, Kind.ROOMS])
+def test_free_cells_are_connected(kind):
+    maze = generate(kind, 61, 53, seed=4)
+    free = np.argwhere(maze == 0)
+    field = distance_field(maze, [tuple(free[0])])
+    assert (field[maze == 0] != UNREACHABLE).all()
+
+
+def test_corridors_are_a_tree():
+    # a perfect maze has exactly one path between two cells: the free cells form a tree
+    maze = generate(Kind.CORRIDORS, 41, 41, seed=5)
+    free = maze == 0
+    edges = (free[1:, :] & free[:-1, :]).sum() + (free[:, 1:] & free[:, :-1]).sum()
+    assert edges == free.sum() - 1
+
+
+def test_pick_points():
+    maze = generate(Kind.RANDOM, 20, 20, seed=6)
+    start, targets = pick_points(maze, 10, seed=7)
+    assert len({start, *targets}) == 11
+    assert all(maze[point] == 0 for point in (start, *targets))
+    assert pick_points(maze, 10, seed=7) == (start, targets)
+    with pytest.raises(ValueError):
+        pick_points(np.ones((2, 2), dtype=np.uint8), 1, seed=0)
@@ -0,0 +1,29 @@
+import pytest
+
+from benchmarks.generators import Kind, generate
+from benchmarks.load import local_server, plan_robots, run_load, to_grid
+
+
+def test_plan_robots():
+    mazes = [generate(Kind.ROOMS, 20, 20, seed) for seed in range(2)]
+    fleet = plan_robots(mazes, 3, 4, seed=0)
+    assert [robot.field for robot in fleet] == [0, 1, 0]
+    assert len({robot.robot_id for robot in fleet}) == 3
+    assert all(len(robot.targets) == 4 for robot in fleet)
+    assert plan_robots(mazes, 3, 4, seed=0) == fleet
+
+
+def test_to_grid():
+    maze = generate(Kind.CORRIDORS, 3, 3, 0)
+    assert to_grid(maze) == ''.join(str(cell) for cell in maze.ravel())
+
+
+@pytest.mark.asyncio
+async def test_run_load(lua):
+    async with local_server() as port:
+        report = await run_load('127.0.0.1', port, robots=4, size=20, targets=3)
+
+    assert report.robots == report.finished == 4
+    assert report.failures == report.errors == 0
+    assert report.steps >= 4 * 4
+    assert 0 < report.step_p50 <= report.step_p99 <= report.step_max
@@ -0,0 +1,67 @@
+from benchmarks.__main__ import main
+from benchmarks.suite import Case, compare, default_algos, run_case, run_components
+
+
+def test_default_algos():
+    assert default_algos() == [
+        'astar[manhattan]',
+        'flat_astar[manhattan]',
+        'bfs[multisource]',
+        'jps[manhattan]',
+        'hpa[manhattan]',
+    ]
+
+
+def test_run_case():
+    case = Case(kind='open', size=10, targets=1, algo='astar[manhattan]', seed=0)
+    result = run_case(case, repeat=2)
+    assert result.found and result.expanded > 0
+    assert result.repeat == 2 and result.peak_memory
+    # the caches are dropped between the runs: the same work every time
+    assert run_case(case, repeat=1).expanded == result.expanded
+
+
+def test_run_case_over_budget():
+    case = Case(kind='open', size=10, targets=1, algo='bfs[multisource]', seed=0)
+    result = run_case(case, repeat=3, budget=0)
+    assert result.repeat == 1 and result.peak_memory is None
+
+
+def test_run_components(lua):
+    names = [component.name for component in run_components(10, seed=0, repeat=1)]
+    assert names == [
+        'build_maze',
+        'encode_field',
+        'encode_progress',
+        'decode_entry',
+        'set_state',
+        'get_state',
+        'set_progress',
+    ]
+
+
+def test_compare():
+    item = {
+        'kind': 'open',
+        'size': 10,
+        'targets': 1,
+        'algo': 'astar[manhattan]',
+        'seed': 0,
+        'expanded': 10,
+        'time_min': 0.01,
+    }
+    baseline = {'results': [item], 'components': []}
+    assert compare(baseline, baseline) == []
+    slower = {'results': [{**item, 'time_min': 0.02, 'expanded': 11}]}
+    assert len(compare(baseline, slower)) == 2
+    assert compare(baseline, {'results': [{**item, 'time_min': 0.01005}]}) == []
+    # within the noise
+    fast = {'results': [{**item, 'time_min': 1e-4}]}
+    assert compare(fast, {'results': [{**item, 'time_min': 3e-4}]}) == []
+
+
+def test_main(tmp_path, lua):
+    output = tmp_path / 'results.json'
+    argv = ['--sizes', '10', '--targets', '1', '--algos', 'jps[manhattan]']
+    assert main([*argv, '--repeat', '3', '--output', str(output)]) == 0
+    assert main([*argv, '--repeat', '3', '--compare', str(output)]) == 0
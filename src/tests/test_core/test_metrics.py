@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from core import metrics
+
+
+@pytest.fixture
+def histogram():
+    histogram = metrics.Histogram(
+        'test_seconds', 'Test histogram.', ('operation',), buckets=(0.1, 1.0)
+    )
+    yield histogram
+    del metrics.REGISTRY[histogram.name]
+
+
+def test_histogram_renders_cumulative_buckets(histogram):
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value, operation='get')
+    histogram.observe(0.2, operation='set')
+
+    assert histogram.render() == [
+        '# HELP test_seconds Test histogram.',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{operation="get",le="0.1"} 2',
+        'test_seconds_bucket{operation="get",le="1.0"} 3',
+        'test_seconds_bucket{operation="get",le="+Inf"} 4',
+        'test_seconds_sum{operation="get"} 3.65',
+        'test_seconds_count{operation="get"} 4',
+        'test_seconds_bucket{operation="set",le="0.1"} 0',
+        'test_seconds_bucket{operation="set",le="1.0"} 1',
+        'test_seconds_bucket{operation="set",le="+Inf"} 1',
+        'test_seconds_sum{operation="set"} 0.2',
+        'test_seconds_count{operation="set"} 1',
+    ]
+
+
+def test_histogram_times_the_block(histogram):
+    with pytest.raises(ValueError):
+        with histogram.time(operation='get'):
+            raise ValueError()
+
+    assert 'test_seconds_count{operation="get"} 1' in histogram.render()
+
+
+def test_histogram_requires_its_labels(histogram):
+    with pytest.raises(KeyError):
+        histogram.observe(1)
+
+
+def test_cache_gauge_reads_the_statistics():
+    info = {'pid': 1, 'hits': 2, 'hit_rate': 0.5}
+    gauge = metrics.CacheGauge('test_cache', 'Test cache.', lambda: info)
+    try:
+        info['hits'] = 3
+        assert gauge.render() == [
+            '# HELP test_cache Test cache.',
+            '# TYPE test_cache gauge',
+            'test_cache{stat="hits"} 3',
+            'test_cache{stat="hit_rate"} 0.5',
+        ]
+        assert 'test_cache{stat="hits"} 3\n' in metrics.render()
+    finally:
+        del metrics.REGISTRY[gauge.name]
+
+
+@pytest.mark.asyncio
+async def test_metrics_page_is_served(histogram):
+    histogram.observe(0.5, operation='get')
+    server = await metrics.start_server(0, '127.0.0.1')
+    assert server is not None
+    port = server.sockets[0].getsockname()[1]
+
+    async def get(path: str) -> bytes:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+        response = await reader.read()
+        writer.close()
+        return response
+
+    try:
+        page = await get('/metrics')
+        missing = await get('/')
+    finally:
+        server.close()
+        await server.wait_closed()
+
+    head, body = page.split(b'\r\n\r\n', 1)
+    assert head.startswith(b'HTTP/1.1 200 OK')
+    assert body.decode() == metrics.render()
+    assert b'test_seconds_count{operation="get"} 1' in body
+    assert missing.startswith(b'HTTP/1.1 404')
+
+
+@pytest.mark.asyncio
+async def test_metrics_server_failure_is_not_fatal():
+    server = await metrics.start_server(0, '127.0.0.1')
+    assert server is not None
+    port = server.sockets[0].getsockname()[1]
+    try:
+        assert await metrics.start_server(port, '127.0.0.1') is None
+    finally:
+        server.close()
+        await server.wait_closed()
@@ -0,0 +1,122 @@
+import asyncio
+
+import orjson as json
+import pytest
+
+from core import metrics, tracing
+from core.config import settings
+from pathfinder import stats
+
+
+@pytest.fixture(autouse=True)
+def traces():
+    tracing.traces.clear()
+    yield tracing.traces
+    tracing.traces.clear()
+
+
+def measurement(seconds: float, **counters) -> stats.Measurement:
+    return stats.Measurement(None, 0.0, seconds, stats.SearchStats(**counters))
+
+
+def test_requests_are_not_traced_by_default(traces):
+    with tracing.trace('Moving', 'robot') as record:
+        assert record is None
+        with tracing.span('redis'):
+            pass
+        tracing.record_task('plan_route', measurement(0.1, expanded=5))
+
+    assert not traces
+
+
+def test_sampled_requests_are_traced(mocker, traces):
+    mocker.patch.object(settings, 'trace_sample_rate', 1.0)
+
+    with tracing.trace('Moving', 'robot') as record:
+        assert record is not None
+
+    assert list(traces) == [record]
+    assert record.rpc == 'Moving' and record.robot_id == 'robot'
+
+
+@pytest.mark.parametrize(
+    "metadata, expected",
+    [
+        (None, False),
+        ({}, False),
+        ({'x-pathfinder-trace': '1'}, True),
+        ({'x-pathfinder-trace': 'true'}, True),
+        ({'x-pathfinder-trace': '0'}, False),
+        ({'x-pathfinder-trace': 'no'}, False),
+        ({'x-pathfinder-trace': b'1'}, True),
+    ],
+)
+def test_requested(metadata, expected):
+    assert tracing.requested(metadata) is expected
+
+
+def test_trace_splits_the_time(traces):
+    with tracing.trace('Moving', forced=True) as record:
+        with tracing.span('redis'):
+            pass
+        tracing.record_task(
+            'plan_route', measurement(0.25, expanded=5, open_peak=3), wait=0.5
+        )
+        tracing.record_task(
+            'plan_route', measurement(0.25, expanded=2, open_peak=7, cache_hits=1)
+        )
+        tracing.count_state_cache_hits()
+
+    assert record.timings['executor_wait'] == 0.5
+    assert record.timings['search'] == 0.5
+    assert record.timings['redis'] > 0
+    assert record.timings['handler'] == 0
+    assert record.tasks == {'plan_route': 2}
+    assert record.search == stats.SearchStats(expanded=7, open_peak=7, cache_hits=1)
+    assert record.state_cache_hits == 1
+
+
+@pytest.mark.asyncio
+async def test_tasks_started_by_the_request_share_its_trace():
+    async def move():
+        with tracing.span('redis'):
+            await asyncio.sleep(0)
+        tracing.record_task('plan_route', measurement(0.1, expanded=1))
+
+    with tracing.trace('MoveBatch', forced=True) as record:
+        await asyncio.gather(move(), move())
+
+    assert record.tasks == {'plan_route': 2}
+    assert record.search.expanded == 2
+
+
+def test_profiled_task_outside_of_a_trace_is_kept(traces):
+    profiled = measurement(0.1, expanded=1)._replace(profile='report')
+
+    tracing.record_task('plan_route', profiled)
+    tracing.record_task('plan_route', measurement(0.1))
+
+    [record] = traces
+    assert record.rpc == '' and record.profiles == ['report']
+
+
+def test_traces_are_appended_to_the_file(mocker, tmp_path):
+    path = tmp_path / 'traces.jsonl'
+    mocker.patch.object(settings, 'trace_file', str(path))
+
+    for robot_id in ('first', 'second'):
+        with tracing.trace('Moving', robot_id, forced=True):
+            pass
+
+    tracing.flush()
+    lines = path.read_bytes().splitlines()
+    assert [json.loads(line)['robot_id'] for line in lines] == ['first', 'second']
+
+
+def test_traces_page():
+    with tracing.trace('SetField', 'robot', forced=True):
+        pass
+
+    content_type, render = metrics.PAGES['/traces']
+    assert content_type == 'application/json'
+    assert [record['rpc'] for record in json.loads(render())] == ['SetField']
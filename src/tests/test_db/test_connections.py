@@ -1,28 +1,30 @@
 import typing as t
+from unittest.mock import AsyncMock
 
 import pytest
 from fakeredis.aioredis import FakeRedis
 from redis.asyncio import Redis
 from redis.exceptions import ConnectionError
 
+from core.exceptions import PathfinderError
 from db.connections import RedisConnector
 
 
 def test_redis_connector_init(mocker, redis_conn):
-    mocker.patch('redis.asyncio.Redis.from_url', return_value=redis_conn)
+    mocker.patch('redis.asyncio.Redis.from_pool', return_value=redis_conn)
     connector = RedisConnector()
     assert connector._connection_to_await is not None and connector._connection is None
 
 
 def test_redis_connector_init_fail(mocker):
-    mocker.patch('redis.asyncio.Redis.from_url', side_effect=ConnectionError)
+    mocker.patch('redis.asyncio.Redis.from_pool', side_effect=ConnectionError)
     with pytest.raises(ConnectionError):
         RedisConnector()
 
 
 @pytest.mark.asyncio
 async def test_redis_connector_context_manager(mocker, redis_conn, async_redis_mock):
-    mocker.patch('redis.asyncio.Redis.from_url', return_value=async_redis_mock)
+    mocker.patch('redis.asyncio.Redis.from_pool', return_value=async_redis_mock)
     async with RedisConnector() as conn:
         assert conn == redis_conn
 
@@ -31,8 +33,34 @@ async def test_redis_connector_context_manager(mocker, redis_conn, async_redis_m
 async def test_redis_connector_context_manager_close(
     mocker, redis_conn, async_redis_mock
 ):
-    mocker.patch('redis.asyncio.Redis.from_url', return_value=async_redis_mock)
+    mocker.patch('redis.asyncio.Redis.from_pool', return_value=async_redis_mock)
     mocker.spy(redis_conn, 'aclose')
     async with RedisConnector() as _:
         ...
     redis_conn.aclose.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_redis_connector_pings(mocker, redis_conn, async_redis_mock):
+    mocker.patch('redis.asyncio.Redis.from_pool', return_value=async_redis_mock)
+    mocker.patch.object(redis_conn, 'ping', AsyncMock(return_value=False))
+    with pytest.raises(PathfinderError):
+        async with RedisConnector():
+            ...
+
+
+def test_redis_connector_pool(mocker):
+    from_pool = mocker.patch('redis.asyncio.Redis.from_pool')
+    mocker.patch('db.connections.settings.redis_max_connections', 7)
+    RedisConnector()
+    pool = from_pool.call_args.args[0]
+    assert pool.max_connections == 7
+    assert pool.connection_kwargs['socket_keepalive']
+
+
+def test_redis_connector_unix_socket(mocker):
+    from_pool = mocker.patch('redis.asyncio.Redis.from_pool')
+    mocker.patch('db.connections.settings.redis_unix_socket', '/tmp/redis.sock')
+    RedisConnector()
+    pool = from_pool.call_args.args[0]
+    assert pool.connection_kwargs['path'] == '/tmp/redis.sock'
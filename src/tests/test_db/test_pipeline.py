@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+from redis.exceptions import ResponseError
+
+from db.pipeline import CommandBatcher, execute
+
+
+@pytest.mark.asyncio
+async def test_concurrent_commands_share_a_pipeline(redis_conn, mocker):
+    await redis_conn.mset({'a': 1, 'b': 2})
+    batcher = CommandBatcher(redis_conn)
+    mocker.spy(redis_conn, 'pipeline')
+
+    results = await asyncio.gather(
+        batcher.execute(lambda client: client.get('a')),
+        batcher.execute(lambda client: client.mget(['a', 'b', 'c'])),
+        batcher.execute(lambda client: client.incr('counter')),
+    )
+
+    assert results == [b'1', [b'1', b'2', None], 1]
+    assert redis_conn.pipeline.call_count == 1
+    assert await batcher.execute(lambda client: client.get('counter')) == b'1'
+    assert redis_conn.pipeline.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_command_fails_only_its_caller(redis_conn):
+    await redis_conn.set('text', 'not a number')
+    batcher = CommandBatcher(redis_conn)
+
+    failed, ok = await asyncio.gather(
+        batcher.execute(lambda client: client.incr('text')),
+        batcher.execute(lambda client: client.incr('number')),
+        return_exceptions=True,
+    )
+
+    assert isinstance(failed, ResponseError)
+    assert ok == 1
+
+
+@pytest.mark.asyncio
+async def test_execute_without_batcher(redis_conn):
+    await redis_conn.set('a', 1)
+    assert await execute(redis_conn, None, lambda client: client.get('a')) == b'1'
@@ -0,0 +1,81 @@
+import math
+
+import pytest
+
+from core import metrics
+from monitoring.prometheus import Histogram, parse
+
+
+@pytest.fixture
+def histogram():
+    histogram = metrics.Histogram(
+        'test_seconds', 'Test histogram.', ('operation',), buckets=(0.1, 1.0)
+    )
+    yield histogram
+    del metrics.REGISTRY[histogram.name]
+
+
+def test_parse_reads_the_rendered_metrics(histogram):
+    for value in (0.05, 0.5, 0.5, 3):
+        histogram.observe(value, operation='get')
+
+    parsed = [item for item in parse(metrics.render()) if item.name == 'test_seconds']
+
+    assert parsed == [
+        Histogram(
+            name='test_seconds',
+            labels={'operation': 'get'},
+            buckets=[(0.1, 1), (1.0, 3), (math.inf, 4)],
+            sum=4.05,
+            count=4,
+        )
+    ]
+
+
+def test_parse_skips_other_metrics():
+    text = '\n'.join(
+        [
+            '# TYPE requests_total counter',
+            'requests_total{code="200"} 10',
+            '# TYPE latency histogram',
+            'latency_bucket{le="+Inf"} 2',
+            'latency_sum 0.5',
+            'latency_count 2',
+        ]
+    )
+
+    assert parse(text) == [
+        Histogram(name='latency', labels={}, buckets=[(math.inf, 2)], sum=0.5, count=2)
+    ]
+
+
+def test_quantile_interpolates_within_the_bucket():
+    histogram = Histogram(
+        name='latency',
+        labels={},
+        buckets=[(1.0, 10), (2.0, 30), (math.inf, 40)],
+        sum=50,
+        count=40,
+    )
+
+    assert histogram.quantile(0.125) == pytest.approx(0.5)
+    assert histogram.quantile(0.5) == pytest.approx(1.5)
+    # the largest finite bound for the +Inf bucket
+    assert histogram.quantile(0.99) == 2.0
+    assert math.isnan(Histogram(name='latency', labels={}).quantile(0.5))
+
+
+def test_since_subtracts_the_previous_scrape():
+    before = Histogram(
+        name='latency', labels={}, buckets=[(1.0, 1), (math.inf, 2)], sum=3, count=2
+    )
+    after = Histogram(
+        name='latency', labels={}, buckets=[(1.0, 4), (math.inf, 6)], sum=7, count=6
+    )
+
+    assert after.since(before) == Histogram(
+        name='latency', labels={}, buckets=[(1.0, 3), (math.inf, 4)], sum=4, count=4
+    )
+    assert after.since(None) == after
+    # the server has been restarted
+    assert before.since(after) == before
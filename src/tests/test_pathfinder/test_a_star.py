@@ -4,7 +4,17 @@ import numpy as np
 import pytest
 from numpy.typing import NDArray
 
-from pathfinder.a_star import Mode, distance, heuristic, search
+from core.config import settings
+from pathfinder.a_star import (
+    GoalHeuristic,
+    Mode,
+    distance,
+    distance_cache_clear,
+    distance_cache_info,
+    heuristic,
+    nearest_goal_distance,
+    search,
+)
 
 TEST_CASES = [
     {
@@ -118,9 +128,9 @@ TEST_CASES = [
             (3, 1),
             (3, 2),
             (3, 3),
-            (2, 3),
-            (1, 3),
-            (0, 3),
+            (3, 4),
+            (2, 4),
+            (1, 4),
             (0, 4),
         ],
     },
@@ -220,3 +230,68 @@ def test_heuristic():
 
     with pytest.raises(ValueError):
         heuristic((0, 0), [(1, 1), (2, 2)], t.cast(Mode, 'INVALID'))
+
+
+def test_a_star_large_grid():
+    maze = np.zeros((100, 100), dtype=int)
+    maze[1:, 50] = 1
+
+    result = search(maze, (99, 0), [(99, 99)], Mode.MANHATTAN)
+    assert result is not None
+    assert len(result) == 99 + 99 + 99
+    assert result[-1] == (99, 99)
+
+
+@pytest.mark.parametrize("mode", [Mode.MANHATTAN, Mode.EUCLIDEAN, Mode.DIAGONAL])
+@pytest.mark.parametrize("goals_count", [1, 40])
+def test_goal_heuristic(goals_count: int, mode: Mode):
+    rng = np.random.default_rng(goals_count)
+    goals = [(int(i), int(j)) for i, j in rng.integers(0, 30, (goals_count, 2))]
+    points = [(int(i), int(j)) for i, j in rng.integers(0, 30, (10, 2))]
+    expected = [heuristic(point, goals, mode) for point in points]
+
+    assert GoalHeuristic(goals, mode, (30, 30)).batch(points) == pytest.approx(expected)
+    assert GoalHeuristic(goals, mode).batch(points) == pytest.approx(expected)
+    assert GoalHeuristic(goals, mode)(points[0]) == pytest.approx(expected[0])
+
+
+def test_nearest_goal_distance():
+    points = np.array([[0, 0], [3, 3]])
+    goals = np.array([[1, 1], [2, 2]])
+
+    assert nearest_goal_distance(points, goals).tolist() == [2, 2]
+    assert nearest_goal_distance(points, goals, Mode.DIAGONAL).tolist() == [1, 1]
+    with pytest.raises(ValueError):
+        nearest_goal_distance(points, goals, t.cast(Mode, 'INVALID'))
+
+
+def test_a_star_many_goals():
+    maze = np.zeros((40, 40), dtype=int)
+    goals = [(39, j) for j in range(40)] + [(i, 39) for i in range(39)]
+
+    result = search(maze, (5, 30), goals, Mode.MANHATTAN)
+    assert result is not None and len(result) == 9
+
+
+def test_distance_cache():
+    distance_cache_clear()
+
+    distance((0, 0), (3, 4), Mode.EUCLIDEAN)
+    distance((0, 0), (3, 4), Mode.EUCLIDEAN)
+    # not cached
+    distance((0, 0), (3, 4), Mode.MANHATTAN)
+
+    info = distance_cache_info()
+    assert info['hits'] == 1 and info['misses'] == 1 and info['size'] == 1
+    assert info['hit_rate'] == 0.5
+    assert info['maxsize'] == settings.distance_cache_size
+
+
+def test_a_star_prefers_first_move_on_ties():
+    maze = np.zeros((5, 5), dtype=int)
+
+    # equally near goals: the one reached by moving down first
+    assert search(maze, (2, 2), [(0, 2), (2, 0), (4, 2)]) == [(3, 2), (4, 2)]
+    # equally short paths to one goal: down before right, up before left
+    assert search(maze, (2, 2), [(4, 4)])[0] == (3, 2)
+    assert search(maze, (2, 2), [(0, 0)])[0] == (1, 2)
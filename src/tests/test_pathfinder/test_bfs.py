@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from pathfinder import a_star, bfs
+from pathfinder.bfs import (
+    UNREACHABLE,
+    MultiSourceBFS,
+    cached_distance_field,
+    descend,
+    distance_field,
+)
+
+
+def test_distance_field():
+    maze = np.array([[0, 0, 1], [0, 1, 0], [0, 0, 0]])
+
+    field = distance_field(maze, [(0, 0), (2, 2)])
+    assert field.tolist() == [[0, 1, -1], [1, -1, 1], [2, 1, 0]]
+
+
+def test_distance_field_skips_obstacle_goals():
+    maze = np.array([[0, 1], [1, 1]])
+    assert distance_field(maze, [(1, 1)]).tolist() == [[UNREACHABLE] * 2] * 2
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_same_length_as_a_star(random_maze, seed: int):
+    maze, start, goals = random_maze((25, 20), 0.3, 5, seed)
+
+    result = bfs.search(maze, start, goals)
+    expected = a_star.search(maze, start, goals)
+    if expected is None:
+        assert result is None
+        return
+
+    assert result is not None and len(result) == len(expected)
+    assert result[-1] in goals
+    for a, b in zip([start, *result], result):
+        assert abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1 and maze[b] == 0
+
+
+def test_descend():
+    field = np.array([[2, 1], [1, 0]])
+
+    assert descend(field, (0, 0)) == [(1, 0), (1, 1)]
+    assert descend(field, (1, 1)) == []
+    assert descend(np.array([[UNREACHABLE]]), (0, 0)) is None
+
+
+def test_cached_distance_field():
+    maze = np.zeros((4, 4), dtype=int)
+
+    field = cached_distance_field(maze, [(0, 0), (3, 3)])
+    assert cached_distance_field(maze.copy(), [(3, 3), (0, 0)]) is field
+    assert cached_distance_field(maze, [(0, 0)]) is not field
+
+
+def test_cached_distance_field_by_field_id(mocker):
+    maze = np.zeros((4, 4), dtype=int)
+    fingerprint = mocker.spy(bfs, '_fingerprint')
+
+    field = cached_distance_field(maze, [(0, 0)], 'field')
+    assert cached_distance_field(maze, [(0, 0)], 'field') is field
+    assert cached_distance_field(maze, [(0, 0)], 'other') is not field
+    fingerprint.assert_not_called()
+
+
+def test_mode():
+    assert MultiSourceBFS('multisource').mode == 'multisource'
+    with pytest.raises(ValueError):
+        MultiSourceBFS('manhattan')
+
+
+def test_same_first_move_as_a_star():
+    maze = np.zeros((10, 10), dtype=int)
+    goals = [(0, 9), (9, 0)]
+
+    assert bfs.search(maze, (5, 5), goals)[0] == a_star.search(maze, (5, 5), goals)[0]
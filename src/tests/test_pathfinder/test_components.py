@@ -0,0 +1,103 @@
+from collections import deque
+
+import numpy as np
+import pytest
+
+from benchmarks.generators import Kind, generate
+from pathfinder.components import OBSTACLE, label_components, reachable
+from services.components import ComponentRegistry
+
+
+def flood_fill(maze: np.ndarray) -> np.ndarray:
+    n, m = maze.shape
+    labels = np.zeros((n, m), dtype=int)
+    count = 0
+    for cell in zip(*np.nonzero(maze != 1)):
+        if labels[cell]:
+            continue
+        count += 1
+        labels[cell] = count
+        queue = deque([cell])
+        while queue:
+            i, j = queue.popleft()
+            for neighbor in ((i, j + 1), (i, j - 1), (i + 1, j), (i - 1, j)):
+                if (
+                    0 <= neighbor[0] < n
+                    and 0 <= neighbor[1] < m
+                    and maze[neighbor] != 1
+                    and not labels[neighbor]
+                ):
+                    labels[neighbor] = count
+                    queue.append(neighbor)
+    return labels
+
+
+def assert_same_partition(labels: np.ndarray, expected: np.ndarray):
+    assert ((labels == OBSTACLE) == (expected == 0)).all()
+    pairs = set(zip(labels.ravel().tolist(), expected.ravel().tolist()))
+    # one label for one component, numbered from 1
+    assert len(pairs) == len(np.unique(labels)) == len(np.unique(expected))
+    assert labels.max() == expected.max()
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_label_components_random(seed):
+    rng = np.random.default_rng(seed)
+    n, m = rng.integers(1, 16, 2)
+    maze = (rng.random((n, m)) < rng.random()).astype(np.uint8)
+
+    assert_same_partition(label_components(maze), flood_fill(maze))
+
+
+@pytest.mark.parametrize("kind", list(Kind))
+def test_label_components_generated(kind):
+    maze = generate(kind, 48, 64, 0)
+
+    assert_same_partition(label_components(maze), flood_fill(maze))
+
+
+def test_label_components_corner_cases():
+    assert label_components(np.ones((2, 3), dtype=np.uint8)).tolist() == [[0] * 3] * 2
+    assert label_components(np.zeros((0, 0), dtype=np.uint8)).shape == (0, 0)
+    # a spiral merges through many rounds
+    maze = np.array(
+        [
+            [0, 0, 0, 0, 0],
+            [1, 1, 1, 1, 0],
+            [0, 0, 0, 1, 0],
+            [0, 1, 0, 0, 0],
+            [0, 1, 1, 1, 1],
+        ],
+        dtype=np.uint8,
+    )
+    assert_same_partition(label_components(maze), flood_fill(maze))
+    assert label_components(maze).max() == 1
+
+
+def test_label_components_smallest_type():
+    # isolated cells in a checkerboard
+    maze = (np.indices((40, 40)).sum(axis=0) % 2).astype(np.uint8)
+    labels = label_components(maze)
+
+    assert labels.dtype == np.uint16
+    assert labels.max() == 800
+
+
+def test_reachable():
+    maze = np.array([[0, 1, 0], [0, 1, 0], [0, 1, 0]], dtype=np.uint8)
+    labels = label_components(maze)
+
+    assert reachable(labels, (0, 0), [(0, 2), (2, 0), (0, 1)]) == [(2, 0)]
+    # the searches step out of an obstacle into the free neighbors
+    assert reachable(labels, (1, 1), [(0, 2), (2, 0)]) == [(0, 2), (2, 0)]
+
+
+def test_component_registry_drops_least_recently_used():
+    registry = ComponentRegistry(2)
+    for field_id in ('a', 'b'):
+        registry.put(field_id, np.zeros((1, 1), dtype=np.uint8))
+    registry.get('a')
+    registry.put('c', np.zeros((1, 1), dtype=np.uint8))
+
+    assert registry.get('b') is None
+    assert registry.get('a') is not None and registry.get('c') is not None
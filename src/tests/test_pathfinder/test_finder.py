@@ -2,7 +2,7 @@ from numpy import zeros
 
 from core.enums import AlgoValues, Direction
 from pathfinder.a_star import AStar
-from pathfinder.finder import determine_direction
+from pathfinder.finder import determine_direction, next_step_from_plan
 
 
 def test_determine_direction_no_goals():
@@ -34,3 +34,30 @@ def test_determine_direction_valid_path(mocker):
     mocker.patch.object(AStar, 'search', return_value=[(3, 2)])
     result = determine_direction(maze, current, goals, algo)  # type: ignore
     assert result == Direction.DOWN
+
+
+def test_next_step_from_plan():
+    plan = [(0, 0), (1, 0), (2, 0)]
+    targets = [(2, 0), (0, 2)]
+
+    assert next_step_from_plan(plan, targets, (0, 0), targets) == (1, 0)
+    # targets only shrank
+    assert next_step_from_plan(plan, targets, (0, 0), [(2, 0)]) == (1, 0)
+    # planned target is gone
+    assert next_step_from_plan(plan, targets, (0, 0), [(0, 2)]) is None
+    # new target appeared
+    assert next_step_from_plan(plan, targets, (0, 0), [*targets, (1, 1)]) is None
+    # robot is not on the plan
+    assert next_step_from_plan(plan, targets, (1, 1), targets) is None
+    # plan is exhausted
+    assert next_step_from_plan([(2, 0)], targets, (2, 0), targets) is None
+
+
+def test_next_step_from_partial_plan():
+    plan = [(0, 0), (1, 0), (2, 0)]
+    targets = [(5, 0)]
+
+    assert next_step_from_plan(plan, targets, (0, 0), targets) == (1, 0)
+    # the goals changed: the partial plan may lead elsewhere
+    assert next_step_from_plan(plan, targets, (0, 0), [(5, 0), (0, 5)]) is None
+    assert next_step_from_plan(plan, [*targets, (0, 5)], (0, 0), targets) is None
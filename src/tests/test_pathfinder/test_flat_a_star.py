@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from pathfinder import a_star, flat_a_star
+from pathfinder.a_star import Mode
+
+
+@pytest.mark.parametrize("mode", [Mode.MANHATTAN, Mode.EUCLIDEAN, Mode.DIAGONAL])
+@pytest.mark.parametrize("seed", range(10))
+def test_same_path_as_a_star(random_maze, seed: int, mode: Mode):
+    maze, start, goals = random_maze((20, 30), 0.3, 3, seed)
+
+    result = flat_a_star.search(maze, start, goals, mode)
+    assert result == a_star.search(maze, start, goals, mode)
+
+
+def test_start_is_goal():
+    maze = np.zeros((3, 3), dtype=int)
+    assert flat_a_star.search(maze, (1, 1), [(1, 1)]) == []
+
+
+def test_unreachable():
+    maze = np.array([[0, 1, 0], [0, 1, 0], [0, 1, 0]])
+    assert flat_a_star.search(maze, (0, 0), [(2, 2)]) is None
+
+
+def test_does_not_wrap_rows():
+    maze = np.array([[0, 0, 1], [1, 1, 1], [0, 0, 0]])
+    assert flat_a_star.search(maze, (0, 1), [(2, 0)]) is None
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from pathfinder import bfs, hpa
+from pathfinder.hpa import Abstraction, build_abstraction
+
+
+def walk(maze, start, goals, abstraction):
+    # follow the partial paths the way the service does, one refinement per segment
+    current, steps = start, 0
+    while current not in goals:
+        path = hpa.search(maze, current, goals, abstraction=abstraction)
+        assert path
+        for a, b in zip([current, *path], path):
+            assert abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1 and maze[b] == 0
+        current = path[-1]
+        steps += len(path)
+    return steps
+
+
+# the longest detour over the shortest path, in cells, measured on 400 seeds of the mazes below
+DETOUR = {2: 4, 3: 6, 5: 6, 8: 6}
+
+
+@pytest.mark.parametrize("cluster_size", [2, 3, 5, 8])
+@pytest.mark.parametrize("seed", range(15))
+def test_reaches_nearest_goal(random_maze, seed: int, cluster_size: int):
+    maze, start, goals = random_maze((17, 23), [0.0, 0.15, 0.3][seed % 3], 2, seed)
+    abstraction = build_abstraction(maze, cluster_size)
+
+    expected = bfs.search(maze, start, goals)
+    if expected is None:
+        assert hpa.search(maze, start, goals, abstraction=abstraction) is None
+        return
+
+    # near-optimal: the detours are bounded by the entrance placement
+    detour = walk(maze, start, goals, abstraction) - len(expected)
+    assert 0 <= detour <= DETOUR[cluster_size]
+
+
+def test_open_grid_is_optimal():
+    maze = np.zeros((64, 64), dtype=int)
+    abstraction = build_abstraction(maze, 16)
+    assert walk(maze, (0, 0), [(63, 63)], abstraction) == 126
+
+
+def test_goal_in_start_cluster():
+    maze = np.array([[0, 1, 0], [0, 1, 0], [0, 0, 0]])
+    assert hpa.search(
+        maze, (0, 0), [(0, 2)], abstraction=build_abstraction(maze, 8)
+    ) == [(1, 0), (2, 0), (2, 1), (2, 2), (1, 2), (0, 2)]
+
+
+def test_partial_path_ends_at_cluster_entrance():
+    maze = np.zeros((8, 8), dtype=int)
+    path = hpa.search(maze, (0, 0), [(7, 7)], abstraction=build_abstraction(maze, 4))
+    assert path and path[-1] not in [(7, 7)]
+    assert all(i < 4 and j < 4 for i, j in path[:-1])
+
+
+def test_unreachable():
+    maze = np.array([[0, 0, 1, 0], [0, 0, 1, 0], [0, 0, 1, 0], [0, 0, 1, 0]])
+    abstraction = build_abstraction(maze, 2)
+    assert hpa.search(maze, (0, 0), [(3, 3)], abstraction=abstraction) is None
+    assert hpa.search(maze, (0, 0), [(0, 0)], abstraction=abstraction) == []
+
+
+def test_abstraction_round_trip():
+    maze = (np.random.default_rng(0).random((20, 20)) < 0.2).astype(int)
+    abstraction = build_abstraction(maze, 4)
+
+    restored = Abstraction.model_validate_json(abstraction.model_dump_json())
+    assert np.array_equal(restored.edge_costs, abstraction.edge_costs)
+    assert np.array_equal(restored.nodes, abstraction.nodes)
+    assert restored.cluster_size == 4
+
+
+def test_single_cluster():
+    maze = np.zeros((3, 3), dtype=int)
+    abstraction = build_abstraction(maze, 32)
+    assert abstraction.nodes.shape == (0, 2)
+    assert hpa.search(maze, (0, 0), [(2, 2)], abstraction=abstraction) == [
+        (1, 0),
+        (2, 0),
+        (2, 1),
+        (2, 2),
+    ]
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from pathfinder import a_star, jps
+from pathfinder.a_star import Mode
+
+
+@pytest.mark.parametrize("mode", [Mode.MANHATTAN, Mode.EUCLIDEAN, Mode.DIAGONAL])
+@pytest.mark.parametrize("seed", range(20))
+def test_same_first_move_as_a_star(random_maze, seed: int, mode: Mode):
+    maze, start, goals = random_maze((15, 20), [0.0, 0.15, 0.35][seed % 3], 3, seed)
+
+    result = jps.search(maze, start, goals, mode)
+    expected = a_star.search(maze, start, goals, mode)
+    if not expected:
+        assert result == expected
+        return
+
+    assert result is not None
+    assert len(result) == len(expected) and result[0] == expected[0]
+    assert result[-1] in goals
+    for a, b in zip([start, *result], result):
+        assert abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1 and maze[b] == 0
+
+
+def test_open_grid():
+    maze = np.zeros((50, 60), dtype=int)
+
+    result = jps.search(maze, (0, 0), [(49, 59)])
+    assert result is not None and len(result) == 49 + 59
+    assert result[0] == (1, 0)
+
+
+def test_corridor():
+    maze = np.array([[0, 1, 0, 0, 0], [0, 1, 0, 1, 0], [0, 0, 0, 1, 0]])
+    assert jps.search(maze, (0, 0), [(2, 4)]) == [
+        (1, 0),
+        (2, 0),
+        (2, 1),
+        (2, 2),
+        (1, 2),
+        (0, 2),
+        (0, 3),
+        (0, 4),
+        (1, 4),
+        (2, 4),
+    ]
+
+
+def test_start_is_goal():
+    maze = np.zeros((3, 3), dtype=int)
+    assert jps.search(maze, (1, 1), [(1, 1)]) == []
+    assert jps.search(maze, (1, 1), [(1, 2)]) == [(1, 2)]
+
+
+def test_unreachable():
+    maze = np.array([[0, 1, 0], [0, 1, 0], [0, 1, 0]])
+    assert jps.search(maze, (0, 0), [(2, 2)]) is None
+
+
+def test_unreachable_searches_once(mocker):
+    # the start has four free neighbors, the goal is walled off
+    maze = np.zeros((20, 20), dtype=int)
+    maze[:, 15] = 1
+    spy = mocker.spy(jps, '_search')
+
+    assert jps.search(maze, (10, 5), [(10, 18)]) is None
+    assert spy.call_count == 1
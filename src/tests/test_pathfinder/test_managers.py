@@ -1,6 +1,10 @@
 import pytest
 
 from pathfinder.a_star import AStar
+from pathfinder.bfs import MultiSourceBFS
+from pathfinder.flat_a_star import FlatAStar
+from pathfinder.hpa import HPAStar
+from pathfinder.jps import JumpPointSearch
 from pathfinder.managers import Algorithm, get_algo
 
 
@@ -16,3 +20,22 @@ def test_get_algo_with_valid_input():
 def test_get_algo_with_invalid_input():
     with pytest.raises(ValueError):
         get_algo('unknown[mode]')
+
+
+def test_get_algo_flat_a_star():
+    algo = get_algo('flat_astar[euclidean]')
+    assert isinstance(algo, FlatAStar) and algo.mode == 'euclidean'
+
+
+def test_get_algo_bfs():
+    assert isinstance(get_algo('bfs[multisource]'), MultiSourceBFS)
+
+
+def test_get_algo_jps():
+    assert isinstance(get_algo('jps[manhattan]'), JumpPointSearch)
+
+
+def test_get_algo_hpa():
+    algo = get_algo('hpa[manhattan]')
+    assert isinstance(algo, HPAStar) and algo.preprocessing
+    assert not get_algo('astar[manhattan]').preprocessing
@@ -0,0 +1,163 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from pathfinder import a_star, stats
+from pathfinder.bfs import cached_distance_field, distance_field_cache_clear
+from pathfinder.finder import plan_route, prepare_field
+
+
+@pytest.mark.parametrize(
+    "algo",
+    [
+        'astar[manhattan]',
+        'flat_astar[manhattan]',
+        'bfs[multisource]',
+        'jps[manhattan]',
+        'hpa[manhattan]',
+    ],
+)
+def test_searches_count_expanded_nodes(algo):
+    maze = np.zeros((8, 8), dtype=np.uint8)
+    maze[:, 4] = 1
+    distance_field_cache_clear()
+    prepared = prepare_field(maze, algo)
+    stats.take()
+
+    assert plan_route(maze, (0, 0), [(0, 3)], algo, prepared)
+    taken = stats.take()
+    assert taken.expanded > 0
+    assert taken.open_peak > 0
+    # the goal is walled off
+    assert plan_route(maze, (0, 0), [(0, 7)], algo, prepared) is None
+    assert stats.take().expanded > 0
+    assert stats.take().expanded == 0
+
+
+def test_astar_engines_expand_the_same_nodes():
+    maze = np.zeros((20, 20), dtype=np.uint8)
+    maze[5:15, 10] = 1
+    counts = []
+    for algo in ('astar[manhattan]', 'flat_astar[manhattan]'):
+        stats.take()
+        plan_route(maze, (10, 0), [(10, 19)], algo)
+        counts.append(stats.take().expanded)
+    assert counts[0] == counts[1]
+
+
+def test_measure_reports_the_work_of_the_task():
+    maze = np.zeros((8, 8), dtype=np.uint8)
+    stats.count_expanded(100)
+
+    measurement = stats.measure(plan_route, maze, (0, 0), [(0, 3)], 'astar[manhattan]')
+
+    assert measurement.result == [(0, 1), (0, 2), (0, 3)]
+    assert measurement.seconds > 0
+    # the work done before the task is not counted
+    assert 0 < measurement.stats.expanded < 100
+    assert stats.take().expanded == 0
+
+
+def test_count_search_keeps_the_open_set_peak():
+    stats.take()
+    stats.count_search(10, 4, 12)
+    stats.count_search(5, 2, 6)
+    stats.count_cache_hits()
+
+    assert stats.take() == stats.SearchStats(
+        expanded=15, open_peak=4, heuristic_calls=18, cache_hits=1
+    )
+
+
+def test_astar_counts_heuristic_calls():
+    maze = np.zeros((8, 8), dtype=np.uint8)
+    stats.take()
+
+    plan_route(maze, (0, 0), [(0, 3)], 'astar[manhattan]')
+
+    taken = stats.take()
+    # the start and every node pushed to the open set
+    assert taken.heuristic_calls > taken.expanded
+
+
+def test_distance_field_cache_hits():
+    maze = np.zeros((8, 8), dtype=np.uint8)
+    distance_field_cache_clear()
+    plan_route(maze, (0, 0), [(0, 3)], 'bfs[multisource]')
+    stats.take()
+
+    plan_route(maze, (1, 0), [(0, 3)], 'bfs[multisource]')
+
+    assert stats.take().cache_hits == 1
+
+
+def test_distance_field_cache_is_shared_by_threads(mocker):
+    mocker.patch('pathfinder.bfs.settings.distance_field_cache_size', 2)
+    maze = np.zeros((8, 8), dtype=np.uint8)
+    distance_field_cache_clear()
+
+    def lookup(step: int) -> int:
+        return int(cached_distance_field(maze, [(0, step % 5)], 'shared')[0, 7])
+
+    with ThreadPoolExecutor(8) as threads:
+        assert list(threads.map(lookup, range(400))) == [
+            7 - step % 5 for step in range(400)
+        ]
+
+
+def test_distance_cache_hits_are_counted_per_thread(mocker):
+    maze = np.zeros((300, 300), dtype=np.uint8)
+
+    def hits_of_search() -> int:
+        a_star.distance_cache_clear()
+        stats.take()
+        a_star.search(maze, (0, 0), [(40, 40), (0, 60)], a_star.Mode.EUCLIDEAN)
+        return stats.take().cache_hits
+
+    alone = hits_of_search()
+
+    count_search = stats.count_search
+
+    def interfere(*args):
+        # another search thread hits the shared cache before the hits of this one are counted
+        thread = threading.Thread(
+            target=lambda: [
+                a_star.distance((1, 1), (2, 2), 'euclidean') for _ in range(10)
+            ]
+        )
+        thread.start()
+        thread.join()
+        count_search(*args)
+
+    mocker.patch.object(stats, 'count_search', interfere)
+    assert hits_of_search() == alone
+
+
+def test_cache_info_sums_the_workers(mocker):
+    mocker.patch.dict(stats._reported, clear=True)
+    maze = np.zeros((30, 30), dtype=np.uint8)
+    args = (maze, (0, 0), [(29, 29)], 'astar[euclidean]')
+
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        measurement = executor.submit(stats.measure, plan_route, *args).result()
+    worker = measurement.caches['distance']
+    assert worker['pid'] != os.getpid() and worker['hits'] > 0
+
+    own = a_star.distance_cache_info()
+    stats.report_caches(measurement)
+    info = stats.cache_info('distance')
+    assert info['processes'] == 2
+    assert info['hits'] == own['hits'] + worker['hits']
+    assert info['misses'] == own['misses'] + worker['misses']
+
+
+def test_profile_reports_the_task():
+    maze = np.zeros((8, 8), dtype=np.uint8)
+
+    measurement = stats.profile(plan_route, maze, (0, 0), [(0, 3)], 'astar[manhattan]')
+
+    assert measurement.result == [(0, 1), (0, 2), (0, 3)]
+    assert 'a_star.py' in measurement.profile
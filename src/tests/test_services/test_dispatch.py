@@ -0,0 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock
+
+import pytest
+from numpy import uint8, zeros
+
+import models
+from core.enums import Direction
+from services import dispatch
+from services.dispatch import DispatchPolicy, Placement, estimate_cost
+from services.field_state import next_direction
+
+
+def test_estimate_cost():
+    assert estimate_cost((10, 20), 1) == 200
+    assert estimate_cost((10, 20), 4) == 600
+    assert estimate_cost((10, 20), 0) == 200
+
+
+def test_choose():
+    policy = DispatchPolicy(100, 1000)
+    assert policy.choose(100) is Placement.INLINE
+    assert policy.choose(101) is Placement.THREAD
+    assert policy.choose(1001) is Placement.POOL
+
+
+def test_shutdown_stops_threads():
+    policy = DispatchPolicy(100, 1000)
+    threads = policy.threads
+    assert threads.submit(sum, [1, 2]).result() == 3
+
+    policy.shutdown()
+    with pytest.raises(RuntimeError):
+        threads.submit(sum, [1, 2])
+    assert policy.threads is not threads
+    policy.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_calibrate(mocker):
+    mocker.patch.object(dispatch.policy, 'inline_max_cost', 0)
+    mocker.patch.object(dispatch.policy, 'thread_max_cost', 0)
+    mocker.patch.object(dispatch.settings, 'inline_search_max_cost', 10)
+    mocker.patch.object(dispatch.settings, 'thread_search_max_cost', 40)
+
+    with ThreadPoolExecutor(1) as executor:
+        await dispatch.calibrate(executor, rounds=3)
+    assert dispatch.policy.inline_max_cost > 0
+    assert dispatch.policy.thread_max_cost == pytest.approx(
+        4 * dispatch.policy.inline_max_cost
+    )
+
+
+@pytest.mark.parametrize(
+    "inline, thread, runs_in_executor",
+    [(10**6, 10**6, False), (0, 10**6, True), (0, 0, True)],
+)
+@pytest.mark.asyncio
+async def test_next_direction_placement(mocker, inline, thread, runs_in_executor):
+    mocker.patch.object(dispatch.policy, 'inline_max_cost', inline)
+    mocker.patch.object(dispatch.policy, 'thread_max_cost', thread)
+    run = mocker.patch(
+        'services.field_state.run_in_executor', AsyncMock(return_value=[(1, 0)])
+    )
+    entry = models.Entry(
+        maze=zeros((2, 2), dtype=uint8),
+        current=(0, 0),
+        action_count=0,
+        action_count_log=[],
+    )
+
+    direction = await next_direction(None, entry, entry.maze, [(1, 1)])
+    assert direction == Direction.DOWN
+    assert run.called == runs_in_executor
+    if runs_in_executor and thread:
+        assert run.call_args.args[0] is dispatch.policy.threads
@@ -0,0 +1,45 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services.executor import ShardedExecutor, shard_for
+
+
+@pytest.fixture
+def sharded():
+    with ShardedExecutor(2) as executor:
+        yield executor
+
+
+def test_shard_is_stable(sharded):
+    assert sharded.shard('field') is sharded.shard('field')
+    assert {sharded.shard(str(i)) for i in range(16)} == set(sharded._shards)
+
+
+def test_same_key_same_worker(sharded):
+    pids = {sharded.shard('field').submit(os.getpid).result() for _ in range(4)}
+    assert len(pids) == 1
+
+
+def test_submit_spreads_work(sharded):
+    pids = {sharded.submit(os.getpid).result() for _ in range(4)}
+    assert len(pids) == 2
+
+
+@pytest.mark.asyncio
+async def test_run_in_executor(sharded):
+    loop = asyncio.get_running_loop()
+    assert await loop.run_in_executor(sharded, abs, -1) == 1
+
+
+def test_shard_for():
+    with ThreadPoolExecutor(1) as executor:
+        assert shard_for(executor, 'field') is executor
+    assert shard_for(None, 'field') is None
+
+
+def test_invalid_shards():
+    with pytest.raises(ValueError):
+        ShardedExecutor(0)
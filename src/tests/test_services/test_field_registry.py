@@ -0,0 +1,112 @@
+import pathlib
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pytest
+
+import models
+from services.field_registry import FieldRegistry, load_field, plan_shared_route
+
+
+def make_entry(maze) -> models.Entry:
+    return models.Entry(maze=maze, current=(0, 0), action_count=0, action_count_log=[])
+
+
+@pytest.fixture
+def registry():
+    registry = FieldRegistry(2)
+    yield registry
+    registry.close()
+
+
+def test_register_shares_equal_fields(registry):
+    maze = np.array([[0, 1, 0], [0, 0, 0]], dtype=np.uint8)
+    name = registry.register(make_entry(maze))
+
+    assert registry.register(make_entry(maze.copy())) == name
+    assert registry.register(make_entry(1 - maze)) != name
+
+    loaded, abstraction = load_field(name)
+    assert np.array_equal(loaded, maze) and abstraction is None
+
+
+def test_released_blocks_are_unlinked(registry):
+    names = [
+        registry.register(make_entry(np.zeros((1, i), dtype=np.uint8)))
+        for i in range(1, 4)
+    ]
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(names[0])
+    registry.close()
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(names[-1])
+
+
+def test_search_in_worker(registry):
+    maze = np.zeros((20, 30), dtype=np.uint8)
+    maze[:19, 10] = 1
+    name = registry.register(make_entry(maze))
+
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        path = executor.submit(
+            plan_shared_route, name, (0, 0), [(0, 29)], 'astar[manhattan]'
+        ).result()
+    assert path is not None and path[-1] == (0, 29) and len(path) == 29 + 2 * 19
+
+
+def test_leased_blocks_are_kept(registry):
+    first = make_entry(np.zeros((1, 1), dtype=np.uint8))
+    with registry.lease(first) as name:
+        for i in range(2, 5):
+            registry.register(make_entry(np.zeros((1, i), dtype=np.uint8)))
+        # attaching succeeds while the task is in flight
+        assert load_field(name)[0].shape == (1, 1)
+        assert registry.owns(name)
+
+    # unpinned, it is the least recently used
+    registry.register(make_entry(np.zeros((1, 5), dtype=np.uint8)))
+    assert not registry.owns(name)
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name)
+
+
+WORKER_EXITS = """
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+import models
+from services import field_registry
+
+field_registry.share_resource_tracker()
+with ProcessPoolExecutor(max_workers=1) as executor:
+    # the worker is forked before any block exists, like after the calibration of the server
+    executor.submit(time.sleep, 0).result()
+    entry = models.Entry(
+        maze=np.zeros((3, 3), dtype=np.uint8),
+        current=(0, 0),
+        action_count=0,
+        action_count_log=[],
+    )
+    name = field_registry.registry.register(entry)
+    executor.submit(field_registry.load_field, name).result()
+# a tracker of the worker would unlink the block once the worker is gone
+time.sleep(0.5)
+SharedMemory(name).close()
+"""
+
+
+def test_block_outlives_the_worker():
+    result = subprocess.run(
+        [sys.executable, '-c', WORKER_EXITS],
+        cwd=pathlib.Path(__file__).parents[2],
+        capture_output=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr.decode()
+    assert b'leaked' not in result.stderr
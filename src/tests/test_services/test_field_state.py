@@ -1,20 +1,41 @@
+import asyncio
 import typing as t
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
+from fakeredis import FakeServer
 from fakeredis.aioredis import FakeRedis
-from numpy import zeros
+from numpy import uint8, zeros
 from redis.asyncio import Redis
 
+from core import metrics
 from core.enums import Direction
+from core.exceptions import PathfinderError
+from pathfinder.finder import plan_route
 from server.lib.pathfinder_pb2 import Field, MoveRequest, Point
-from services.field_state import build_maze, moving, set_field
+from services import components, dispatch
+from services.field_state import (
+    MovingSession,
+    build_maze,
+    move_batch,
+    moving,
+    run_in_executor,
+    set_field,
+)
 from state.state import get_state
 
 
+@pytest.fixture(autouse=True)
+def pool_searches(mocker):
+    # the searches go through the mocked run_in_executor
+    mocker.patch.object(dispatch.policy, 'inline_max_cost', -1)
+    mocker.patch.object(dispatch.policy, 'thread_max_cost', -1)
+
+
 @pytest.fixture
 def mock_state():
-    conn = t.cast(Redis, FakeRedis())
+    conn = t.cast(Redis, FakeRedis(server=FakeServer()))
     return get_state(conn)
 
 
@@ -26,6 +47,12 @@ def test_build_maze():
     assert build_maze(2, 2, '0100').tolist() == [[0, 1], [0, 0]]
 
 
+def test_build_maze_compact():
+    maze = build_maze(2, 3, '01é100')
+    assert maze.dtype == uint8
+    assert maze.tolist() == [[0, 1, 0], [1, 0, 0]]
+
+
 # Test for set_field function
 @pytest.mark.asyncio
 async def test_set_field(mock_state):
@@ -38,14 +65,404 @@ async def test_set_field(mock_state):
 
 # Test for moving function
 @pytest.mark.asyncio
-async def test_moving(mocker, mock_state):
+async def test_moving(mocker, mock_state, lua):
     field = Field(N=2, M=2, grid='O00O', source=Point(i=0, j=0))
     await set_field(mock_state, field)
     move_request = MoveRequest(targets=[Point(i=1, j=1)])
     executor = MagicMock()
     mocker.patch(
-        'services.field_state.run_in_executor',
-        AsyncMock(return_value=Direction.RIGHT.value),
+        'services.field_state.run_in_executor', AsyncMock(return_value=[(0, 1), (1, 1)])
     )
     response = await moving(mock_state, executor, move_request)
     assert response.direction == Direction.RIGHT
+
+
+@pytest.mark.asyncio
+async def test_moving_reuses_plan(mocker, mock_state, lua):
+    field = Field(N=3, M=3, grid='000000000', source=Point(i=0, j=0))
+    await set_field(mock_state, field)
+    run = mocker.patch(
+        'services.field_state.run_in_executor',
+        AsyncMock(return_value=[(1, 0), (2, 0), (2, 1)]),
+    )
+    targets = [Point(i=2, j=1), Point(i=0, j=2)]
+
+    directions = [
+        (await moving(mock_state, MagicMock(), MoveRequest(targets=targets))).direction
+        for _ in range(3)
+    ]
+    assert directions == [Direction.DOWN, Direction.DOWN, Direction.RIGHT]
+    run.assert_awaited_once()
+
+    # the planned target is reached and removed: the plan is exhausted
+    run.return_value = [(1, 1), (0, 1), (0, 2)]
+    targets = [Point(i=0, j=2)]
+    response = await moving(mock_state, MagicMock(), MoveRequest(targets=targets))
+    assert response.direction == Direction.UP
+    assert run.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_moving_writes_plan_once(mocker, mock_state, lua):
+    field = Field(N=3, M=3, grid='000000000', source=Point(i=0, j=0))
+    await set_field(mock_state, field)
+    mocker.patch(
+        'services.field_state.run_in_executor',
+        AsyncMock(return_value=[(1, 0), (2, 0), (2, 1)]),
+    )
+    save = mocker.spy(mock_state.storage, 'save_progress')
+    targets = [Point(i=2, j=1)]
+
+    for _ in range(3):
+        await moving(mock_state, MagicMock(), MoveRequest(targets=targets))
+
+    plans = [call.args[3] for call in save.call_args_list]
+    assert plans[0] is not None and plans[1:] == [None, None]
+
+
+@pytest.mark.asyncio
+async def test_moving_replans_on_new_target(mocker, mock_state, lua):
+    field = Field(N=3, M=3, grid='000000000', source=Point(i=0, j=0))
+    await set_field(mock_state, field)
+    run = mocker.patch(
+        'services.field_state.run_in_executor', AsyncMock(return_value=[(1, 0), (2, 0)])
+    )
+    await moving(mock_state, MagicMock(), MoveRequest(targets=[Point(i=2, j=0)]))
+
+    run.return_value = [(1, 1)]
+    targets = [Point(i=2, j=0), Point(i=1, j=1)]
+    response = await moving(mock_state, MagicMock(), MoveRequest(targets=targets))
+    assert response.direction == Direction.RIGHT
+    assert run.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_moving_finish_drops_plan(mocker, mock_state, lua):
+    field = Field(N=2, M=2, grid='0000', source=Point(i=0, j=0))
+    await set_field(mock_state, field)
+    mocker.patch(
+        'services.field_state.run_in_executor', AsyncMock(return_value=[(1, 0)])
+    )
+    await moving(mock_state, MagicMock(), MoveRequest(targets=[Point(i=1, j=0)]))
+
+    response = await moving(mock_state, MagicMock(), MoveRequest(targets=[]))
+    assert response.direction == Direction.FINISH
+    entry = await mock_state.get_state()
+    assert entry.plan == [] and entry.action_count_log[0].count == 2
+
+
+@pytest.mark.asyncio
+async def test_set_field_prepares_hpa(mocker, mock_state, lua):
+    mocker.patch('services.field_state.settings.algo', 'hpa[manhattan]')
+    mocker.patch('pathfinder.hpa.settings.hpa_cluster_size', 2)
+    field = Field(N=4, M=4, grid='0' * 16, source=Point(i=0, j=0))
+    await set_field(mock_state, field)
+    entry = await mock_state.get_state()
+    assert entry.abstraction is not None and entry.abstraction.cluster_size == 2
+
+    move_request = MoveRequest(targets=[Point(i=3, j=3)])
+    directions = [(await moving(mock_state, None, move_request)).direction]
+    while directions[-1] != Direction.FINISH and len(directions) < 10:
+        entry = await mock_state.get_state()
+        if entry.current == (3, 3):
+            move_request = MoveRequest(targets=[])
+        directions.append((await moving(mock_state, None, move_request)).direction)
+    assert directions.count(Direction.DOWN) == directions.count(Direction.RIGHT) == 3
+
+
+@pytest.mark.asyncio
+async def test_set_field_routes_preprocessing_by_maze(mocker, mock_state):
+    mocker.patch('services.field_state.settings.algo', 'hpa[manhattan]')
+    shard = mocker.patch('services.field_state.shard_for', return_value=None)
+    executor = MagicMock()
+    for robot_id in ('a', 'b'):
+        field = Field(
+            N=4, M=4, grid='0' * 16, source=Point(i=0, j=0), robot_id=robot_id
+        )
+        await set_field(mock_state, field, executor)
+
+    first, second = shard.call_args_list
+    assert first.args[0] is executor and first.args[1]
+    assert first.args == second.args
+
+
+@pytest.mark.asyncio
+async def test_robots_are_independent(mocker, mock_state, lua):
+    await set_field(
+        mock_state, Field(N=2, M=2, grid='0000', source=Point(i=0, j=0), robot_id='a')
+    )
+    await set_field(
+        mock_state, Field(N=2, M=2, grid='0000', source=Point(i=1, j=1), robot_id='b')
+    )
+    mocker.patch(
+        'services.field_state.run_in_executor', AsyncMock(return_value=[(1, 0)])
+    )
+
+    request = MoveRequest(robot_id='a', targets=[Point(i=1, j=0)])
+    assert (await moving(mock_state, None, request)).direction == Direction.DOWN
+
+    assert (await mock_state.get_state('a')).current == (1, 0)
+    assert (await mock_state.get_state('b')).current == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_move_batch_isolates_failed_searches(mocker, mock_state, lua):
+    for robot_id in ('a', 'b'):
+        await set_field(
+            mock_state,
+            Field(N=2, M=2, grid='0000', source=Point(i=0, j=0), robot_id=robot_id),
+        )
+
+    async def search(executor, func, maze, current, targets, *args):
+        if targets == [(0, 1)]:
+            raise RuntimeError('worker died')
+        return [targets[0]]
+
+    mocker.patch('services.field_state.run_in_executor', search)
+    directions = await move_batch(
+        mock_state,
+        None,
+        [
+            MoveRequest(robot_id='a', targets=[Point(i=0, j=1)]),
+            MoveRequest(robot_id='b', targets=[Point(i=1, j=0)]),
+        ],
+    )
+
+    assert directions == [Direction.ERROR, Direction.DOWN]
+    assert (await mock_state.get_state('a')).current == (0, 0)
+    assert (await mock_state.get_state('b')).current == (1, 0)
+    assert await mock_state.get_state() is None
+    with pytest.raises(PathfinderError):
+        await moving(mock_state, None, MoveRequest(robot_id='c'))
+
+
+@pytest.mark.asyncio
+async def test_concurrent_moves_are_not_lost(mocker, mock_state, lua):
+    field = Field(N=1, M=5, grid='00000', source=Point(i=0, j=0))
+    await set_field(mock_state, field)
+
+    async def search(executor, func, maze, current, targets, *args):
+        # let the other request read the same state before this one writes
+        await asyncio.sleep(0)
+        return [(0, j) for j in range(current[1] + 1, 5)]
+
+    mocker.patch('services.field_state.run_in_executor', search)
+    move_request = MoveRequest(targets=[Point(i=0, j=4)])
+    responses = await asyncio.gather(
+        *(moving(mock_state, None, move_request) for _ in range(2))
+    )
+
+    assert [r.direction for r in responses] == [Direction.RIGHT] * 2
+    entry = await mock_state.get_state()
+    assert entry.current == (0, 2) and entry.action_count == 2
+
+
+@pytest.mark.asyncio
+async def test_moving_session_saves_periodically(mocker, mock_state, lua):
+    mocker.patch('services.field_state.settings.stream_persist_interval', 2)
+    await set_field(mock_state, Field(N=1, M=5, grid='00000', source=Point(i=0, j=0)))
+    mocker.spy(mock_state, 'set_progress')
+    session = MovingSession(mock_state, None)
+    request = MoveRequest(targets=[Point(i=0, j=4)])
+
+    for _ in range(3):
+        assert (await session.move(request)).direction == Direction.RIGHT
+    assert mock_state.set_progress.call_count == 1
+    assert (await mock_state.get_state()).current == (0, 2)
+
+    await session.close()
+    assert mock_state.set_progress.call_count == 2
+    assert (await mock_state.get_state()).current == (0, 3)
+
+
+@pytest.mark.asyncio
+async def test_moving_session_reloads_changed_state(mocker, mock_state, lua):
+    await set_field(mock_state, Field(N=1, M=5, grid='00000', source=Point(i=0, j=0)))
+    session = MovingSession(mock_state, None)
+    request = MoveRequest(targets=[Point(i=0, j=4)])
+    await session.move(request)
+
+    # the robot was moved by someone else
+    entry = await mock_state.get_state()
+    entry.current = (0, 3)
+    await mock_state.set_progress(entry)
+    await session.close()
+
+    assert (await session.move(request)).direction == Direction.RIGHT
+    await session.close()
+    assert (await mock_state.get_state()).current == (0, 4)
+
+
+@pytest.mark.asyncio
+async def test_moving_session_reports_discarded_moves(mocker, mock_state, lua):
+    mocker.patch('services.field_state.settings.stream_persist_interval', 2)
+    await set_field(mock_state, Field(N=1, M=5, grid='00000', source=Point(i=0, j=0)))
+    session = MovingSession(mock_state, None)
+    request = MoveRequest(targets=[Point(i=0, j=4)])
+    assert (await session.move(request)).direction == Direction.RIGHT
+
+    # the state is saved elsewhere meanwhile
+    entry = await mock_state.get_state()
+    assert await mock_state.set_progress(entry)
+
+    assert (await session.move(request)).direction == Direction.ERROR
+    assert (await mock_state.get_state()).current == (0, 0)
+    assert (await session.move(request)).direction == Direction.RIGHT
+    await session.close()
+    assert (await mock_state.get_state()).current == (0, 1)
+
+
+@pytest.mark.asyncio
+async def test_move_batch(mocker, mock_state, lua):
+    for robot_id, source in (('a', Point(i=0, j=0)), ('b', Point(i=1, j=1))):
+        await set_field(
+            mock_state, Field(N=2, M=2, grid='0000', source=source, robot_id=robot_id)
+        )
+
+    async def search(executor, func, maze, current, targets, *args):
+        return [targets[0]]
+
+    mocker.patch('services.field_state.run_in_executor', search)
+    mocker.spy(mock_state, 'get_states')
+    directions = await move_batch(
+        mock_state,
+        None,
+        [
+            MoveRequest(robot_id='a', targets=[Point(i=1, j=0)]),
+            MoveRequest(robot_id='missing', targets=[Point(i=1, j=0)]),
+            MoveRequest(robot_id='b', targets=[Point(i=0, j=1)]),
+            MoveRequest(robot_id='b', targets=[Point(i=1, j=0)]),
+        ],
+    )
+
+    assert directions == [
+        Direction.DOWN,
+        Direction.ERROR,
+        Direction.ERROR,
+        Direction.ERROR,
+    ]
+    assert mock_state.get_states.call_count == 1
+    assert (await mock_state.get_state('a')).current == (1, 0)
+    # moved twice in one batch
+    assert (await mock_state.get_state('b')).current == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_move_batch_retries_stale_states(mocker, mock_state, lua):
+    await set_field(mock_state, Field(N=1, M=5, grid='00000', source=Point(i=0, j=0)))
+    other_move = MoveRequest(targets=[Point(i=0, j=4)])
+
+    async def search(executor, func, maze, current, targets, *args):
+        if not search.interrupted:
+            # another request moves the robot meanwhile
+            search.interrupted = True
+            await moving(mock_state, None, other_move)
+        return [(0, j) for j in range(current[1] + 1, 5)]
+
+    search.interrupted = False
+    mocker.patch('services.field_state.run_in_executor', search)
+
+    assert await move_batch(mock_state, None, [other_move]) == [Direction.RIGHT]
+    entry = await mock_state.get_state()
+    assert entry.current == (0, 2) and entry.action_count == 2
+
+
+@pytest.mark.asyncio
+async def test_run_in_executor_records_the_metrics(mocker):
+    observe = {
+        name: mocker.spy(histogram, 'observe')
+        for name, histogram in (
+            ('wait', metrics.EXECUTOR_WAIT),
+            ('search', metrics.SEARCH_TIME),
+            ('expanded', metrics.NODES_EXPANDED),
+        )
+    }
+    maze = zeros((4, 4), dtype=uint8)
+
+    with ThreadPoolExecutor(1) as executor:
+        path = await run_in_executor(
+            executor, plan_route, maze, (0, 0), [(0, 2)], 'astar[manhattan]'
+        )
+
+    assert path == [(0, 1), (0, 2)]
+    for spy in observe.values():
+        spy.assert_called_once()
+        assert spy.call_args.kwargs == {'task': 'plan_route'}
+    assert observe['expanded'].call_args.args[0] > 0
+
+
+@pytest.mark.asyncio
+async def test_set_field_labels_components(mock_state):
+    field = Field(N=2, M=3, grid='010010', source=Point(i=0, j=0))
+    await set_field(mock_state, field)
+
+    entry = await mock_state.get_state()
+    labels = components.registry.get(entry.field_id)
+    assert labels.tolist() == [[1, 0, 2], [1, 0, 2]]
+
+
+@pytest.mark.asyncio
+async def test_moving_reads_stored_component_labels(mocker, mock_state, lua):
+    field = Field(N=3, M=3, grid='010010010', source=Point(i=0, j=0))
+    await set_field(mock_state, field)
+    # another replica, or a restarted server
+    components.registry.clear()
+    label = mocker.patch('services.field_state.label_components')
+    run = mocker.patch('services.field_state.run_in_executor', AsyncMock())
+
+    response = await moving(
+        mock_state, MagicMock(), MoveRequest(targets=[Point(i=1, j=2)])
+    )
+
+    assert response.direction == Direction.ERROR
+    run.assert_not_awaited()
+    label.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_moving_drops_unreachable_targets(mocker, mock_state, lua):
+    # the right column is walled off
+    field = Field(N=3, M=3, grid='010010010', source=Point(i=0, j=0))
+    await set_field(mock_state, field)
+    run = mocker.patch(
+        'services.field_state.run_in_executor', AsyncMock(return_value=[(1, 0), (2, 0)])
+    )
+    targets = [Point(i=0, j=2), Point(i=2, j=0)]
+
+    response = await moving(mock_state, MagicMock(), MoveRequest(targets=targets))
+
+    assert response.direction == Direction.DOWN
+    # the goals of the search follow the position
+    assert run.await_args.args[4] == [(2, 0)]
+    entry = await mock_state.get_state()
+    assert entry.plan_targets == [(0, 2), (2, 0)]
+
+
+@pytest.mark.asyncio
+async def test_moving_to_unreachable_targets_does_not_search(mocker, mock_state, lua):
+    field = Field(N=3, M=3, grid='010010010', source=Point(i=0, j=0))
+    await set_field(mock_state, field)
+    run = mocker.patch('services.field_state.run_in_executor', AsyncMock())
+
+    response = await moving(
+        mock_state, MagicMock(), MoveRequest(targets=[Point(i=1, j=2)])
+    )
+
+    assert response.direction == Direction.ERROR
+    run.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_moving_searches_without_component_labels(mocker, mock_state, lua):
+    mocker.patch('services.field_state.settings.component_cache_size', 0)
+    field = Field(N=3, M=3, grid='010010010', source=Point(i=0, j=0))
+    await set_field(mock_state, field)
+    run = mocker.patch('services.field_state.run_in_executor', AsyncMock())
+    run.return_value = None
+
+    response = await moving(
+        mock_state, MagicMock(), MoveRequest(targets=[Point(i=1, j=2)])
+    )
+
+    assert response.direction == Direction.ERROR
+    run.assert_awaited_once()
@@ -0,0 +1,134 @@
+import datetime
+
+import pytest
+from numpy import zeros
+
+import models
+from state import codec
+from state.cache import CachedState
+from state.state import RedisStorage, State
+
+
+def make_entry() -> models.Entry:
+    return models.Entry(
+        maze=zeros((3, 3), dtype=int),
+        current=(0, 0),
+        action_count=0,
+        action_count_log=[],
+    )
+
+
+@pytest.mark.asyncio
+async def test_reads_are_served_from_memory(redis_conn, mocker, lua):
+    redis_storage = RedisStorage(redis_conn)
+    state = CachedState(redis_storage, 8)
+    entry = make_entry()
+    await state.set_state(entry, 'cached')
+
+    mocker.spy(redis_storage, 'retrieve_state')
+    mocker.spy(codec, 'decode_entry')
+    for step in range(1, 4):
+        entry = await state.get_state('cached')
+        entry.current = (step, 0)
+        assert await state.set_progress(entry, 'cached')
+
+    assert redis_storage.retrieve_state.call_count == 0
+    assert codec.decode_entry.call_count == 0
+    assert state.cache_info()['hits'] == 3
+    # written through
+    assert (await State(redis_storage).get_state('cached')).current == (3, 0)
+
+
+@pytest.mark.asyncio
+async def test_stale_state_is_dropped(redis_conn, lua):
+    state = CachedState(RedisStorage(redis_conn), 8)
+    other_replica = State(RedisStorage(redis_conn))
+    await state.set_state(make_entry(), 'shared')
+
+    moved = await other_replica.get_state('shared')
+    moved.current = (1, 0)
+    assert await other_replica.set_progress(moved, 'shared')
+
+    # the version is checked on the hit
+    fresh = await state.get_state('shared')
+    assert fresh.current == (1, 0) and fresh.version == moved.version
+    info = state.cache_info()
+    assert info['invalidations'] == 1 and info['hits'] == 0
+
+    # changed between the read and the save
+    moved.current = (2, 0)
+    assert await other_replica.set_progress(moved, 'shared')
+    fresh.current = (1, 1)
+    assert not await state.set_progress(fresh, 'shared')
+    assert state.cache_info()['invalidations'] == 2
+    assert (await state.get_state('shared')).current == (2, 0)
+
+
+@pytest.mark.asyncio
+async def test_batch_rereads_outdated_states(redis_conn, mocker, lua):
+    redis_storage = RedisStorage(redis_conn)
+    state = CachedState(redis_storage, 8)
+    other_replica = State(redis_storage)
+    for key in ('outdated', 'current'):
+        await state.set_state(make_entry(), key)
+    moved = await other_replica.get_state('outdated')
+    moved.current = (1, 0)
+    assert await other_replica.set_progress(moved, 'outdated')
+
+    mocker.spy(redis_storage, 'retrieve_states')
+    entries = await state.get_states(['outdated', 'current'])
+    redis_storage.retrieve_states.assert_called_once_with(['outdated'])
+    assert [entry.current for entry in entries] == [(1, 0), (0, 0)]
+
+
+@pytest.mark.asyncio
+async def test_batch_reads_only_missing_states(redis_conn, mocker, lua):
+    redis_storage = RedisStorage(redis_conn)
+    state = CachedState(redis_storage, 8)
+    for key in ('a', 'b'):
+        await State(redis_storage).set_state(make_entry(), key)
+    await state.get_state('a')
+
+    mocker.spy(redis_storage, 'retrieve_states')
+    entries = await state.get_states(['a', 'b', 'c'])
+    redis_storage.retrieve_states.assert_called_once_with(['b', 'c'])
+    assert entries[2] is None
+
+    entries[0].current = entries[1].current = (1, 0)
+    assert await state.set_progresses([(entries[0], 'a'), (entries[1], 'b')]) == [
+        True,
+        True,
+    ]
+    assert [entry.current for entry in await state.get_states(['a', 'b'])] == [
+        (1, 0),
+        (1, 0),
+    ]
+    assert redis_storage.retrieve_states.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_size_is_bounded(redis_conn):
+    state = CachedState(RedisStorage(redis_conn), 2)
+    for key in ('a', 'b', 'c'):
+        await state.set_state(make_entry(), f'bounded_{key}')
+    await state.get_state('bounded_a')
+
+    info = state.cache_info()
+    assert info['size'] == 2 and info['misses'] == 1 and info['hits'] == 0
+
+
+@pytest.mark.asyncio
+async def test_cached_state_is_copied(redis_conn, lua):
+    state = CachedState(RedisStorage(redis_conn), 8)
+    await state.set_state(make_entry(), 'copied')
+
+    entry = await state.get_state('copied')
+    entry.current = (2, 2)
+    entry.plan.append((2, 2))
+    entry.action_count_log.append(
+        models.ActionCount(count=1, when=datetime.datetime.now())
+    )
+
+    cached = await state.get_state('copied')
+    assert cached.current == (0, 0) and cached.plan == []
+    assert cached.action_count_log == [] and cached.version == entry.version
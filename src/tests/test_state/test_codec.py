@@ -0,0 +1,147 @@
+import datetime
+
+import numpy as np
+import orjson as json
+import pytest
+
+import models
+from pathfinder.components import label_components
+from pathfinder.hpa import build_abstraction
+from state.codec import (
+    ABSTRACTION_ARRAYS,
+    COUNT,
+    FIELD_HEADER,
+    LEGACY_HEADER,
+    PROGRESS_HEADER,
+    PROGRESS_HEADER_V2,
+    decode_components,
+    decode_entry,
+    decode_legacy,
+    encode_components,
+    encode_field,
+    encode_plan,
+    encode_progress,
+    field_id,
+)
+
+
+def make_entry(**kwargs) -> models.Entry:
+    maze = (np.random.default_rng(0).random((37, 53)) < 0.3).astype(np.uint8)
+    return models.Entry(
+        maze=maze,
+        current=(4, 7),
+        action_count=12,
+        action_count_log=[
+            models.ActionCount(count=5, when=datetime.datetime(2024, 1, 2, 3, 4, 5))
+        ],
+        **kwargs,
+    )
+
+
+def test_round_trip():
+    entry = make_entry()
+    field, progress = encode_field(entry), encode_progress(entry)
+
+    # a bit per cell
+    assert len(field) == FIELD_HEADER.size + (37 * 53 + 7) // 8
+    assert len(progress) < PROGRESS_HEADER.size + 100
+    assert decode_entry(field, progress) == entry
+
+
+def test_round_trip_with_plan_and_abstraction():
+    entry = make_entry(plan=[(3, 7), (4, 7), (5, 7)], plan_targets=[(9, 9)])
+    entry.plan_index = 1
+    entry.abstraction = build_abstraction(np.asarray(entry.maze), 8)
+
+    progress = encode_progress(entry)
+    # the plan is stored apart
+    assert len(progress) == len(encode_progress(make_entry()))
+    decoded = decode_entry(encode_field(entry), progress, encode_plan(entry))
+    assert decoded.plan == [(3, 7), (4, 7), (5, 7)] and decoded.plan_targets == [(9, 9)]
+    assert decoded.plan_index == 1
+    assert np.array_equal(decoded.maze, entry.maze)
+    assert decoded.abstraction is not None and decoded.abstraction.cluster_size == 8
+    for name in ('nodes', 'cluster_offsets', 'edge_offsets', 'edge_targets'):
+        assert np.array_equal(
+            getattr(decoded.abstraction, name), getattr(entry.abstraction, name)
+        )
+
+
+def test_decode_progress_version_2():
+    # the plan was in the JSON tail of the progress
+    entry = make_entry()
+    tail = json.dumps({'action_count_log': [], 'plan': [[4, 7], [5, 7]]})
+    progress = PROGRESS_HEADER_V2.pack(b'PP', 2, 4, 7, 12) + tail
+
+    decoded = decode_entry(encode_field(entry), progress)
+    assert decoded.current == (4, 7) and decoded.plan == [(4, 7), (5, 7)]
+    assert decoded.plan_index == 0 and decoded.plan_changed
+
+
+def test_decode_legacy_json():
+    entry = make_entry()
+    assert decode_legacy(entry.model_dump_json(exclude_defaults=True).encode()) == entry
+
+
+def encode_version_1(entry: models.Entry) -> bytes:
+    # the single blob of the format version 1
+    maze = np.asarray(entry.maze)
+    tail = entry.model_dump(mode='json', include={'action_count_log', 'plan'})
+    if entry.abstraction is not None:
+        tail['cluster_size'] = entry.abstraction.cluster_size
+    tail_bytes = json.dumps(tail)
+    data = LEGACY_HEADER.pack(
+        b'PF', 1, *maze.shape, *entry.current, entry.action_count, len(tail_bytes)
+    )
+    data += np.packbits(maze == 1).tobytes() + tail_bytes
+    if entry.abstraction is not None:
+        for name in ABSTRACTION_ARRAYS:
+            array = np.ascontiguousarray(getattr(entry.abstraction, name), dtype='<i4')
+            data += COUNT.pack(array.size) + array.tobytes()
+    return data
+
+
+def test_decode_legacy_version_1():
+    entry = make_entry(plan=[(4, 7), (5, 7)])
+    entry.abstraction = build_abstraction(np.asarray(entry.maze), 8)
+
+    decoded = decode_legacy(encode_version_1(entry))
+    assert decoded.current == (4, 7) and decoded.action_count == 12
+    assert decoded.plan == [(4, 7), (5, 7)] and decoded.plan_changed
+    assert decoded.action_count_log == entry.action_count_log
+    assert np.array_equal(decoded.maze, entry.maze)
+    assert decoded.abstraction is not None
+    assert np.array_equal(decoded.abstraction.edge_costs, entry.abstraction.edge_costs)
+
+
+@pytest.mark.parametrize('width', [3, 600])
+def test_components_round_trip(width):
+    # many walled-off cells need more than a byte per label
+    maze = np.zeros((2, width), dtype=np.uint8)
+    maze[0, 1::2] = maze[1, ::2] = 1
+    labels = label_components(maze)
+    field = field_id(
+        encode_field(
+            models.Entry(maze=maze, current=(0, 0), action_count=0, action_count_log=[])
+        )
+    )
+
+    data = encode_components(labels, field)
+    decoded = decode_components(data, field)
+    assert decoded is not None and decoded.dtype == labels.dtype
+    assert np.array_equal(decoded, labels)
+    # computed for another field
+    assert decode_components(data, '0' * 16) is None
+    with pytest.raises(ValueError):
+        decode_components(b'PC\x01' + data[3:], field)
+
+
+def test_decode_unknown_format():
+    entry = make_entry()
+    field, progress = encode_field(entry), encode_progress(entry)
+    with pytest.raises(ValueError):
+        decode_entry(progress, progress)
+    with pytest.raises(ValueError):
+        decode_entry(field, b'PP\x01' + progress[3:])
+    with pytest.raises(ValueError):
+        decode_entry(field, progress, progress)
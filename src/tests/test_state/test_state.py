@@ -1,34 +1,70 @@
 import orjson as json
 import pytest
-from numpy import zeros
+from numpy import array, uint8, zeros
 
 import models
 from core.config import settings
 from core.enums import StateStorage
 from core.exceptions import PathfinderError
+from state.codec import LEGACY_HEADER
 from state.state import RedisStorage, State, get_state
 
 
 @pytest.mark.asyncio
-async def test_redis_storage(redis_conn, mocker):
+async def test_redis_storage(redis_conn):
     storage = RedisStorage(redis_conn)
-    state = {
-        'robot_id': {
-            'field': {
-                'maze': [[0, 0, 0], [0, 0, 0], [0, 0, 0]],
-                'current': [0, 0],
-                'action_count': 0,
-            },
-            'action_count_log': [],
-        }
-    }
-    mocker.spy(redis_conn, 'set')
-    await storage.save_state(state)
-    redis_conn.set.assert_called_once_with(
-        settings.redis_server_state_key, json.dumps(state)
-    )
-    saved_state = await storage.retrieve_state()
-    assert saved_state == state
+    first = await storage.save_state(
+        'robot_id', {'field': b'\x00maze', 'progress': b'\x01'}
+    )
+    assert await storage.save_state('robot_id', {'progress': b'\x02'}) == first + 1
+    assert await storage.save_state('other', {'progress': b'\x03'}) == 1
+
+    assert await storage.retrieve_state('robot_id') == (
+        {'field': b'\x00maze', 'progress': b'\x02'},
+        first + 1,
+    )
+    assert await storage.retrieve_state('other') == ({'progress': b'\x03'}, 1)
+    assert await storage.retrieve_state('missing') == ({}, 0)
+    assert await redis_conn.get(f'{settings.redis_server_state_key}:robot_id:field')
+
+
+@pytest.mark.asyncio
+async def test_redis_storage_save_progress(redis_conn, lua):
+    storage = RedisStorage(redis_conn)
+    version = await storage.save_state('cas', {'field': b'f', 'progress': b'p0'})
+
+    assert await storage.save_progress('cas', b'p1', version, b'plan') == version + 1
+    # computed from the outdated state
+    assert await storage.save_progress('cas', b'p2', version, b'stale') is None
+    # the plan is kept
+    assert await storage.save_progress('cas', b'p3', version + 1) == version + 2
+    assert await storage.retrieve_state('cas') == (
+        {'field': b'f', 'progress': b'p3', 'plan': b'plan'},
+        version + 2,
+    )
+
+
+@pytest.mark.asyncio
+async def test_redis_storage_batch(redis_conn, lua):
+    storage = RedisStorage(redis_conn)
+    first = await storage.save_state('batch_a', {'field': b'fa', 'progress': b'pa'})
+    second = await storage.save_state('batch_b', {'field': b'fb', 'progress': b'pb'})
+
+    states = await storage.retrieve_states(['batch_b', 'missing', 'batch_a'])
+    assert states == [
+        ({'field': b'fb', 'progress': b'pb'}, second),
+        ({}, 0),
+        ({'field': b'fa', 'progress': b'pa'}, first),
+    ]
+    assert await storage.save_progresses(
+        [('batch_a', b'pa1', first, b'la'), ('batch_b', b'pb1', second + 1, None)]
+    ) == [first + 1, None]
+    assert await storage.retrieve_states(['batch_a', 'batch_b']) == [
+        ({'field': b'fa', 'progress': b'pa1', 'plan': b'la'}, first + 1),
+        ({'field': b'fb', 'progress': b'pb'}, second),
+    ]
+    assert await storage.retrieve_states([]) == []
+    assert await storage.save_progresses([]) == []
 
 
 @pytest.mark.asyncio
@@ -40,13 +76,141 @@ async def test_state(redis_conn, mocker):
         action_count=0,
         action_count_log=[],
     )  # Fill in with appropriate values
-    mocker.spy(redis_conn, 'set')
     await state.set_state(entry)
-    redis_conn.set.assert_called_once()
 
     assert await state.get_state() == entry
 
 
+@pytest.mark.asyncio
+async def test_set_progress_keeps_field(redis_conn, mocker, lua):
+    state = State(RedisStorage(redis_conn))
+    entry = models.Entry(
+        maze=zeros((3, 3), dtype=int),
+        current=(0, 0),
+        action_count=0,
+        action_count_log=[],
+    )
+    await state.set_state(entry, 'walker')
+
+    entry.current = (1, 0)
+    entry.action_count = 1
+    mocker.spy(state.storage, 'save_progress')
+    assert await state.set_progress(entry, 'walker')
+    (_, progress, _, plan), _ = state.storage.save_progress.call_args
+    assert len(progress) < 64 and plan is None
+
+    assert await state.get_state('walker') == entry
+
+
+@pytest.mark.asyncio
+async def test_set_progress_writes_changed_plan(redis_conn, mocker, lua):
+    state = State(RedisStorage(redis_conn))
+    entry = models.Entry(
+        maze=zeros((3, 3), dtype=int),
+        current=(0, 0),
+        action_count=0,
+        action_count_log=[],
+    )
+    await state.set_state(entry, 'planner')
+    mocker.spy(state.storage, 'save_progress')
+
+    entry.plan, entry.plan_targets, entry.plan_changed = (
+        [(0, 0), (1, 0)],
+        [(1, 0)],
+        True,
+    )
+    assert await state.set_progress(entry, 'planner')
+    (_, _, _, plan), _ = state.storage.save_progress.call_args
+    assert plan and not entry.plan_changed
+
+    # the following moves advance the index only
+    entry.current, entry.plan_index = (1, 0), 1
+    assert await state.set_progress(entry, 'planner')
+    (_, _, _, plan), _ = state.storage.save_progress.call_args
+    assert plan is None
+
+    stored = await state.get_state('planner')
+    assert stored.plan == [(0, 0), (1, 0)] and stored.plan_targets == [(1, 0)]
+    assert stored.plan_index == 1 and stored.current == (1, 0)
+
+
+@pytest.mark.asyncio
+async def test_state_migrates_legacy_json(redis_conn):
+    entry = models.Entry(
+        maze=zeros((2, 2), dtype=int),
+        current=(1, 0),
+        action_count=3,
+        action_count_log=[],
+    )
+    legacy = {'legacy_robot': entry.model_dump_json(exclude_defaults=True)}
+    await redis_conn.set(settings.redis_server_state_key, json.dumps(legacy))
+
+    state = State(RedisStorage(redis_conn))
+    assert await state.get_state('legacy_robot') == entry
+    assert await state.storage.retrieve_state('legacy_robot')
+    await redis_conn.delete(settings.redis_server_state_key)
+    assert await state.get_state('legacy_robot') == entry
+
+
+@pytest.mark.asyncio
+async def test_state_migrates_legacy_hash(redis_conn):
+    maze = zeros((2, 3), dtype='uint8')
+    maze[0, 1] = 1
+    tail = json.dumps({'action_count_log': []})
+    blob = LEGACY_HEADER.pack(b'PF', 1, 2, 3, 1, 2, 5, len(tail))
+    await redis_conn.hset(
+        settings.redis_server_state_key, 'hashed_robot', blob + b'\x40' + tail
+    )
+
+    state = State(RedisStorage(redis_conn))
+    entry = await state.get_state('hashed_robot')
+    assert entry.current == (1, 2) and entry.action_count == 5
+    assert entry.maze.tolist() == [[0, 1, 0], [0, 0, 0]]
+    assert await state.get_state('other_robot') is None
+    await redis_conn.delete(settings.redis_server_state_key)
+
+
+@pytest.mark.asyncio
+async def test_set_progress_rejects_stale_entry(redis_conn, lua):
+    state = State(RedisStorage(redis_conn))
+    entry = models.Entry(
+        maze=zeros((3, 3), dtype=int),
+        current=(0, 0),
+        action_count=0,
+        action_count_log=[],
+    )
+    await state.set_state(entry, 'racer')
+
+    first, second = await state.get_state('racer'), await state.get_state('racer')
+    first.current, second.current = (1, 0), (0, 1)
+    assert await state.set_progress(first, 'racer')
+    assert not await state.set_progress(second, 'racer')
+    assert (await state.get_state('racer')).current == (1, 0)
+
+
+@pytest.mark.asyncio
+async def test_components_are_kept_apart(redis_conn):
+    storage = RedisStorage(redis_conn)
+    state = State(storage)
+    entry = models.Entry(
+        maze=zeros((1, 3), dtype=int),
+        current=(0, 0),
+        action_count=0,
+        action_count_log=[],
+    )
+    await state.set_state(entry, 'labeled')
+    labels = array([[1, 0, 2]], dtype=uint8)
+
+    assert await state.get_components(entry.field_id, 'labeled') is None
+    await state.set_components(labels, entry.field_id, 'labeled')
+    assert (await state.get_components(entry.field_id, 'labeled')).tolist() == [
+        [1, 0, 2]
+    ]
+    # the moves don't read them, nor does saving them change the version
+    parts, version = await storage.retrieve_state('labeled')
+    assert set(parts) == {'field', 'progress', 'plan'} and version == entry.version
+
+
 def test_get_state(mocker, redis_conn):
     mocker.patch.object(settings, 'state_storage', StateStorage.REDIS.value)
     assert isinstance(get_state(redis_conn), State)